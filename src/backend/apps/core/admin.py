@@ -0,0 +1,32 @@
+from django.contrib import admin
+from .models import Importacion, RegistroCambio
+
+
+@admin.register(Importacion)
+class ImportacionAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'tipo', 'estado', 'usuario', 'total_filas',
+        'creados', 'total_errores', 'fecha_creacion', 'fecha_finalizacion'
+    )
+    list_filter = ('tipo', 'estado', 'fecha_creacion')
+    readonly_fields = (
+        'tipo', 'archivo', 'formato', 'estado', 'usuario', 'total_filas',
+        'filas_procesadas', 'creados', 'total_errores', 'errores', 'mensaje',
+        'fecha_creacion', 'fecha_finalizacion'
+    )
+    ordering = ('-fecha_creacion',)
+
+
+@admin.register(RegistroCambio)
+class RegistroCambioAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'modelo', 'objeto_id', 'accion', 'usuario')
+    list_filter = ('modelo', 'accion', 'fecha')
+    search_fields = ('objeto_id',)
+    readonly_fields = ('modelo', 'objeto_id', 'accion', 'cambios', 'usuario', 'fecha')
+    ordering = ('-fecha',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,158 @@
+"""
+Registro de cambios por campo para cualquier modelo (RegistroCambio).
+
+    auditoria.registrar(Producto)
+
+conecta post_init, post_save y post_delete del modelo. post_init guarda una
+copia de los valores cargados (de __dict__, sin consultas adicionales) y
+post_save compara contra ella: cada cambio queda como un JSON compacto
+{"campo": [anterior, nuevo]}. Los QuerySet.update() y bulk_create no envían
+señales y no quedan registrados.
+
+Los registros se escriben después del commit (un cambio revertido no se
+registra) y por lotes: AuditoriaMiddleware agrupa los de toda la petición
+(p. ej. varias filas de list_editable en el admin) en un solo
+bulk_create al final. Con AUDITORIA_ASINCRONA el lote se envía a Celery y
+la petición no espera la escritura.
+"""
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import RegistroCambio
+
+# Filas por INSERT
+TAMANO_INSERCION = 500
+
+# Petición en curso (para el usuario) y lote de registros pendientes
+_peticion = ContextVar('auditoria_peticion', default=None)
+_lote = ContextVar('auditoria_lote', default=None)
+
+# {modelo: campos registrados (attname)}
+MODELOS = {}
+
+
+def registrar(modelo, excluir=()):
+    """
+    Registra los cambios de `modelo`: todos sus campos concretos salvo la
+    clave primaria, los auto_now/auto_now_add y `excluir`
+    """
+    MODELOS[modelo] = [
+        campo.attname for campo in modelo._meta.concrete_fields
+        if not campo.primary_key
+        and not getattr(campo, 'auto_now', False)
+        and not getattr(campo, 'auto_now_add', False)
+        and campo.name not in excluir
+    ]
+    etiqueta = modelo._meta.label_lower
+    post_init.connect(_guardar_inicial, sender=modelo, dispatch_uid=f'auditoria_init_{etiqueta}')
+    post_save.connect(_registrar_guardado, sender=modelo, dispatch_uid=f'auditoria_guardar_{etiqueta}')
+    post_delete.connect(_registrar_eliminado, sender=modelo, dispatch_uid=f'auditoria_eliminar_{etiqueta}')
+
+
+def _valores(instance):
+    # Solo lo cargado: los campos diferidos no están en __dict__
+    return {
+        campo: instance.__dict__[campo]
+        for campo in MODELOS[type(instance)] if campo in instance.__dict__
+    }
+
+
+def _guardar_inicial(sender, instance, **kwargs):
+    instance._auditoria_inicial = _valores(instance)
+
+
+def _registrar_guardado(sender, instance, created, raw=False, **kwargs):
+    actuales = _valores(instance)
+    if created and not raw:
+        cambios = {campo: [None, valor] for campo, valor in actuales.items() if valor not in (None, '')}
+        _encolar(instance, RegistroCambio.CREAR, cambios)
+    elif not raw:
+        iniciales = getattr(instance, '_auditoria_inicial', {})
+        cambios = {
+            campo: [iniciales[campo], valor] for campo, valor in actuales.items()
+            if campo in iniciales and iniciales[campo] != valor
+        }
+        if cambios:
+            _encolar(instance, RegistroCambio.ACTUALIZAR, cambios)
+    instance._auditoria_inicial = actuales
+
+
+def _registrar_eliminado(sender, instance, **kwargs):
+    _encolar(instance, RegistroCambio.ELIMINAR, {})
+
+
+def _usuario_id():
+    peticion = _peticion.get()
+    # DRF asigna request.user a la petición de Django al autenticar
+    usuario = getattr(peticion, 'user', None)
+    if usuario is not None and usuario.is_authenticated:
+        return usuario.pk
+    return None
+
+
+def _encolar(instance, accion, cambios):
+    fila = {
+        'modelo': instance._meta.label_lower,
+        'objeto_id': str(instance.pk),
+        'accion': accion,
+        # Decimal, fechas, etc. como texto JSON (también para Celery)
+        'cambios': json.loads(json.dumps(cambios, cls=DjangoJSONEncoder)),
+        'usuario_id': _usuario_id(),
+        'fecha': timezone.now().isoformat(),
+    }
+    transaction.on_commit(lambda: _agregar(fila))
+
+
+def _agregar(fila):
+    lote = _lote.get()
+    if lote is None:
+        escribir([fila])
+    else:
+        lote.append(fila)
+
+
+@contextmanager
+def lote(peticion=None):
+    """
+    Agrupa los registros hechos dentro del bloque y los escribe juntos al
+    salir. `peticion` da el usuario de los cambios.
+    """
+    if _lote.get() is not None:
+        yield
+        return
+    token_lote = _lote.set([])
+    token_peticion = _peticion.set(peticion)
+    try:
+        yield
+    finally:
+        filas = _lote.get()
+        _lote.reset(token_lote)
+        _peticion.reset(token_peticion)
+        escribir(filas)
+
+
+def escribir(filas):
+    """Guarda las filas, o las envía a Celery con AUDITORIA_ASINCRONA"""
+    if not filas:
+        return
+    if settings.AUDITORIA_ASINCRONA:
+        from .tasks import guardar_cambios
+        guardar_cambios.delay(filas)
+    else:
+        guardar(filas)
+
+
+def guardar(filas):
+    """Un bulk_create con las filas de registro"""
+    RegistroCambio.objects.bulk_create(
+        [RegistroCambio(**{**fila, 'fecha': parse_datetime(fila['fecha'])}) for fila in filas],
+        batch_size=TAMANO_INSERCION
+    )
@@ -0,0 +1,214 @@
+"""
+Benchmarks de la API (RNF001: respuestas en menos de 2 segundos con 100
+usuarios concurrentes).
+
+Dos modos, usados por el comando benchmark_api:
+
+- En proceso: cada escenario se ejecuta N veces con el cliente de pruebas
+  de DRF, midiendo la latencia y las consultas SQL de cada petición.
+- Concurrente: U hilos hacen peticiones HTTP reales a un servidor en
+  marcha (runserver o gunicorn), como un usuario cada uno.
+
+Ambos reportan p50/p95/p99 por escenario y se comparan con UMBRALES.
+"""
+import http.client
+import json
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from apps.pacientes.models import Paciente
+from apps.prescripciones.models import Prescripcion
+
+# Volumen de datos de cada escala (opciones de generar_datos); filas
+# totales aproximadas: pacientes * (1 + prescripciones) + productos
+ESCALAS = {
+    '10k': {'pacientes': 3000, 'prescripciones_por_paciente': 2, 'productos': 1000},
+    '100k': {'pacientes': 30000, 'prescripciones_por_paciente': 2, 'productos': 10000},
+    '1M': {'pacientes': 300000, 'prescripciones_por_paciente': 2, 'productos': 100000},
+}
+
+# Límites por escenario; '*' aplica a todos. p95_ms sigue RNF001; las
+# consultas por petición detectan N+1 (no dependen del volumen de datos) y
+# son las de una respuesta sin caché, sin contar la autenticación
+UMBRALES = {
+    '*': {'p95_ms': 2000},
+    'pacientes_listado': {'consultas': 3},
+    'pacientes_busqueda': {'consultas': 4},
+    'prescripciones_listado': {'consultas': 3},
+    'prescripciones_historial_paciente': {'consultas': 2},
+    'prescripciones_comparar': {'consultas': 10},
+    'prescripciones_estadisticas': {'consultas': 12},
+    'productos_listado': {'consultas': 3},
+    'productos_bajo_stock': {'consultas': 3},
+    'productos_por_categoria': {'consultas': 1},
+    'productos_estadisticas': {'consultas': 12},
+}
+
+
+def escenarios():
+    """
+    Lista de (nombre, método, ruta, datos) con ids reales de la base de
+    datos: un paciente con al menos dos prescripciones (historial y
+    comparar) y un apellido para la búsqueda.
+    """
+    paciente = Paciente.objects.annotate(
+        total=Count('prescripciones')
+    ).filter(total__gte=2).order_by('id').first()
+    if paciente is None:
+        raise ValueError('Se necesita al menos un paciente con dos prescripciones (ver generar_datos).')
+    ids = list(Prescripcion.objects.filter(paciente=paciente).order_by('fecha_examen').values_list('id', flat=True)[:2])
+    busqueda = urlencode({'q': paciente.apellidos.split()[0]})
+
+    return [
+        ('pacientes_listado', 'GET', '/api/pacientes/', None),
+        ('pacientes_busqueda', 'GET', f'/api/pacientes/busqueda_avanzada/?{busqueda}', None),
+        ('prescripciones_listado', 'GET', '/api/prescripciones/', None),
+        ('prescripciones_historial_paciente', 'GET', f'/api/prescripciones/paciente/{paciente.id}/', None),
+        ('prescripciones_comparar', 'POST', '/api/prescripciones/comparar/',
+         {'prescripcion_1_id': ids[0], 'prescripcion_2_id': ids[1]}),
+        ('prescripciones_estadisticas', 'GET', '/api/prescripciones/estadisticas/', None),
+        ('productos_listado', 'GET', '/api/productos/', None),
+        ('productos_bajo_stock', 'GET', '/api/productos/bajo_stock/', None),
+        ('productos_por_categoria', 'GET', '/api/productos/por_categoria/', None),
+        ('productos_estadisticas', 'GET', '/api/productos/estadisticas/', None),
+    ]
+
+
+# Consultas de la autenticación JWT (carga del usuario) en el modo concurrente
+CONSULTAS_AUTENTICACION = 1
+
+# Consultas por petición en el encabezado Server-Timing de MetricasMiddleware
+CONSULTAS_SERVER_TIMING = re.compile(r'desc="(\d+) consultas"')
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) por rango más cercano"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def resumir(latencias, consultas, errores):
+    """p50/p95/p99 (ms), máximo de consultas por petición y errores"""
+    return {
+        'peticiones': len(latencias),
+        'errores': errores,
+        'p50_ms': round(percentil(latencias, 50), 2) if latencias else None,
+        'p95_ms': round(percentil(latencias, 95), 2) if latencias else None,
+        'p99_ms': round(percentil(latencias, 99), 2) if latencias else None,
+        'consultas': max(consultas) if consultas else None,
+    }
+
+
+def medir_en_proceso(usuario, lista_escenarios, repeticiones=30, calentamiento=2):
+    """
+    Ejecuta cada escenario con APIClient y retorna {nombre: resumen}. Las
+    primeras `calentamiento` peticiones no se cuentan (cachés frías).
+    """
+    cliente = APIClient()
+    cliente.force_authenticate(user=usuario)
+    resultados = {}
+    # El cliente de pruebas usa el host 'testserver'
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for nombre, metodo, ruta, datos in lista_escenarios:
+            latencias, consultas, errores = [], [], 0
+            for i in range(calentamiento + repeticiones):
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    if metodo == 'POST':
+                        response = cliente.post(ruta, datos, format='json')
+                    else:
+                        response = cliente.get(ruta)
+                    duracion = (time.perf_counter() - inicio) * 1000
+                if i < calentamiento:
+                    continue
+                if response.status_code >= 400:
+                    errores += 1
+                latencias.append(duracion)
+                consultas.append(len(capturadas))
+            resultados[nombre] = resumir(latencias, consultas, errores)
+    return resultados
+
+
+def medir_concurrente(url_base, lista_escenarios, usuarios=100, peticiones=10, token=None):
+    """
+    `usuarios` hilos, cada uno con su conexión HTTP, recorren los escenarios
+    `peticiones` veces contra un servidor en marcha, autenticados con el
+    token JWT de acceso `token`. Las consultas por petición se toman del
+    encabezado Server-Timing. Retorna {nombre: resumen}.
+    """
+    destino = urlsplit(url_base)
+    Conexion = http.client.HTTPSConnection if destino.scheme == 'https' else http.client.HTTPConnection
+    encabezados = {'Content-Type': 'application/json'}
+    if token:
+        encabezados['Authorization'] = f'Bearer {token}'
+
+    muestras = {nombre: ([], [], [0]) for nombre, *_ in lista_escenarios}
+    candado = threading.Lock()
+
+    def usuario_virtual(_):
+        conexion = Conexion(destino.netloc, timeout=30)
+        try:
+            for _ in range(peticiones):
+                for nombre, metodo, ruta, datos in lista_escenarios:
+                    cuerpo = json.dumps(datos) if datos is not None else None
+                    inicio = time.perf_counter()
+                    try:
+                        conexion.request(metodo, destino.path.rstrip('/') + ruta, body=cuerpo, headers=encabezados)
+                        respuesta = conexion.getresponse()
+                        respuesta.read()
+                        fallo = respuesta.status >= 400
+                        consultas = CONSULTAS_SERVER_TIMING.search(respuesta.getheader('Server-Timing', ''))
+                    except (OSError, http.client.HTTPException):
+                        conexion.close()
+                        conexion = Conexion(destino.netloc, timeout=30)
+                        fallo, consultas = True, None
+                    duracion = (time.perf_counter() - inicio) * 1000
+                    with candado:
+                        latencias, por_peticion, errores = muestras[nombre]
+                        latencias.append(duracion)
+                        if consultas:
+                            por_peticion.append(int(consultas.group(1)))
+                        errores[0] += fallo
+        finally:
+            conexion.close()
+
+    with ThreadPoolExecutor(max_workers=usuarios) as pool:
+        list(pool.map(usuario_virtual, range(usuarios)))
+
+    return {
+        nombre: resumir(latencias, consultas, errores[0])
+        for nombre, (latencias, consultas, errores) in muestras.items()
+    }
+
+
+def evaluar(resultados, umbrales=None, consultas_extra=0):
+    """
+    Lista de mensajes por cada escenario que supera sus umbrales o falló.
+    consultas_extra se suma a los límites de consultas (p. ej.
+    CONSULTAS_AUTENTICACION en el modo concurrente).
+    """
+    umbrales = umbrales or UMBRALES
+    fallos = []
+    for nombre, resumen in resultados.items():
+        limites = {**umbrales.get('*', {}), **umbrales.get(nombre, {})}
+        if 'consultas' in limites:
+            limites['consultas'] += consultas_extra
+        if resumen['errores']:
+            fallos.append(f"{nombre}: {resumen['errores']} peticiones con error")
+        for metrica, limite in limites.items():
+            valor = resumen.get(metrica)
+            if valor is not None and valor > limite:
+                fallos.append(f'{nombre}: {metrica} = {valor} (límite {limite})')
+    return fallos
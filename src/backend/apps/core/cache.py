@@ -0,0 +1,129 @@
+"""
+Caché de respuestas de endpoints de solo lectura.
+
+Las respuestas se agrupan (p. ej. "productos_bajo_stock") y cada grupo
+tiene una versión guardada en la caché; la clave de cada respuesta incluye
+esa versión, de modo que invalidar un grupo es solo cambiar su versión
+(las entradas viejas expiran solas). Cada app invalida sus grupos desde
+señales, solo cuando el cambio puede afectar la respuesta.
+
+Usa la caché "default": Redis si REDIS_URL está configurado, memoria
+local del proceso si no (ver settings/base.py).
+"""
+import hashlib
+import time
+from datetime import date
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+PREFIJO = 'respuestas'
+
+# Grupos registrados con @cachear_respuesta (para las estadísticas)
+GRUPOS = set()
+
+
+def _version(grupo):
+    clave = f'{PREFIJO}:version:{grupo}'
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, time.time_ns(), None)
+        version = cache.get(clave, 0)
+    return version
+
+
+def _contar(grupo, resultado):
+    clave = f'{PREFIJO}:{resultado}:{grupo}'
+    cache.add(clave, 0, None)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # La clave expiró entre add() e incr(), o la caché no guarda datos
+        pass
+
+
+def _alcance(request, alcance):
+    if alcance == 'usuario':
+        return f'usuario-{request.user.pk}'
+    return 'staff' if request.user.is_staff else 'general'
+
+
+def clave_respuesta(grupo, request, alcance='rol'):
+    """
+    Clave de la respuesta: grupo y su versión, alcance del usuario, ruta,
+    parámetros y fecha de hoy (los filtros de vigencia dependen del día).
+    """
+    parametros = '&'.join(
+        f'{nombre}={valor}'
+        for nombre in sorted(request.query_params)
+        for valor in request.query_params.getlist(nombre)
+    )
+    firma = hashlib.md5(
+        f'{request.path}?{parametros}|{date.today().isoformat()}'.encode('utf-8')
+    ).hexdigest()
+    return f'{PREFIJO}:{grupo}:{_version(grupo)}:{_alcance(request, alcance)}:{firma}'
+
+
+def cachear_respuesta(grupo, timeout=None, alcance='rol'):
+    """
+    Decorador para acciones GET de un ViewSet que guarda en caché las
+    respuestas 200.
+
+    alcance='rol' comparte la respuesta entre usuarios del mismo rol
+    (staff o no); alcance='usuario' la guarda por usuario.
+    """
+    GRUPOS.add(grupo)
+
+    def decorador(metodo):
+        @wraps(metodo)
+        def envoltura(self, request, *args, **kwargs):
+            clave = clave_respuesta(grupo, request, alcance)
+            datos = cache.get(clave)
+            if datos is not None:
+                _contar(grupo, 'aciertos')
+                return Response(datos)
+
+            _contar(grupo, 'fallos')
+            response = metodo(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(
+                    clave, response.data,
+                    timeout if timeout is not None else settings.CACHE_RESPUESTAS_TIMEOUT
+                )
+            return response
+        return envoltura
+    return decorador
+
+
+def invalidar(*grupos):
+    """
+    Invalida los grupos cuando se confirma la transacción en curso, para
+    que una lectura concurrente no vuelva a guardar datos sin confirmar.
+    """
+    def cambiar_versiones():
+        cache.set_many({f'{PREFIJO}:version:{grupo}': time.time_ns() for grupo in grupos}, None)
+    transaction.on_commit(cambiar_versiones)
+
+
+def estadisticas():
+    """Aciertos y fallos por grupo desde el último reinicio de la caché"""
+    claves = [
+        f'{PREFIJO}:{resultado}:{grupo}'
+        for grupo in GRUPOS for resultado in ('aciertos', 'fallos')
+    ]
+    valores = cache.get_many(claves)
+    resultado = {}
+    for grupo in sorted(GRUPOS):
+        aciertos = valores.get(f'{PREFIJO}:aciertos:{grupo}', 0)
+        fallos = valores.get(f'{PREFIJO}:fallos:{grupo}', 0)
+        total = aciertos + fallos
+        resultado[grupo] = {
+            'aciertos': aciertos,
+            'fallos': fallos,
+            'tasa_aciertos': round(aciertos / total, 4) if total else None,
+        }
+    return resultado
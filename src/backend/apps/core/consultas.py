@@ -0,0 +1,68 @@
+"""
+Detección de consultas N+1 y consultas lentas.
+
+Cada consulta se reduce a su forma (huella): sin literales ni parámetros y
+con las listas IN colapsadas, de modo que "SELECT ... WHERE id = 1" y
+"... WHERE id = 2" cuentan como la misma. Si una forma se repite más de
+CONSULTAS_REPETIDAS_MAXIMO veces en una petición es casi siempre una
+consulta por fila (N+1).
+
+DetectorConsultasMiddleware (solo en settings/development.py y
+settings/test.py) lo revisa en cada petición: advierte en el log o, con
+CONSULTAS_REPETIDAS_FALLAR, lanza ConsultasRepetidas. También registra las
+consultas que superan CONSULTA_LENTA_MS con la vista que las originó.
+"""
+import logging
+import re
+import time
+from collections import Counter
+
+logger = logging.getLogger('optica_visual.consultas')
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ESPACIOS = re.compile(r'\s+')
+
+
+class ConsultasRepetidas(Exception):
+    """Una petición repitió la misma forma de consulta demasiadas veces"""
+
+
+def huella(sql):
+    """Forma normalizada de la consulta"""
+    sql = _LITERALES.sub('?', sql)
+    sql = _LISTAS.sub('(...)', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+def repetidas(sentencias, maximo):
+    """[(huella, veces)] de las formas que se repiten más de `maximo` veces"""
+    conteo = Counter(huella(sql) for sql in sentencias)
+    return [(forma, veces) for forma, veces in conteo.most_common() if veces > maximo]
+
+
+def describir(repeticiones):
+    """Texto para el log o la excepción"""
+    return '\n'.join(f'  {veces} veces: {forma[:300]}' for forma, veces in repeticiones)
+
+
+class RegistroConsultas:
+    """
+    Envoltura de connection.execute_wrapper: guarda el SQL de cada consulta
+    y las que superan `lenta_ms` con su duración
+    """
+
+    def __init__(self, lenta_ms=None):
+        self.lenta_ms = lenta_ms
+        self.sentencias = []
+        self.lentas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sentencias.append(sql)
+            duracion = (time.perf_counter() - inicio) * 1000
+            if self.lenta_ms is not None and duracion > self.lenta_ms:
+                self.lentas.append((duracion, sql))
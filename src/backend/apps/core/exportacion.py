@@ -0,0 +1,94 @@
+"""
+Exportación de listados a CSV y XLSX por streaming.
+
+Las filas se leen con .iterator(chunk_size=...) (cursor del lado del
+servidor en PostgreSQL) y se escriben a medida que se leen; el XLSX se arma
+con el modo write-only de openpyxl sobre un archivo temporal. La memoria
+usada no depende del número de filas exportadas.
+"""
+import csv
+import datetime
+import tempfile
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+
+FORMATOS = ('csv', 'xlsx')
+
+# Filas leídas por cada viaje a la base de datos
+TAMANO_LOTE = 2000
+
+# Bytes enviados por cada bloque del archivo XLSX
+TAMANO_BLOQUE = 64 * 1024
+
+TIPOS_CONTENIDO = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class _Eco:
+    """Archivo que retorna lo que se le escribe (para csv.writer)"""
+
+    def write(self, valor):
+        return valor
+
+
+def _celda(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sí' if valor else 'No'
+    if isinstance(valor, datetime.datetime) and timezone.is_aware(valor):
+        # Excel no admite zonas horarias: hora local sin zona
+        return timezone.localtime(valor).replace(tzinfo=None)
+    return valor
+
+
+def _filas(queryset, columnas):
+    for obj in queryset.iterator(chunk_size=TAMANO_LOTE):
+        yield [_celda(valor(obj)) for _, valor in columnas]
+
+
+def _contenido_csv(queryset, columnas):
+    escritor = csv.writer(_Eco())
+    # BOM para que Excel reconozca UTF-8 (tildes y ñ)
+    yield '﻿' + escritor.writerow([encabezado for encabezado, _ in columnas])
+    for fila in _filas(queryset, columnas):
+        yield escritor.writerow(fila)
+
+
+def _contenido_xlsx(queryset, columnas, titulo):
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(title=titulo[:31])
+    hoja.append([encabezado for encabezado, _ in columnas])
+    for fila in _filas(queryset, columnas):
+        hoja.append(fila)
+
+    with tempfile.TemporaryFile() as archivo:
+        libro.save(archivo)
+        archivo.seek(0)
+        while True:
+            bloque = archivo.read(TAMANO_BLOQUE)
+            if not bloque:
+                break
+            yield bloque
+
+
+def exportar(queryset, columnas, nombre, formato):
+    """
+    StreamingHttpResponse con el queryset exportado.
+
+    columnas: lista de (encabezado, función que recibe el objeto y retorna
+    el valor de la celda). formato: 'csv' o 'xlsx'.
+    """
+    if formato == 'xlsx':
+        contenido = _contenido_xlsx(queryset, columnas, nombre.capitalize())
+    else:
+        contenido = _contenido_csv(queryset, columnas)
+
+    response = StreamingHttpResponse(contenido, content_type=TIPOS_CONTENIDO[formato])
+    archivo = f'{nombre}_{timezone.localdate():%Y%m%d}.{formato}'
+    response['Content-Disposition'] = f'attachment; filename="{archivo}"'
+    return response
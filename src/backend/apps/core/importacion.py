@@ -0,0 +1,169 @@
+"""
+Importación masiva desde CSV, XLSX o JSON.
+
+leer_filas convierte el archivo en una lista de (número de fila, datos)
+con los nombres de campo del modelo; cada app valida e inserta por lotes
+(ver apps/pacientes/importacion.py). Los archivos pequeños se importan
+dentro de la petición; los grandes se guardan y se procesan con la tarea
+procesar_importacion (ver apps/core/views.py), cuyo avance se consulta en
+/api/importaciones/<id>/.
+"""
+import csv
+import datetime
+import io
+import json
+import os
+import unicodedata
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+FORMATOS_IMPORTACION = ('csv', 'xlsx', 'json')
+
+# Errores de fila guardados en el resultado (se cuentan todos)
+MAXIMO_ERRORES = 1000
+
+
+class ErrorImportacion(Exception):
+    """El archivo no se puede leer (formato, codificación o estructura)"""
+
+
+def _clave(texto):
+    """Encabezado comparable: sin tildes, minúsculas y "_" como espacio"""
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return sin_tildes.lower().replace('_', ' ').strip()
+
+
+def _valor(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime.datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, datetime.date):
+        return valor.isoformat()
+    if isinstance(valor, float) and valor.is_integer():
+        # Excel guarda los documentos y teléfonos como números
+        return str(int(valor))
+    return str(valor).strip()
+
+
+def _mapear(encabezados, campos):
+    """
+    Columna -> campo ("Número Documento" o "numero_documento"). campos es
+    una lista de nombres o un dict {encabezado alternativo: campo}.
+    """
+    if not isinstance(campos, dict):
+        campos = {campo: campo for campo in campos}
+    por_clave = {_clave(encabezado): campo for encabezado, campo in campos.items()}
+    por_clave.update({_clave(campo): campo for campo in campos.values()})
+    return [por_clave.get(_clave(encabezado)) for encabezado in encabezados]
+
+
+def _filas_csv(contenido, campos):
+    try:
+        texto = contenido.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        # CSV guardado por Excel en Windows
+        texto = contenido.decode('cp1252', errors='replace')
+    try:
+        dialecto = csv.Sniffer().sniff(texto[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(io.StringIO(texto, newline=''), dialecto)
+    columnas = _mapear(next(lector, []), campos)
+    filas = []
+    for valores in lector:
+        if not any(valor.strip() for valor in valores):
+            continue
+        datos = {campo: valor.strip() for campo, valor in zip(columnas, valores) if campo and valor.strip()}
+        filas.append((lector.line_num, datos))
+    return filas
+
+
+def _filas_xlsx(contenido, campos):
+    try:
+        libro = load_workbook(io.BytesIO(contenido), read_only=True, data_only=True)
+    except (InvalidFileException, KeyError, OSError, ValueError) as error:
+        raise ErrorImportacion('El archivo no es un XLSX válido.') from error
+    try:
+        hoja = libro.active
+        valores_filas = hoja.iter_rows(values_only=True)
+        columnas = _mapear([_valor(valor) for valor in next(valores_filas, ())], campos)
+        filas = []
+        for numero, valores in enumerate(valores_filas, start=2):
+            if all(valor in (None, '') for valor in valores):
+                continue
+            datos = {
+                campo: _valor(valor) for campo, valor in zip(columnas, valores)
+                if campo and _valor(valor)
+            }
+            filas.append((numero, datos))
+        return filas
+    finally:
+        libro.close()
+
+
+def _filas_json(contenido, campos):
+    try:
+        registros = json.loads(contenido.decode('utf-8-sig'))
+    except (UnicodeDecodeError, ValueError) as error:
+        raise ErrorImportacion('El archivo no es un JSON válido.') from error
+    if not isinstance(registros, list) or not all(isinstance(r, dict) for r in registros):
+        raise ErrorImportacion('El JSON debe ser una lista de objetos.')
+    filas = []
+    for numero, registro in enumerate(registros, start=1):
+        columnas = _mapear(registro.keys(), campos)
+        datos = {
+            campo: valor for campo, valor in zip(columnas, registro.values())
+            if campo and valor not in (None, '')
+        }
+        filas.append((numero, datos))
+    return filas
+
+
+LECTORES = {
+    'csv': _filas_csv,
+    'xlsx': _filas_xlsx,
+    'json': _filas_json,
+}
+
+
+def formato_de(nombre, formato=None):
+    """Formato indicado o, si no, el de la extensión del archivo"""
+    formato = (formato or os.path.splitext(nombre or '')[1].lstrip('.')).lower()
+    if formato not in FORMATOS_IMPORTACION:
+        raise ErrorImportacion('Formato no soportado (csv, xlsx o json).')
+    return formato
+
+
+def leer_filas(archivo, formato, campos):
+    """
+    Lista de (número de fila, {campo: valor}) del archivo. Los encabezados
+    se comparan sin tildes ni mayúsculas con los nombres de campo (o los
+    encabezados alternativos, ver _mapear); las columnas desconocidas y las
+    celdas vacías se omiten (el campo toma su valor por defecto). El número de fila es el del archivo
+    (la fila 1 de un CSV o XLSX es el encabezado) o la posición en el JSON.
+    """
+    archivo.seek(0)
+    return LECTORES[formato](archivo.read(), campos)
+
+
+def nuevo_resultado(total_filas):
+    return {'total_filas': total_filas, 'filas_procesadas': 0, 'creados': 0, 'total_errores': 0, 'errores': []}
+
+
+def agregar_error(resultado, fila, errores):
+    """Registra el error de una fila (errores: {campo: [mensajes]})"""
+    resultado['total_errores'] += 1
+    if len(resultado['errores']) < MAXIMO_ERRORES:
+        resultado['errores'].append({
+            'fila': fila,
+            'errores': {campo: [str(m) for m in mensajes] for campo, mensajes in errores.items()},
+        })
+
+
+def lotes(filas, tamano):
+    for inicio in range(0, len(filas), tamano):
+        yield filas[inicio:inicio + tamano]
+
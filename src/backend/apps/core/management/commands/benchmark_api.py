@@ -0,0 +1,117 @@
+"""
+Benchmark de los endpoints principales de la API (ver apps/core/benchmark.py)
+
+Por defecto crea una base de datos temporal (como las pruebas), la llena
+con generar_datos según --escala y mide en el mismo proceso latencia y
+consultas por petición. Con --url mide con usuarios concurrentes contra un
+servidor en marcha que use la base de datos configurada, autenticados con
+un token JWT del usuario --usuario. Termina con error si algún escenario
+supera los umbrales.
+
+Uso:
+    python manage.py benchmark_api --escala 10k
+    python manage.py benchmark_api --bd-actual --repeticiones 50 --salida resultados.json
+    python manage.py benchmark_api --url http://localhost:8000 --usuarios 100
+"""
+import json
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.core import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Mide p50/p95/p99 y consultas por petición de los endpoints principales'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escala', choices=list(benchmark.ESCALAS), default='10k',
+            help='Volumen de datos generados en la base de datos temporal (por defecto 10k)'
+        )
+        parser.add_argument(
+            '--bd-actual', action='store_true',
+            help='Medir sobre la base de datos configurada, sin generar datos'
+        )
+        parser.add_argument('--repeticiones', type=int, default=30, help='Peticiones por escenario (en proceso)')
+        parser.add_argument('--url', help='URL de un servidor en marcha (modo concurrente)')
+        parser.add_argument('--usuarios', type=int, default=100, help='Usuarios concurrentes (por defecto 100)')
+        parser.add_argument('--peticiones', type=int, default=10, help='Rondas de escenarios por usuario concurrente')
+        parser.add_argument(
+            '--usuario', default='benchmark_api',
+            help='Usuario con el que se hacen las peticiones; se crea como staff si no existe'
+        )
+        parser.add_argument('--umbrales', help='JSON con umbrales que reemplazan o amplían los predeterminados')
+        parser.add_argument('--salida', help='Archivo donde guardar los resultados en JSON')
+
+    def handle(self, *args, **options):
+        umbrales = dict(benchmark.UMBRALES)
+        if options['umbrales']:
+            try:
+                with open(options['umbrales'], encoding='utf-8') as archivo:
+                    umbrales.update(json.load(archivo))
+            except (OSError, ValueError) as error:
+                raise CommandError(f'No se pudieron leer los umbrales: {error}')
+
+        if options['url']:
+            resultados = self.concurrente(options)
+        elif options['bd_actual']:
+            resultados = self.en_proceso(options)
+        else:
+            resultados = self.con_bd_temporal(options)
+
+        self.reportar(resultados)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2)
+
+        consultas_extra = benchmark.CONSULTAS_AUTENTICACION if options['url'] else 0
+        fallos = benchmark.evaluar(resultados, umbrales, consultas_extra)
+        if fallos:
+            raise CommandError('Umbrales superados:\n' + '\n'.join(fallos))
+        self.stdout.write(self.style.SUCCESS('Todos los escenarios dentro de los umbrales'))
+
+    def lista_escenarios(self):
+        try:
+            return benchmark.escenarios()
+        except ValueError as error:
+            raise CommandError(str(error))
+
+    def usuario(self, options):
+        usuario, _ = User.objects.get_or_create(
+            username=options['usuario'], defaults={'is_staff': True}
+        )
+        return usuario
+
+    def en_proceso(self, options):
+        return benchmark.medir_en_proceso(self.usuario(options), self.lista_escenarios(), options['repeticiones'])
+
+    def con_bd_temporal(self, options):
+        nombre_original = connection.settings_dict['NAME']
+        self.stdout.write(f"Creando base de datos temporal con la escala {options['escala']}...")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            call_command('generar_datos', stdout=self.stdout, **benchmark.ESCALAS[options['escala']])
+            return self.en_proceso(options)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+    def concurrente(self, options):
+        token = str(AccessToken.for_user(self.usuario(options)))
+        self.stdout.write(
+            f"{options['usuarios']} usuarios x {options['peticiones']} rondas contra {options['url']}..."
+        )
+        return benchmark.medir_concurrente(
+            options['url'], self.lista_escenarios(), options['usuarios'], options['peticiones'], token
+        )
+
+    def reportar(self, resultados):
+        self.stdout.write(f"{'Escenario':<36}{'N':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL':>6}{'Err':>6}")
+        for nombre, r in resultados.items():
+            consultas = '-' if r['consultas'] is None else r['consultas']
+            self.stdout.write(
+                f"{nombre:<36}{r['peticiones']:>6}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+                f"{r['p99_ms']:>10}{consultas:>6}{r['errores']:>6}"
+            )
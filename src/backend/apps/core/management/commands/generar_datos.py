@@ -0,0 +1,347 @@
+"""
+Genera datos sintéticos (pacientes, prescripciones y productos) para
+desarrollo y pruebas de carga
+
+Las distribuciones imitan las de la óptica: edades, graduaciones según la
+edad (miopía en jóvenes, hipermetropía y presbicia después de los 40),
+astigmatismo y categorías de productos. Con la misma --seed se generan los
+mismos datos. Todo se inserta con bulk_create por lotes, de modo que la
+memoria no depende de la cantidad pedida; al final se reconstruyen las
+estadísticas diarias y se invalidan las cachés.
+
+Uso:
+    python manage.py generar_datos
+    python manage.py generar_datos --pacientes 100000 --prescripciones-por-paciente 3 --productos 5000 --seed 7
+"""
+import random
+import time
+import unicodedata
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from apps.core.cache import invalidar
+from apps.pacientes.busqueda import indice_ngramas
+from apps.pacientes.models import Paciente
+from apps.prescripciones.cache import GRUPO_VIGENCIA
+from apps.prescripciones.models import DIAS_VIGENCIA, Prescripcion, SecuenciaPrescripcion
+from apps.productos.cache import GRUPO_BAJO_STOCK, GRUPO_CATEGORIAS
+from apps.productos.models import MovimientoStock, Producto
+from apps.reportes.models import EstadisticaDiariaInventario, EstadisticaDiariaPrescripcion
+
+NOMBRES_MUJER = [
+    'María', 'Ana', 'Luz', 'Carmen', 'Sandra', 'Diana', 'Paola', 'Laura', 'Valentina',
+    'Daniela', 'Camila', 'Sofía', 'Isabella', 'Mariana', 'Gloria', 'Marta', 'Claudia',
+    'Patricia', 'Lucía', 'Andrea', 'Natalia', 'Juliana', 'Adriana', 'Beatriz', 'Rosa',
+]
+NOMBRES_HOMBRE = [
+    'José', 'Juan', 'Carlos', 'Luis', 'Andrés', 'Jorge', 'Diego', 'Santiago', 'Sebastián',
+    'Alejandro', 'Mateo', 'Samuel', 'David', 'Daniel', 'Felipe', 'Camilo', 'Julián',
+    'Fernando', 'Ricardo', 'Óscar', 'Héctor', 'Miguel', 'Jairo', 'Álvaro', 'Iván',
+]
+APELLIDOS = [
+    'Rodríguez', 'Gómez', 'González', 'Martínez', 'García', 'López', 'Hernández',
+    'Sánchez', 'Ramírez', 'Pérez', 'Díaz', 'Muñoz', 'Rojas', 'Moreno', 'Jiménez',
+    'Vargas', 'Castro', 'Gutiérrez', 'Ortiz', 'Álvarez', 'Ruiz', 'Suárez', 'Romero',
+    'Torres', 'Quintero', 'Mejía', 'Restrepo', 'Ospina', 'Cardona', 'Zapata',
+]
+DOMINIOS_EMAIL = ['gmail.com', 'hotmail.com', 'outlook.com', 'yahoo.com']
+
+# (edad mínima, edad máxima, peso) de los pacientes
+RANGOS_EDAD = [(5, 17, 15), (18, 39, 30), (40, 64, 40), (65, 90, 15)]
+
+# Agudeza visual según la esfera absoluta (sin corrección)
+AGUDEZAS = [(0.5, '20/20'), (1.0, '20/30'), (2.0, '20/50'), (3.0, '20/100'), (None, '20/200')]
+
+OBSERVACIONES = [
+    '', '', '',
+    'Paciente refiere fatiga visual al final del día.',
+    'Control anual recomendado.',
+    'Se recomienda filtro de luz azul por uso prolongado de pantallas.',
+    'Progresión de la miopía respecto al examen anterior.',
+    'Uso permanente de la corrección.',
+]
+
+# categoría: (peso, nombres, marcas, rango de precio de compra)
+PRODUCTOS = {
+    'MONTURA': (40, ['Montura Metálica', 'Montura Acetato', 'Montura TR90', 'Montura al Aire'],
+                ['Ray-Ban', 'Oakley', 'Vogue', 'Carrera', 'Genérica'], (40000, 350000)),
+    'LENTE': (30, ['Lente Monofocal', 'Lente Bifocal', 'Lente Progresivo', 'Lente de Contacto'],
+              ['Essilor', 'Hoya', 'Zeiss', 'Rodenstock', 'Genérico'], (30000, 600000)),
+    'ACCESORIO': (10, ['Cordón', 'Cadena', 'Clip Solar', 'Almohadillas'],
+                  ['Genérico'], (3000, 40000)),
+    'LIMPIEZA': (8, ['Spray Limpiador', 'Paño Microfibra', 'Kit de Limpieza'],
+                 ['Genérico', 'Zeiss'], (4000, 30000)),
+    'ESTUCHE': (8, ['Estuche Rígido', 'Estuche Blando', 'Estuche Plegable'],
+                ['Genérico'], (5000, 45000)),
+    'OTROS': (4, ['Tarjeta Regalo', 'Lupa de Lectura'],
+              ['Genérico'], (10000, 80000)),
+}
+COLORES = ['Negro', 'Café', 'Dorado', 'Plateado', 'Azul', 'Carey', 'Transparente', 'Rojo']
+
+# Años hacia atrás en que se reparten los exámenes
+ANIOS_HISTORIA = 5
+
+
+def _ascii(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def _cuarto(valor, minimo, maximo):
+    """Redondea a pasos de 0.25 dioptrías dentro de [minimo, maximo]"""
+    valor = min(max(valor, minimo), maximo)
+    return Decimal(round(valor * 4) / 4).quantize(Decimal('0.01'))
+
+
+class GeneradorDatos:
+    """Datos aleatorios reproducibles (un random.Random con la semilla)"""
+
+    def __init__(self, seed, hoy):
+        self.rng = random.Random(seed)
+        self.hoy = hoy
+
+    def paciente(self, numero_documento):
+        rng = self.rng
+        minimo, maximo, _ = rng.choices(RANGOS_EDAD, weights=[r[2] for r in RANGOS_EDAD])[0]
+        edad = rng.randint(minimo, maximo)
+        fecha_nacimiento = self.hoy - timedelta(days=edad * 365 + rng.randint(0, 364))
+
+        nombres_base = NOMBRES_MUJER if rng.random() < 0.55 else NOMBRES_HOMBRE
+        nombres = ' '.join(rng.sample(nombres_base, rng.choice([1, 1, 2])))
+        apellidos = ' '.join(rng.sample(APELLIDOS, 2))
+        if edad < 7:
+            tipo_documento = 'RC'
+        elif edad < 18:
+            tipo_documento = 'TI'
+        else:
+            tipo_documento = rng.choices(['CC', 'CE', 'PP'], weights=[95, 4, 1])[0]
+
+        email = ''
+        if edad >= 15 and rng.random() < 0.6:
+            usuario = f"{_ascii(nombres.split()[0])}.{_ascii(apellidos.split()[0])}{rng.randint(1, 999)}"
+            email = f'{usuario}@{rng.choice(DOMINIOS_EMAIL)}'
+
+        paciente = Paciente(
+            tipo_documento=tipo_documento,
+            numero_documento=numero_documento,
+            nombres=nombres,
+            apellidos=apellidos,
+            fecha_nacimiento=fecha_nacimiento,
+            telefono=f'3{rng.randint(0, 999999999):09d}' if rng.random() < 0.9 else '',
+            email=email,
+            direccion=(
+                f"{rng.choice(['Calle', 'Carrera', 'Avenida', 'Diagonal'])} {rng.randint(1, 150)} "
+                f"# {rng.randint(1, 99)}-{rng.randint(1, 99)}"
+            ),
+        )
+        paciente.actualizar_texto_busqueda()
+        return paciente
+
+    def cantidad_prescripciones(self, promedio):
+        if promedio <= 0:
+            return 0
+        return min(2 * promedio, max(0, round(self.rng.gauss(promedio, promedio / 2))))
+
+    def fechas_examen(self, cantidad, fecha_nacimiento):
+        inicio = max(fecha_nacimiento + timedelta(days=4 * 365), self.hoy - timedelta(days=ANIOS_HISTORIA * 365))
+        dias = max((self.hoy - inicio).days, 0)
+        return sorted(inicio + timedelta(days=self.rng.randint(0, dias)) for _ in range(cantidad))
+
+    def prescripcion(self, paciente, profesional, fecha_examen):
+        rng = self.rng
+        edad = fecha_examen.year - paciente.fecha_nacimiento.year
+
+        # Equivalente esférico: miopía más frecuente en jóvenes, hipermetropía
+        # en mayores; la mayoría de graduaciones son bajas
+        if edad < 40:
+            esfera = rng.gauss(-1.0, 2.0) if rng.random() < 0.6 else rng.gauss(0.5, 0.75)
+        else:
+            esfera = rng.gauss(1.0, 1.5) if rng.random() < 0.6 else rng.gauss(-1.5, 2.0)
+        od_esfera = _cuarto(esfera, -20, 20)
+        os_esfera = _cuarto(esfera + rng.gauss(0, 0.4), -20, 20)
+
+        def cilindro_y_eje():
+            if rng.random() < 0.55:
+                return Decimal('0.00'), 0
+            cilindro = _cuarto(-abs(rng.gauss(0, 1.0)) - 0.25, -6, -0.25)
+            # Astigmatismo a favor / en contra de la regla más frecuentes
+            eje = rng.choice([rng.randint(170, 180), rng.randint(1, 10), rng.randint(80, 100), rng.randint(1, 180)])
+            return cilindro, eje
+        od_cilindro, od_eje = cilindro_y_eje()
+        os_cilindro, os_eje = cilindro_y_eje()
+
+        adicion = None
+        if edad >= 40:
+            base = min(0.75 + (edad - 40) * 0.1, 2.75)
+            adicion = _cuarto(base + rng.choice([-0.25, 0, 0, 0.25]), 0.75, 4)
+
+        if adicion is not None:
+            tipo_lente = rng.choices(['Progresivo', 'Bifocal', 'Monofocal'], weights=[60, 25, 15])[0]
+        else:
+            tipo_lente = 'Monofocal'
+
+        def agudeza(esfera):
+            for limite, valor in AGUDEZAS:
+                if limite is None or abs(esfera) <= limite:
+                    return valor
+
+        media_dp = 63 if edad >= 16 else 56
+        fecha_vencimiento = fecha_examen + timedelta(days=DIAS_VIGENCIA)
+        return Prescripcion(
+            paciente=paciente,
+            profesional=profesional,
+            fecha_examen=fecha_examen,
+            od_esfera=od_esfera, od_cilindro=od_cilindro, od_eje=od_eje,
+            os_esfera=os_esfera, os_cilindro=os_cilindro, os_eje=os_eje,
+            adicion=adicion,
+            distancia_pupilar=min(max(round(rng.gauss(media_dp, 3)), 50), 80),
+            agudeza_visual_od=agudeza(od_esfera),
+            agudeza_visual_os=agudeza(os_esfera),
+            observaciones=rng.choice(OBSERVACIONES),
+            tipo_lente_recomendado=tipo_lente,
+            fecha_vencimiento=fecha_vencimiento,
+            vigente=False,
+        )
+
+    def producto(self, codigo):
+        rng = self.rng
+        categoria = rng.choices(list(PRODUCTOS), weights=[p[0] for p in PRODUCTOS.values()])[0]
+        _, nombres, marcas, (precio_minimo, precio_maximo) = PRODUCTOS[categoria]
+        nombre = f'{rng.choice(nombres)} {rng.choice(marcas)}'
+        if categoria == 'MONTURA':
+            nombre += f' {rng.choice(COLORES)}'
+
+        # Precios log-uniformes: muchos productos baratos, pocos costosos
+        compra = precio_minimo * (precio_maximo / precio_minimo) ** rng.random()
+        precio_compra = Decimal(round(compra, -2))
+        precio_venta = Decimal(round(compra * rng.uniform(1.4, 2.5), -2))
+        stock_minimo = rng.choice([1, 2, 3, 5, 10])
+        stock = max(0, round(rng.gauss(stock_minimo * 3, stock_minimo * 2)))
+        return Producto(
+            nombre=nombre,
+            categoria=categoria,
+            codigo=codigo,
+            precio_compra=precio_compra,
+            precio_venta=precio_venta,
+            stock=stock,
+            stock_minimo=stock_minimo,
+            activo=rng.random() < 0.95,
+        )
+
+
+class Command(BaseCommand):
+    help = 'Genera pacientes, prescripciones y productos sintéticos con bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=1000, help='Pacientes a generar (por defecto 1000)')
+        parser.add_argument(
+            '--prescripciones-por-paciente', type=int, default=2,
+            help='Promedio de prescripciones por paciente (por defecto 2)'
+        )
+        parser.add_argument('--productos', type=int, default=200, help='Productos a generar (por defecto 200)')
+        parser.add_argument('--profesionales', type=int, default=5, help='Optómetras a repartir (por defecto 5)')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla aleatoria (por defecto 42)')
+        parser.add_argument(
+            '--documento-inicial', type=int, default=1000000000,
+            help='Primer número de documento (por defecto 1000000000)'
+        )
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por INSERT masivo (por defecto 5000)')
+
+    def handle(self, *args, **options):
+        for opcion in ('pacientes', 'prescripciones_por_paciente', 'productos', 'profesionales'):
+            if options[opcion] < 0:
+                raise CommandError(f"--{opcion.replace('_', '-')} no puede ser negativo")
+        if options['lote'] < 1 or options['profesionales'] < 1:
+            raise CommandError('--lote y --profesionales deben ser mayores que cero')
+
+        inicio = time.perf_counter()
+        generador = GeneradorDatos(options['seed'], date.today())
+        profesionales = self.profesionales(options['profesionales'])
+
+        pacientes, prescripciones = self.generar_pacientes(
+            generador, profesionales, options['pacientes'],
+            options['prescripciones_por_paciente'], options['documento_inicial'], options['lote']
+        )
+        productos = self.generar_productos(generador, options['productos'], options['seed'], options['lote'])
+
+        # Los bulk_create no envían señales: estadísticas, cachés e índice
+        self.stdout.write('Reconstruyendo estadísticas...')
+        desde = date.today() - timedelta(days=ANIOS_HISTORIA * 366)
+        EstadisticaDiariaPrescripcion.reconstruir(desde=desde)
+        EstadisticaDiariaInventario.reconstruir()
+        with transaction.atomic():
+            invalidar(GRUPO_VIGENCIA, GRUPO_CATEGORIAS, GRUPO_BAJO_STOCK)
+        indice_ngramas.invalidar()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generados {pacientes} pacientes, {prescripciones} prescripciones y '
+            f'{productos} productos en {time.perf_counter() - inicio:.1f} s'
+        ))
+
+    def profesionales(self, cantidad):
+        """Optómetras optometra_gen_NN (se reutilizan si ya existen)"""
+        usernames = [f'optometra_gen_{i:02d}' for i in range(1, cantidad + 1)]
+        existentes = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        User.objects.bulk_create([
+            User(username=username, first_name='Optómetra', last_name=f'Generado {username[-2:]}', is_staff=True)
+            for username in usernames if username not in existentes
+        ])
+        return list(User.objects.filter(username__in=usernames).order_by('username'))
+
+    def generar_pacientes(self, generador, profesionales, cantidad, promedio, documento_inicial, tamano_lote):
+        total_prescripciones = 0
+        anio = date.today().year
+        for inicio in range(0, cantidad, tamano_lote):
+            documentos = [str(documento_inicial + i) for i in range(inicio, min(inicio + tamano_lote, cantidad))]
+            if Paciente.objects.filter(numero_documento__in=documentos).exists():
+                raise CommandError(
+                    f'Ya existen pacientes con documentos entre {documentos[0]} y {documentos[-1]}; '
+                    'use otro --documento-inicial'
+                )
+            pacientes = [generador.paciente(documento) for documento in documentos]
+
+            with transaction.atomic():
+                Paciente.objects.bulk_create(pacientes, batch_size=tamano_lote)
+                prescripciones = []
+                for paciente in pacientes:
+                    fechas = generador.fechas_examen(
+                        generador.cantidad_prescripciones(promedio), paciente.fecha_nacimiento
+                    )
+                    del_paciente = [
+                        generador.prescripcion(paciente, generador.rng.choice(profesionales), fecha)
+                        for fecha in fechas
+                    ]
+                    # Solo la más reciente, si no ha vencido, queda vigente
+                    if del_paciente and del_paciente[-1].fecha_vencimiento >= generador.hoy:
+                        del_paciente[-1].vigente = True
+                    prescripciones.extend(del_paciente)
+
+                if prescripciones:
+                    numeros = SecuenciaPrescripcion.reservar(anio, len(prescripciones))
+                    for prescripcion, numero in zip(prescripciones, numeros):
+                        prescripcion.numero_prescripcion = SecuenciaPrescripcion.formatear(anio, numero)
+                    Prescripcion.objects.bulk_create(prescripciones, batch_size=tamano_lote)
+
+            total_prescripciones += len(prescripciones)
+            self.stdout.write(f'Pacientes: {inicio + len(pacientes)}/{cantidad}')
+        return cantidad, total_prescripciones
+
+    def generar_productos(self, generador, cantidad, seed, tamano_lote):
+        for inicio in range(0, cantidad, tamano_lote):
+            codigos = [f'GEN{seed}-{i + 1:07d}' for i in range(inicio, min(inicio + tamano_lote, cantidad))]
+            if Producto.objects.filter(codigo__in=codigos).exists():
+                raise CommandError(f'Ya existen productos con códigos {codigos[0]}...; use otra --seed')
+            productos = [generador.producto(codigo) for codigo in codigos]
+
+            with transaction.atomic():
+                Producto.objects.bulk_create(productos, batch_size=tamano_lote)
+                # Movimiento INICIAL del kardex, como al crear con save()
+                MovimientoStock.objects.bulk_create([
+                    MovimientoStock(producto=producto, tipo='INICIAL', cantidad=producto.stock,
+                                    stock_resultante=producto.stock)
+                    for producto in productos if producto.stock
+                ], batch_size=tamano_lote)
+            self.stdout.write(f'Productos: {inicio + len(productos)}/{cantidad}')
+        return cantidad
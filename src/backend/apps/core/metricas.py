@@ -0,0 +1,120 @@
+"""
+Métricas por endpoint en formato Prometheus.
+
+MetricasMiddleware (apps/core/middleware.py) registra por cada petición
+la vista (viewset.acción), el método, el código de respuesta, el tiempo
+total, el tiempo en la base de datos y las consultas SQL. Aquí se
+acumulan en histogramas en memoria del proceso, que se publican en
+/metrics para que Prometheus los recolecte.
+
+Con varios procesos (gunicorn con workers) cada proceso tiene sus propios
+histogramas y /metrics muestra los del proceso que atiende la petición;
+Prometheus los suma por instancia.
+"""
+import threading
+
+# Límites de los histogramas: segundos (tiempo total y de base de datos)
+# y número de consultas por petición
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+LIMITES_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMAS = (
+    ('http_request_duration_seconds', 'Tiempo total de la petición', LIMITES_SEGUNDOS),
+    ('http_request_db_duration_seconds', 'Tiempo de la petición en consultas SQL', LIMITES_SEGUNDOS),
+    ('http_request_db_queries', 'Consultas SQL por petición', LIMITES_CONSULTAS),
+)
+
+# Métodos con serie propia; los demás (cualquier verbo que envíe un cliente)
+# se agrupan en "otro" para que las series no crezcan sin límite
+METODOS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+_candado = threading.Lock()
+
+# {(vista, método): [histograma por cada uno de HISTOGRAMAS]}
+_histogramas = {}
+# {(vista, método, código): peticiones}
+_respuestas = {}
+
+
+class Histograma:
+    """Conteos acumulados por límite, suma y total (como en Prometheus)"""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.conteos = [0] * len(limites)
+        self.suma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.conteos[i] += 1
+        self.suma += valor
+        self.total += 1
+
+
+def normalizar_metodo(metodo):
+    """El método HTTP si es uno de METODOS, "otro" si no"""
+    return metodo if metodo in METODOS else 'otro'
+
+
+def registrar(vista, metodo, codigo, duracion, duracion_bd, consultas):
+    """Agrega una petición: duraciones en segundos"""
+    metodo = normalizar_metodo(metodo)
+    with _candado:
+        histogramas = _histogramas.get((vista, metodo))
+        if histogramas is None:
+            histogramas = _histogramas[(vista, metodo)] = [
+                Histograma(limites) for _, _, limites in HISTOGRAMAS
+            ]
+        for histograma, valor in zip(histogramas, (duracion, duracion_bd, consultas)):
+            histograma.observar(valor)
+        clave = (vista, metodo, codigo)
+        _respuestas[clave] = _respuestas.get(clave, 0) + 1
+
+
+def reiniciar():
+    """Descarta lo acumulado (pruebas)"""
+    with _candado:
+        _histogramas.clear()
+        _respuestas.clear()
+
+
+def _etiquetas(**valores):
+    texto = ','.join(
+        '{}="{}"'.format(nombre, str(valor).replace('\\', '\\\\').replace('"', '\\"'))
+        for nombre, valor in valores.items()
+    )
+    return '{' + texto + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exportar():
+    """Texto en el formato de exposición de Prometheus (versión 0.0.4)"""
+    with _candado:
+        lineas = [
+            '# HELP http_requests_total Peticiones atendidas',
+            '# TYPE http_requests_total counter',
+        ]
+        for (vista, metodo, codigo), total in sorted(_respuestas.items()):
+            lineas.append(
+                f'http_requests_total{_etiquetas(vista=vista, metodo=metodo, codigo=codigo)} {total}'
+            )
+
+        for indice, (nombre, ayuda, limites) in enumerate(HISTOGRAMAS):
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} histogram')
+            for (vista, metodo), valores in sorted(_histogramas.items()):
+                histograma = valores[indice]
+                for limite, conteo in zip(limites, histograma.conteos):
+                    etiquetas = _etiquetas(vista=vista, metodo=metodo, le=_numero(limite))
+                    lineas.append(f'{nombre}_bucket{etiquetas} {conteo}')
+                etiquetas = _etiquetas(vista=vista, metodo=metodo, le='+Inf')
+                lineas.append(f'{nombre}_bucket{etiquetas} {histograma.total}')
+                etiquetas = _etiquetas(vista=vista, metodo=metodo)
+                lineas.append(f'{nombre}_sum{etiquetas} {_numero(histograma.suma)}')
+                lineas.append(f'{nombre}_count{etiquetas} {histograma.total}')
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,139 @@
+"""
+Middleware de la aplicación
+"""
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from . import auditoria, consultas, metricas
+
+
+class ContadorConsultas:
+    """
+    Envoltura de connection.execute_wrapper: cuenta las consultas SQL y
+    suma su tiempo (incluye executemany, p. ej. bulk_create)
+    """
+
+    def __init__(self):
+        self.consultas = 0
+        self.duracion = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duracion += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+def nombre_vista(request, view_func):
+    """
+    "Viewset.acción" para los viewsets de DRF (p. ej.
+    "PacienteViewSet.list" o "ProductoViewSet.bajo_stock"), el nombre de la
+    clase para las demás vistas basadas en clases y el nombre de la URL
+    (p. ej. "admin:index") para las funciones
+    """
+    clase = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if clase is None:
+        return request.resolver_match.view_name or f'{view_func.__module__}.{view_func.__name__}'
+    acciones = getattr(view_func, 'actions', None)
+    if acciones:
+        metodo = metricas.normalizar_metodo(request.method).lower()
+        return f'{clase.__name__}.{acciones.get(metodo, metodo)}'
+    return clase.__name__
+
+
+class MetricasMiddleware:
+    """
+    Mide cada petición: tiempo total, tiempo y número de consultas SQL en
+    todas las bases de datos. Lo agrega por vista en apps.core.metricas
+    (publicado en /metrics) y lo agrega al encabezado Server-Timing, p. ej.
+    "total;dur=42.1, db;dur=8.3;desc="5 consultas"".
+
+    Debe ir primero en MIDDLEWARE para que el tiempo total incluya a los
+    demás middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        contador = ContadorConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as envolturas:
+            for conexion in connections.all():
+                envolturas.enter_context(conexion.execute_wrapper(contador))
+            response = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        vista = getattr(request, 'vista_metricas', 'sin_vista')
+        metricas.registrar(
+            vista, request.method, response.status_code, duracion, contador.duracion, contador.consultas
+        )
+        tiempos = (
+            f'total;dur={duracion * 1000:.1f}, '
+            f'db;dur={contador.duracion * 1000:.1f};desc="{contador.consultas} consultas"'
+        )
+        # Se agrega a las entradas de la vista (p. ej. busqueda_avanzada)
+        if response.has_header('Server-Timing'):
+            tiempos = f"{response['Server-Timing']}, {tiempos}"
+        response['Server-Timing'] = tiempos
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.vista_metricas = nombre_vista(request, view_func)
+
+
+class DetectorConsultasMiddleware:
+    """
+    Advierte (o falla, con CONSULTAS_REPETIDAS_FALLAR) cuando una petición
+    repite la misma forma de consulta más de CONSULTAS_REPETIDAS_MAXIMO veces
+    y registra las consultas más lentas que CONSULTA_LENTA_MS, con la vista
+    que las originó (ver apps/core/consultas.py). Solo para desarrollo y
+    pruebas: guarda el SQL de toda la petición.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        registro = consultas.RegistroConsultas(settings.CONSULTA_LENTA_MS)
+        with ExitStack() as envolturas:
+            for conexion in connections.all():
+                envolturas.enter_context(conexion.execute_wrapper(registro))
+            response = self.get_response(request)
+
+        vista = getattr(request, 'vista_consultas', 'sin_vista')
+        origen = f'{request.method} {request.path} ({vista})'
+        for duracion, sql in registro.lentas:
+            consultas.logger.warning('Consulta lenta (%.1f ms) en %s: %s', duracion, origen, sql)
+
+        maximo = settings.CONSULTAS_REPETIDAS_MAXIMO
+        if maximo is not None:
+            repeticiones = consultas.repetidas(registro.sentencias, maximo)
+            if repeticiones:
+                mensaje = f'Consultas repetidas (posible N+1) en {origen}:\n{consultas.describir(repeticiones)}'
+                if settings.CONSULTAS_REPETIDAS_FALLAR:
+                    raise consultas.ConsultasRepetidas(mensaje)
+                consultas.logger.warning(mensaje)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.vista_consultas = nombre_vista(request, view_func)
+
+
+class AuditoriaMiddleware:
+    """
+    Agrupa los registros de auditoría de la petición en un solo lote y
+    toma de ella el usuario (ver apps/core/auditoria.py). Después de
+    AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with auditoria.lote(request):
+            return self.get_response(request)
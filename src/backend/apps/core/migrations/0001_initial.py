@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Importacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('pacientes', 'Pacientes')], max_length=20, verbose_name='Tipo')),
+                ('archivo', models.FileField(blank=True, help_text='Se elimina al terminar la importación', upload_to='importaciones/', verbose_name='Archivo')),
+                ('formato', models.CharField(max_length=4, verbose_name='Formato')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completada', 'Completada'), ('fallida', 'Fallida')], default='pendiente', max_length=12, verbose_name='Estado')),
+                ('total_filas', models.PositiveIntegerField(default=0, verbose_name='Total de Filas')),
+                ('filas_procesadas', models.PositiveIntegerField(default=0, verbose_name='Filas Procesadas')),
+                ('creados', models.PositiveIntegerField(default=0, verbose_name='Registros Creados')),
+                ('total_errores', models.PositiveIntegerField(default=0, verbose_name='Filas con Errores')),
+                ('errores', models.JSONField(blank=True, default=list, help_text='Errores por fila (los primeros MAXIMO_ERRORES)', verbose_name='Errores')),
+                ('mensaje', models.TextField(blank=True, help_text='Motivo si la importación falló', verbose_name='Mensaje')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_finalizacion', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Finalización')),
+                ('usuario', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='importaciones', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Importación',
+                'verbose_name_plural': 'Importaciones',
+                'db_table': 'importaciones',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+    ]
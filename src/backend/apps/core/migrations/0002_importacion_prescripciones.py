@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importacion',
+            name='tipo',
+            field=models.CharField(choices=[('pacientes', 'Pacientes'), ('prescripciones', 'Prescripciones')], max_length=20, verbose_name='Tipo'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:36
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0002_importacion_prescripciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroCambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(help_text='app.modelo, p. ej. productos.producto', max_length=100, verbose_name='Modelo')),
+                ('objeto_id', models.CharField(max_length=40, verbose_name='ID del Registro')),
+                ('accion', models.CharField(choices=[('C', 'Creación'), ('U', 'Actualización'), ('D', 'Eliminación')], max_length=1, verbose_name='Acción')),
+                ('cambios', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='{"campo": [anterior, nuevo]}', verbose_name='Cambios')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('usuario', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Registro de Cambio',
+                'verbose_name_plural': 'Registro de Cambios',
+                'db_table': 'registro_cambios',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['modelo', 'objeto_id', '-fecha'], name='registro_cambio_objeto_idx'), models.Index(fields=['fecha'], name='registro_cambio_fecha_idx')],
+            },
+        ),
+    ]
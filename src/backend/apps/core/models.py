@@ -0,0 +1,153 @@
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class Importacion(models.Model):
+    """
+    Importación masiva procesada en segundo plano (ver importacion.py)
+    """
+    PENDIENTE = 'pendiente'
+    PROCESANDO = 'procesando'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (PROCESANDO, 'Procesando'),
+        (COMPLETADA, 'Completada'),
+        (FALLIDA, 'Fallida'),
+    ]
+
+    TIPOS = [
+        ('pacientes', 'Pacientes'),
+        ('prescripciones', 'Prescripciones'),
+    ]
+
+    # Función que importa cada tipo: (archivo, formato, usuario, al_avanzar) -> resultado
+    IMPORTADORES = {
+        'pacientes': 'apps.pacientes.importacion.importar_archivo',
+        'prescripciones': 'apps.prescripciones.importacion.importar_archivo',
+    }
+
+    tipo = models.CharField(
+        max_length=20,
+        choices=TIPOS,
+        verbose_name='Tipo'
+    )
+    archivo = models.FileField(
+        upload_to='importaciones/',
+        blank=True,
+        verbose_name='Archivo',
+        help_text='Se elimina al terminar la importación'
+    )
+    formato = models.CharField(
+        max_length=4,
+        verbose_name='Formato'
+    )
+    estado = models.CharField(
+        max_length=12,
+        choices=ESTADOS,
+        default=PENDIENTE,
+        verbose_name='Estado'
+    )
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='importaciones',
+        verbose_name='Usuario'
+    )
+
+    # Avance y resultado
+    total_filas = models.PositiveIntegerField(default=0, verbose_name='Total de Filas')
+    filas_procesadas = models.PositiveIntegerField(default=0, verbose_name='Filas Procesadas')
+    creados = models.PositiveIntegerField(default=0, verbose_name='Registros Creados')
+    total_errores = models.PositiveIntegerField(default=0, verbose_name='Filas con Errores')
+    errores = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name='Errores',
+        help_text='Errores por fila (los primeros MAXIMO_ERRORES)'
+    )
+    mensaje = models.TextField(
+        blank=True,
+        verbose_name='Mensaje',
+        help_text='Motivo si la importación falló'
+    )
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
+    fecha_finalizacion = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de Finalización')
+
+    class Meta:
+        db_table = 'importaciones'
+        verbose_name = 'Importación'
+        verbose_name_plural = 'Importaciones'
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Importación de {self.get_tipo_display().lower()} #{self.pk} ({self.estado})"
+
+    @property
+    def porcentaje(self):
+        """Porcentaje de filas procesadas"""
+        if not self.total_filas:
+            return 100 if self.estado == self.COMPLETADA else 0
+        return round(self.filas_procesadas * 100 / self.total_filas, 1)
+
+
+class RegistroCambio(models.Model):
+    """
+    Cambio de un registro de cualquier modelo (ver auditoria.py)
+
+    Tabla de solo inserción y sin llaves foráneas: el historial no bloquea
+    ni sigue a los registros que describe. La fecha está indexada para
+    consultar o depurar los cambios antiguos por rango de fechas.
+    """
+    CREAR = 'C'
+    ACTUALIZAR = 'U'
+    ELIMINAR = 'D'
+    ACCIONES = [
+        (CREAR, 'Creación'),
+        (ACTUALIZAR, 'Actualización'),
+        (ELIMINAR, 'Eliminación'),
+    ]
+
+    modelo = models.CharField(
+        max_length=100,
+        verbose_name='Modelo',
+        help_text='app.modelo, p. ej. productos.producto'
+    )
+    objeto_id = models.CharField(max_length=40, verbose_name='ID del Registro')
+    accion = models.CharField(max_length=1, choices=ACCIONES, verbose_name='Acción')
+    cambios = models.JSONField(
+        default=dict,
+        encoder=DjangoJSONEncoder,
+        verbose_name='Cambios',
+        help_text='{"campo": [anterior, nuevo]}'
+    )
+    # Sin restricción de llave foránea: eliminar el usuario no toca el historial
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Usuario'
+    )
+    fecha = models.DateTimeField(default=timezone.now, verbose_name='Fecha')
+
+    class Meta:
+        db_table = 'registro_cambios'
+        verbose_name = 'Registro de Cambio'
+        verbose_name_plural = 'Registro de Cambios'
+        ordering = ['-fecha']
+        indexes = [
+            # Historial de un registro
+            models.Index(fields=['modelo', 'objeto_id', '-fecha'], name='registro_cambio_objeto_idx'),
+            models.Index(fields=['fecha'], name='registro_cambio_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_accion_display()} de {self.modelo} #{self.objeto_id}"
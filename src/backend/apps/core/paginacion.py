@@ -0,0 +1,147 @@
+"""
+Paginación de los listados de la API.
+
+Por defecto se usan páginas numeradas (?page=N), que cuentan el total y
+recorren con OFFSET: las páginas profundas son cada vez más lentas. Con
+?paginacion=cursor se usa paginación por keyset: cada página se pide
+"después de" la última fila vista, según el mismo orden del listado
+(p. ej. -fecha_examen, -fecha_registro), sin COUNT ni OFFSET y sin saltar
+ni repetir filas aunque se inserten registros entre una página y otra.
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class PaginacionKeyset(BasePagination):
+    """
+    Paginación por keyset (solo hacia adelante).
+
+    El orden es el del queryset (OrderingFilter u ordering del modelo) más
+    la llave primaria como desempate, de modo que el orden sea total. El
+    cursor codifica los valores de esos campos en la última fila entregada.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.campos = self.get_campos(queryset)
+        self.siguiente = None
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = self.filtrar_despues_de(queryset, self.decodificar_cursor(cursor))
+
+        orden = [f'-{nombre}' if descendente else nombre for nombre, descendente in self.campos]
+        filas = list(queryset.order_by(*orden)[:self.page_size + 1])
+        if len(filas) > self.page_size:
+            filas = filas[:self.page_size]
+            self.siguiente = [self.get_valor(filas[-1], nombre) for nombre, _ in self.campos]
+        return filas
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if self.siguiente is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.codificar_cursor(self.siguiente))
+
+    def get_campos(self, queryset):
+        """Lista de (campo, descendente) que define el orden, terminando en pk"""
+        orden = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        campos = []
+        for expresion in orden:
+            if not isinstance(expresion, str) or expresion == '?':
+                raise ImproperlyConfigured(
+                    'La paginación por cursor requiere ordenar por nombres de campo.'
+                )
+            nombre = expresion.lstrip('-')
+            if nombre == queryset.model._meta.pk.name:
+                nombre = 'pk'
+            campos.append((nombre, expresion.startswith('-')))
+        if 'pk' not in [nombre for nombre, _ in campos]:
+            # Desempate en la misma dirección que el último campo
+            campos.append(('pk', campos[-1][1] if campos else False))
+        return campos
+
+    def filtrar_despues_de(self, queryset, valores):
+        """
+        (a, b, pk) > (va, vb, vpk) escrito como
+        a > va OR (a = va AND b > vb) OR (a = va AND b = vb AND pk > vpk)
+        ("<" para los campos descendentes).
+        """
+        if len(valores) != len(self.campos):
+            raise NotFound(self.invalid_cursor_message)
+        condicion = Q()
+        iguales = Q()
+        for (nombre, descendente), valor in zip(self.campos, valores):
+            operador = 'lt' if descendente else 'gt'
+            condicion |= iguales & Q(**{f'{nombre}__{operador}': valor})
+            iguales &= Q(**{nombre: valor})
+        try:
+            return queryset.filter(condicion)
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def get_valor(obj, nombre):
+        for parte in nombre.split('__'):
+            obj = getattr(obj, parte)
+        return obj
+
+    def codificar_cursor(self, valores):
+        def serializar(valor):
+            if isinstance(valor, (datetime.date, datetime.datetime)):
+                return valor.isoformat()
+            if isinstance(valor, decimal.Decimal):
+                return str(valor)
+            return valor
+        texto = json.dumps([serializar(valor) for valor in valores])
+        return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii')
+
+    def decodificar_cursor(self, cursor):
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(valores, list):
+            raise NotFound(self.invalid_cursor_message)
+        return valores
+
+
+class PaginacionSeleccionable(PageNumberPagination):
+    """
+    Páginas numeradas por defecto; paginación por keyset cuando la petición
+    trae ?paginacion=cursor o un ?cursor= de una página anterior.
+    """
+    modo_query_param = 'paginacion'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (request.query_params.get(self.modo_query_param) == 'cursor'
+                or PaginacionKeyset.cursor_query_param in request.query_params):
+            self.keyset = PaginacionKeyset()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
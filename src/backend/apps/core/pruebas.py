@@ -0,0 +1,40 @@
+"""
+Utilidades para las pruebas
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from . import consultas
+
+
+class PresupuestoConsultasMixin:
+    """
+    Mixin para TestCase/APITestCase con assertPresupuestoConsultas: a
+    diferencia de assertNumQueries fija un máximo (no un número exacto) y
+    además falla si una misma forma de consulta se repite (N+1).
+
+        with self.assertPresupuestoConsultas(3):
+            self.client.get('/api/pacientes/')
+    """
+
+    @contextmanager
+    def assertPresupuestoConsultas(self, maximo, repeticiones=None):
+        """
+        Falla si el bloque hace más de `maximo` consultas o repite una forma
+        más de `repeticiones` veces (por defecto CONSULTAS_REPETIDAS_MAXIMO)
+        """
+        if repeticiones is None:
+            repeticiones = settings.CONSULTAS_REPETIDAS_MAXIMO
+        with CaptureQueriesContext(connection) as capturadas:
+            yield capturadas
+
+        sentencias = [consulta['sql'] for consulta in capturadas.captured_queries]
+        if len(sentencias) > maximo:
+            detalle = '\n'.join(f'  {i}. {sql}' for i, sql in enumerate(sentencias, start=1))
+            self.fail(f'{len(sentencias)} consultas, el presupuesto es {maximo}:\n{detalle}')
+        if repeticiones is not None:
+            repetidas = consultas.repetidas(sentencias, repeticiones)
+            if repetidas:
+                self.fail(f'Consultas repetidas (posible N+1):\n{consultas.describir(repetidas)}')
@@ -0,0 +1,60 @@
+"""
+Tareas de Celery comunes
+"""
+from celery import shared_task
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import auditoria
+from .importacion import ErrorImportacion
+from .models import Importacion
+
+
+@shared_task
+def procesar_importacion(importacion_id):
+    """
+    Procesa una importación guardada, actualizando el avance tras cada
+    lote, y elimina el archivo al terminar
+    """
+    importacion = Importacion.objects.filter(pk=importacion_id, estado=Importacion.PENDIENTE).first()
+    if importacion is None:
+        return None
+    Importacion.objects.filter(pk=importacion.pk).update(estado=Importacion.PROCESANDO)
+
+    def al_avanzar(resultado):
+        Importacion.objects.filter(pk=importacion.pk).update(
+            total_filas=resultado['total_filas'],
+            filas_procesadas=resultado['filas_procesadas'],
+            creados=resultado['creados'],
+            total_errores=resultado['total_errores'],
+        )
+
+    importar = import_string(Importacion.IMPORTADORES[importacion.tipo])
+    try:
+        with importacion.archivo.open('rb') as archivo:
+            resultado = importar(archivo, importacion.formato, usuario=importacion.usuario, al_avanzar=al_avanzar)
+    except ErrorImportacion as error:
+        importacion.refresh_from_db()
+        importacion.estado = Importacion.FALLIDA
+        importacion.mensaje = str(error)
+    except Exception:
+        importacion.refresh_from_db()
+        importacion.estado = Importacion.FALLIDA
+        importacion.mensaje = 'Error inesperado al procesar el archivo.'
+        raise
+    else:
+        importacion.refresh_from_db()
+        importacion.estado = Importacion.COMPLETADA
+        importacion.errores = resultado['errores']
+    finally:
+        # El archivo tiene datos personales: no se conserva
+        importacion.archivo.delete(save=False)
+        importacion.fecha_finalizacion = timezone.now()
+        importacion.save()
+    return importacion.estado
+
+
+@shared_task
+def guardar_cambios(filas):
+    """Escribe un lote de registros de auditoría (AUDITORIA_ASINCRONA)"""
+    auditoria.guardar(filas)
@@ -0,0 +1,459 @@
+import json
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.core import auditoria, benchmark, consultas, metricas
+from apps.core.models import RegistroCambio
+from apps.core.pruebas import PresupuestoConsultasMixin
+from apps.pacientes.models import Paciente
+from apps.prescripciones.models import Prescripcion
+from apps.productos.models import MovimientoStock, Producto
+from apps.reportes.models import EstadisticaDiariaPrescripcion
+
+
+class PaginacionCursorApiTest(APITestCase):
+    """
+    Pruebas de la paginación por keyset (?paginacion=cursor)
+    """
+    url = '/api/pacientes/'
+    
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='recepcion')
+        self.client.force_authenticate(user=self.usuario)
+        Paciente.objects.bulk_create([
+            Paciente(
+                numero_documento=f'5000{i:04d}', nombres='Paciente', apellidos=f'Prueba {i}',
+                fecha_nacimiento=date(1990, 1, 1)
+            )
+            for i in range(25)
+        ])
+        # Misma fecha de registro para todos: el desempate por id debe ordenar
+        Paciente.objects.update(fecha_registro=timezone.now())
+    
+    def recorrer(self, params, insertar_en_medio=False):
+        ids = []
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        ids += [p['id'] for p in response.data['results']]
+        while response.data['next']:
+            if insertar_en_medio:
+                Paciente.objects.create(
+                    numero_documento=f'6000{len(ids):04d}', nombres='Nuevo', apellidos='Registro',
+                    fecha_nacimiento=date(1990, 1, 1)
+                )
+            response = self.client.get(response.data['next'])
+            ids += [p['id'] for p in response.data['results']]
+        return ids
+    
+    def test_recorre_todo_sin_repetir(self):
+        ids = self.recorrer({'paginacion': 'cursor'})
+        esperados = list(Paciente.objects.order_by('-fecha_registro', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, esperados)
+    
+    def test_estable_con_inserciones_concurrentes(self):
+        existentes = set(Paciente.objects.values_list('id', flat=True))
+        ids = self.recorrer({'paginacion': 'cursor'}, insertar_en_medio=True)
+        # Los nuevos (más recientes) quedan antes del cursor: ni se repiten
+        # filas ni se pierde ninguna de las existentes
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), existentes)
+    
+    def test_una_consulta_por_pagina(self):
+        response = self.client.get(self.url, {'paginacion': 'cursor'})
+        with self.assertNumQueries(1):
+            self.client.get(response.data['next'])
+    
+    def test_respeta_ordering(self):
+        ids = self.recorrer({'paginacion': 'cursor', 'ordering': 'apellidos'})
+        esperados = list(Paciente.objects.order_by('apellidos', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, esperados)
+    
+    def test_cursor_invalido(self):
+        response = self.client.get(self.url, {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 404)
+    
+    def test_paginas_numeradas_por_defecto(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 20)
+    
+    def test_orden_por_defecto_de_productos(self):
+        Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i:02d}', categoria=categoria,
+                     precio_compra=Decimal('10'), precio_venta=Decimal('20'), stock=1)
+            for i in range(15) for categoria in ('MONTURA', 'LENTE')
+        ])
+        self.url = '/api/productos/'
+        ids = self.recorrer({'paginacion': 'cursor'})
+        esperados = list(Producto.objects.order_by('categoria', 'nombre', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, esperados)
+
+
+class GenerarDatosCommandTest(TestCase):
+    """
+    Pruebas del comando generar_datos
+    """
+    
+    def generar(self, **opciones):
+        opciones = {'pacientes': 40, 'prescripciones_por_paciente': 3, 'productos': 15, 'seed': 7, **opciones}
+        call_command('generar_datos', stdout=StringIO(), **opciones)
+    
+    def test_genera_datos_coherentes(self):
+        self.generar()
+        
+        self.assertEqual(Paciente.objects.count(), 40)
+        self.assertEqual(Producto.objects.count(), 15)
+        self.assertEqual(User.objects.filter(username__startswith='optometra_gen_').count(), 5)
+        prescripciones = Prescripcion.objects.all()
+        self.assertGreater(prescripciones.count(), 40)
+        
+        # Números únicos, vencimiento guardado y como máximo una vigente por paciente
+        self.assertEqual(
+            prescripciones.values('numero_prescripcion').distinct().count(), prescripciones.count()
+        )
+        self.assertFalse(prescripciones.filter(fecha_vencimiento__isnull=True).exists())
+        self.assertFalse(
+            prescripciones.filter(vigente=True).values('paciente').annotate(n=Count('id')).filter(n__gt=1).exists()
+        )
+        for prescripcion in prescripciones:
+            prescripcion.full_clean()
+        self.assertFalse(Paciente.objects.filter(texto_busqueda='').exists())
+        
+        # Kardex y estadísticas como si se hubieran creado con save()
+        self.assertEqual(
+            MovimientoStock.objects.filter(tipo='INICIAL').count(),
+            Producto.objects.filter(stock__gt=0).count()
+        )
+        self.assertEqual(
+            sum(EstadisticaDiariaPrescripcion.objects.values_list('total', flat=True)), prescripciones.count()
+        )
+    
+    def test_reproducible_con_la_misma_semilla(self):
+        campos = ('nombres', 'apellidos', 'fecha_nacimiento', 'email')
+        self.generar(pacientes=10, documento_inicial=1000)
+        primera = list(Paciente.objects.order_by('numero_documento').values_list(*campos))
+        self.generar(pacientes=10, documento_inicial=2000, seed=7, productos=0)
+        segunda = list(
+            Paciente.objects.filter(numero_documento__gte='2000').order_by('numero_documento').values_list(*campos)
+        )
+        self.assertEqual(primera, segunda)
+    
+    def test_documentos_existentes(self):
+        self.generar(pacientes=5, productos=0)
+        with self.assertRaises(CommandError):
+            self.generar(pacientes=5, productos=0)
+
+
+class BenchmarkApiTest(TestCase):
+    """
+    Pruebas del benchmark de la API (apps/core/benchmark.py)
+    """
+    
+    def setUp(self):
+        call_command(
+            'generar_datos', pacientes=12, prescripciones_por_paciente=3, productos=8, seed=3, stdout=StringIO()
+        )
+        self.usuario = User.objects.create_user(username='benchmark', is_staff=True)
+    
+    def test_mide_todos_los_escenarios_dentro_de_los_umbrales(self):
+        escenarios = benchmark.escenarios()
+        resultados = benchmark.medir_en_proceso(self.usuario, escenarios, repeticiones=2, calentamiento=1)
+        
+        self.assertEqual(set(resultados), {nombre for nombre, *_ in escenarios})
+        for resumen in resultados.values():
+            self.assertEqual(resumen['peticiones'], 2)
+            self.assertEqual(resumen['errores'], 0)
+            self.assertLessEqual(resumen['p50_ms'], resumen['p99_ms'])
+        # Las consultas por petición no dependen del volumen de datos
+        fallos = benchmark.evaluar(resultados, {
+            nombre: limites for nombre, limites in benchmark.UMBRALES.items() if nombre != '*'
+        })
+        self.assertEqual(fallos, [])
+    
+    def test_evaluar_reporta_regresiones(self):
+        resultados = {'listado': benchmark.resumir([10, 20, 3000], [4, 4, 4], 0)}
+        
+        fallos = benchmark.evaluar(resultados, {'*': {'p95_ms': 2000}, 'listado': {'consultas': 3}})
+        
+        self.assertEqual(len(fallos), 2)
+        self.assertEqual(resultados['listado']['p50_ms'], 20)
+    
+    def test_comando_falla_si_se_superan_los_umbrales(self):
+        salida = StringIO()
+        with self.assertRaises(CommandError):
+            call_command(
+                'benchmark_api', bd_actual=True, repeticiones=1,
+                umbrales=self.archivo_umbrales({'pacientes_listado': {'consultas': 0}}), stdout=salida
+            )
+        self.assertIn('pacientes_listado', salida.getvalue())
+        
+        call_command('benchmark_api', bd_actual=True, repeticiones=1, stdout=salida)
+        self.assertIn('dentro de los umbrales', salida.getvalue())
+    
+    def archivo_umbrales(self, umbrales):
+        archivo = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8')
+        with archivo:
+            json.dump(umbrales, archivo)
+        self.addCleanup(os.remove, archivo.name)
+        return archivo.name
+
+
+class MetricasApiTest(APITestCase):
+    """
+    Pruebas de MetricasMiddleware y /metrics
+    """
+    
+    def setUp(self):
+        metricas.reiniciar()
+        self.addCleanup(metricas.reiniciar)
+        self.usuario = User.objects.create_user(username='operador', is_staff=True)
+        self.client.force_authenticate(user=self.usuario)
+    
+    def test_server_timing_con_consultas(self):
+        response = self.client.get('/api/pacientes/')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ consultas"$')
+    
+    def test_conserva_los_tiempos_de_la_vista(self):
+        response = self.client.get('/api/pacientes/busqueda_avanzada/', {'q': 'ana'})
+        
+        self.assertRegex(response['Server-Timing'], r'^busqueda;dur=[\d.]+.*, total;dur=[\d.]+, db;dur=')
+    
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_histogramas_por_viewset_y_accion(self):
+        for _ in range(2):
+            self.client.get('/api/pacientes/')
+        self.client.get('/api/productos/bajo_stock/')
+        self.client.get('/api/pacientes/999999/')
+        
+        texto = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto').content.decode()
+        
+        self.assertIn('http_requests_total{vista="PacienteViewSet.list",metodo="GET",codigo="200"} 2', texto)
+        self.assertIn('http_requests_total{vista="PacienteViewSet.retrieve",metodo="GET",codigo="404"} 1', texto)
+        self.assertIn('http_request_db_queries_count{vista="ProductoViewSet.bajo_stock",metodo="GET"} 1', texto)
+        self.assertIn(
+            'http_request_duration_seconds_bucket{vista="PacienteViewSet.list",metodo="GET",le="+Inf"} 2', texto
+        )
+    
+    def test_histograma_acumulado(self):
+        metricas.registrar('Vista.accion', 'GET', 200, 0.03, 0.01, 4)
+        metricas.registrar('Vista.accion', 'GET', 200, 3, 0.2, 40)
+        
+        texto = metricas.exportar()
+        
+        self.assertIn('http_request_db_queries_bucket{vista="Vista.accion",metodo="GET",le="5"} 1', texto)
+        self.assertIn('http_request_db_queries_bucket{vista="Vista.accion",metodo="GET",le="50"} 2', texto)
+        self.assertIn('http_request_db_queries_sum{vista="Vista.accion",metodo="GET"} 44', texto)
+        self.assertIn('http_request_duration_seconds_bucket{vista="Vista.accion",metodo="GET",le="0.05"} 1', texto)
+    
+    def test_metodos_desconocidos_en_una_sola_serie(self):
+        for metodo in ('FOO1', 'FOO2', 'PROPFIND'):
+            self.client.generic(metodo, '/api/pacientes/')
+        
+        texto = metricas.exportar()
+        
+        self.assertNotIn('FOO1', texto)
+        self.assertIn('http_requests_total{vista="PacienteViewSet.otro",metodo="otro",codigo="405"} 3', texto)
+    
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_token_de_metricas(self):
+        self.client.force_authenticate(user=None)
+        
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+    
+    @override_settings(METRICAS_TOKEN='')
+    def test_sin_token_solo_con_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class DetectorConsultasTest(PresupuestoConsultasMixin, APITestCase):
+    """
+    Pruebas del detector de consultas N+1 y lentas
+    """
+    
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='recepcion')
+        self.client.force_authenticate(user=self.usuario)
+    
+    def test_huella_ignora_parametros_y_listas(self):
+        self.assertEqual(
+            consultas.huella('SELECT * FROM t WHERE id = 1 AND nombre = \'Ana\''),
+            consultas.huella('SELECT *  FROM t\nWHERE id = 27 AND nombre = \'José\''),
+        )
+        self.assertEqual(
+            consultas.huella('SELECT * FROM t WHERE id IN (%s, %s, %s)'), 'SELECT * FROM t WHERE id IN (...)'
+        )
+        self.assertEqual(consultas.repetidas(['SELECT 1', 'SELECT 2', 'SELECT 3'], 2), [('SELECT ?', 3)])
+    
+    @override_settings(CONSULTAS_REPETIDAS_MAXIMO=0)
+    def test_falla_con_consultas_repetidas(self):
+        with self.assertRaisesMessage(consultas.ConsultasRepetidas, 'PacienteViewSet.list'):
+            self.client.get('/api/pacientes/')
+    
+    @override_settings(CONSULTAS_REPETIDAS_MAXIMO=0, CONSULTAS_REPETIDAS_FALLAR=False)
+    def test_advierte_sin_fallar(self):
+        with self.assertLogs('optica_visual.consultas', 'WARNING') as registros:
+            response = self.client.get('/api/pacientes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('posible N+1', registros.output[0])
+    
+    @override_settings(CONSULTA_LENTA_MS=0)
+    def test_registra_consultas_lentas_con_la_vista(self):
+        with self.assertLogs('optica_visual.consultas', 'WARNING') as registros:
+            self.client.get('/api/productos/bajo_stock/')
+        self.assertIn('Consulta lenta', registros.output[0])
+        self.assertIn('ProductoViewSet.bajo_stock', registros.output[0])
+    
+    def test_presupuesto_de_consultas(self):
+        with self.assertPresupuestoConsultas(3):
+            self.client.get('/api/pacientes/')
+        
+        with self.assertRaises(AssertionError):
+            with self.assertPresupuestoConsultas(0):
+                self.client.get('/api/pacientes/')
+        with self.assertRaisesMessage(AssertionError, 'posible N+1'):
+            with self.assertPresupuestoConsultas(10, repeticiones=1):
+                for _ in range(2):
+                    list(Paciente.objects.filter(numero_documento='1'))
+
+
+class RegistroCambiosTest(APITestCase):
+    """
+    Pruebas del registro de cambios (apps/core/auditoria.py)
+    """
+    
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin', password='clave')
+        self.paciente = Paciente.objects.create(
+            numero_documento='30405060', nombres='Ana', apellidos='Ruiz',
+            fecha_nacimiento=date(1990, 5, 1), telefono='3001112233'
+        )
+        self.productos = [
+            Producto.objects.create(
+                nombre=f'Montura {i}', categoria='MONTURA',
+                precio_compra=Decimal('40000'), precio_venta=Decimal('90000'), stock=10
+            )
+            for i in range(2)
+        ]
+    
+    def test_edicion_por_la_api_con_usuario(self):
+        self.client.force_authenticate(user=self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/pacientes/{self.paciente.id}/',
+                {'nombres': 'Ana', 'apellidos': 'Ruiz', 'telefono': '3109998877'}, format='json'
+            )
+        
+        self.assertEqual(response.status_code, 200)
+        registro = RegistroCambio.objects.get(modelo='pacientes.paciente', accion=RegistroCambio.ACTUALIZAR)
+        self.assertEqual(registro.objeto_id, str(self.paciente.id))
+        self.assertEqual(registro.cambios, {'telefono': ['3001112233', '3109998877']})
+        self.assertEqual(registro.usuario_id, self.usuario.id)
+    
+    def test_creacion_y_eliminacion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = Producto.objects.create(
+                nombre='Estuche', categoria='ESTUCHE',
+                precio_compra=Decimal('5000'), precio_venta=Decimal('12000')
+            )
+            producto_id = producto.id
+            producto.delete()
+        
+        acciones = dict(RegistroCambio.objects.filter(
+            modelo='productos.producto', objeto_id=str(producto_id)
+        ).values_list('accion', 'cambios'))
+        self.assertEqual(acciones[RegistroCambio.CREAR]['nombre'], [None, 'Estuche'])
+        self.assertNotIn('fecha_creacion', acciones[RegistroCambio.CREAR])
+        self.assertEqual(acciones[RegistroCambio.ELIMINAR], {})
+    
+    def test_cambio_revertido_no_se_registra(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.paciente.telefono = '3000000000'
+                    self.paciente.save()
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertFalse(RegistroCambio.objects.filter(accion=RegistroCambio.ACTUALIZAR).exists())
+    
+    @override_settings(AUDITORIA_ASINCRONA=True)
+    def test_modo_asincrono_envia_el_lote_a_celery(self):
+        self.client.force_authenticate(user=self.usuario)
+        with mock.patch('apps.core.tasks.guardar_cambios.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(
+                    f'/api/pacientes/{self.paciente.id}/',
+                    {'nombres': 'Ana', 'apellidos': 'Ruiz', 'email': 'ana@correo.co'}, format='json'
+                )
+        
+        delay.assert_called_once()
+        filas = delay.call_args.args[0]
+        self.assertEqual(filas[0]['cambios'], {'email': ['', 'ana@correo.co']})
+        # JSON puro: se puede enviar por el broker
+        json.dumps(filas)
+        self.assertFalse(RegistroCambio.objects.filter(accion=RegistroCambio.ACTUALIZAR).exists())
+
+
+class RegistroCambiosAdminTest(TransactionTestCase):
+    """
+    Registro de cambios de list_editable del admin (con commits reales,
+    para ver el lote de la petición)
+    """
+    
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin', password='clave')
+        self.productos = [
+            Producto.objects.create(
+                nombre=f'Montura {i}', categoria='MONTURA',
+                precio_compra=Decimal('40000'), precio_venta=Decimal('90000'), stock=10
+            )
+            for i in range(2)
+        ]
+    
+    def test_list_editable_del_admin_en_un_lote(self):
+        self.client.force_login(self.usuario)
+        datos = {
+            'form-TOTAL_FORMS': '2', 'form-INITIAL_FORMS': '2', '_save': 'Guardar',
+        }
+        ordenados = sorted(self.productos, key=lambda p: p.nombre)
+        for i, (producto, precio, stock) in enumerate(zip(ordenados, ['95000.00', '90000.00'], [10, 4])):
+            datos.update({
+                f'form-{i}-id': producto.id, f'form-{i}-precio_venta': precio,
+                f'form-{i}-stock': stock, f'form-{i}-activo': 'on',
+            })
+        
+        with mock.patch('apps.core.auditoria.guardar', wraps=auditoria.guardar) as guardar:
+            response = self.client.post('/admin/productos/producto/', datos)
+        
+        self.assertEqual(response.status_code, 302)
+        cambios = dict(RegistroCambio.objects.filter(
+            modelo='productos.producto', accion=RegistroCambio.ACTUALIZAR
+        ).values_list('objeto_id', 'cambios'))
+        self.assertEqual(cambios, {
+            str(ordenados[0].id): {'precio_venta': ['90000.00', '95000.00']},
+            str(ordenados[1].id): {'stock': [10, 4]},
+        })
+        # Un solo lote para toda la petición
+        guardar.assert_called_once()
+    
@@ -0,0 +1,11 @@
+"""
+URLs de utilidades comunes
+"""
+from django.urls import path
+from .views import estadisticas_cache, estado_importacion, exportar_metricas
+
+urlpatterns = [
+    path('api/cache/estadisticas/', estadisticas_cache, name='estadisticas-cache'),
+    path('api/importaciones/<int:pk>/', estado_importacion, name='estado-importacion'),
+    path('metrics', exportar_metricas, name='metricas'),
+]
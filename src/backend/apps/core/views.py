@@ -0,0 +1,107 @@
+import hmac
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from . import cache, metricas
+from .importacion import ErrorImportacion, formato_de
+from .models import Importacion
+from .tasks import procesar_importacion
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def estadisticas_cache(request):
+    """
+    Endpoint: /api/cache/estadisticas/
+    Aciertos y fallos de la caché de respuestas por grupo
+    """
+    return Response(cache.estadisticas())
+
+
+def exportar_metricas(request):
+    """
+    Endpoint: /metrics
+    Métricas por vista en formato Prometheus (apps/core/metricas.py). Si
+    METRICAS_TOKEN está configurado se exige "Authorization: Bearer <token>";
+    sin token solo se publican con DEBUG activo (404 en producción).
+    """
+    token = settings.METRICAS_TOKEN
+    if not token and not settings.DEBUG:
+        raise Http404
+    if token:
+        recibido = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(recibido.encode(), f'Bearer {token}'.encode()):
+            return HttpResponse(status=401)
+    return HttpResponse(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def responder_importacion(request, tipo):
+    """
+    Atiende un POST de importación con el archivo en "archivo" (y
+    opcionalmente "formato"). Hasta IMPORTACION_SINCRONA_MAX_BYTES se importa
+    en la petición (200 con el resultado); los archivos más grandes, o con
+    ?asincrono=true, se procesan en segundo plano (202 con la URL de avance).
+    """
+    archivo = request.FILES.get('archivo')
+    if archivo is None:
+        return Response({
+            'error': 'Adjunte el archivo en el campo "archivo"'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        formato = formato_de(archivo.name, request.data.get('formato'))
+    except ErrorImportacion as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    asincrono = request.query_params.get('asincrono', '').lower() in ('1', 'true')
+    if not asincrono and archivo.size <= settings.IMPORTACION_SINCRONA_MAX_BYTES:
+        importar = import_string(Importacion.IMPORTADORES[tipo])
+        try:
+            resultado = importar(archivo, formato, usuario=request.user)
+        except ErrorImportacion as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'estado': Importacion.COMPLETADA, **resultado})
+    
+    importacion = Importacion.objects.create(
+        tipo=tipo, formato=formato, archivo=archivo, usuario=request.user
+    )
+    transaction.on_commit(lambda: procesar_importacion.delay(importacion.pk))
+    return Response({
+        'id': importacion.pk,
+        'estado': importacion.estado,
+        'url': request.build_absolute_uri(f'/api/importaciones/{importacion.pk}/'),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def estado_importacion(request, pk):
+    """
+    Endpoint: /api/importaciones/<id>/
+    Avance y resultado de una importación en segundo plano (solo para
+    quien la inició o el staff)
+    """
+    importaciones = Importacion.objects.all()
+    if not request.user.is_staff:
+        importaciones = importaciones.filter(usuario=request.user)
+    importacion = get_object_or_404(importaciones, pk=pk)
+    
+    return Response({
+        'id': importacion.pk,
+        'tipo': importacion.tipo,
+        'estado': importacion.estado,
+        'total_filas': importacion.total_filas,
+        'filas_procesadas': importacion.filas_procesadas,
+        'porcentaje': importacion.porcentaje,
+        'creados': importacion.creados,
+        'total_errores': importacion.total_errores,
+        'errores': importacion.errores,
+        'mensaje': importacion.mensaje,
+        'fecha_creacion': importacion.fecha_creacion,
+        'fecha_finalizacion': importacion.fecha_finalizacion,
+    })
@@ -4,4 +4,13 @@ from django.apps import AppConfig
 class PacientesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.pacientes'
-    verbose_name = 'Gestión de Pacientes'
\ No newline at end of file
+    verbose_name = 'Gestión de Pacientes'
+    
+    def ready(self):
+        # Conecta las señales del índice de búsqueda
+        from . import signals  # noqa: F401
+        
+        # Registro de cambios (texto_busqueda se deriva de los demás campos)
+        from apps.core import auditoria
+        from .models import Paciente
+        auditoria.registrar(Paciente, excluir=['texto_busqueda'])
@@ -0,0 +1,175 @@
+"""
+Búsqueda de pacientes por texto libre.
+
+Se busca sobre ``Paciente.texto_busqueda`` (documento, nombres, apellidos,
+email y teléfono en minúsculas y sin tildes), de modo que "gonzalez"
+encuentra a "González".
+
+- PostgreSQL: índice GIN con ``gin_trgm_ops`` (migración 0002) que atiende
+  el ``LIKE '%...%'`` y ordenamiento por ``similarity()`` de pg_trgm.
+- Otros motores (SQLite en desarrollo y pruebas): el filtro es el mismo
+  ``LIKE`` en la base de datos y el orden por similitud sale de un índice
+  de trigramas en memoria del proceso. El índice solo se actualiza con las
+  señales de su propio proceso: lo que guarde otro proceso (otro worker,
+  un comando) aparece en los resultados, pero sin orden por similitud
+  hasta que el índice se reconstruya (se construye en la primera búsqueda
+  después de arrancar o de invalidar()).
+"""
+import threading
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Case, FloatField, Func, IntegerField, Value, When
+
+from .models import Paciente, normalizar_texto
+
+# Longitud de un n-grama; consultas más cortas van directo a la base de datos
+N = 3
+
+# Resultados que se ordenan por similitud en SQLite (los demás siguen por
+# apellidos y nombres): cada uno agrega parámetros al CASE WHEN y SQLite
+# limita los parámetros por sentencia (999 antes de la versión 3.32)
+MAXIMO_CANDIDATOS = 250
+
+
+def ngramas(texto):
+    """Conjunto de trigramas de un texto ya normalizado"""
+    return {texto[i:i + N] for i in range(len(texto) - N + 1)}
+
+
+class IndiceNgramas:
+    """
+    Índice invertido trigrama -> ids de pacientes.
+
+    Se construye perezosamente en la primera búsqueda y se actualiza con
+    los guardados y eliminaciones de pacientes en este proceso.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indice = None
+        self._textos = {}
+
+    def _construir(self):
+        indice = defaultdict(set)
+        textos = {}
+        filas = Paciente.objects.values_list('pk', 'texto_busqueda')
+        for pk, texto in filas.iterator(chunk_size=2000):
+            textos[pk] = texto
+            for ngrama in ngramas(texto):
+                indice[ngrama].add(pk)
+        self._indice, self._textos = indice, textos
+
+    def _quitar(self, pk):
+        texto = self._textos.pop(pk, None)
+        if texto is None:
+            return
+        for ngrama in ngramas(texto):
+            ids = self._indice.get(ngrama)
+            if ids is not None:
+                ids.discard(pk)
+                if not ids:
+                    del self._indice[ngrama]
+
+    def actualizar(self, pk, texto):
+        with self._lock:
+            if self._indice is None:
+                return
+            self._quitar(pk)
+            self._textos[pk] = texto
+            for ngrama in ngramas(texto):
+                self._indice[ngrama].add(pk)
+
+    def eliminar(self, pk):
+        with self._lock:
+            if self._indice is not None:
+                self._quitar(pk)
+
+    def invalidar(self):
+        with self._lock:
+            self._indice = None
+            self._textos = {}
+
+    def buscar(self, consulta, ids=None):
+        """
+        Retorna [(pk, puntaje)] de los textos que contienen la consulta,
+        del más al menos similar. El puntaje sigue la idea de similarity()
+        de pg_trgm: trigramas compartidos / trigramas totales. Con ids,
+        solo entre esos pacientes.
+        """
+        buscados = ngramas(consulta)
+        with self._lock:
+            if self._indice is None:
+                self._construir()
+            # Se intersecta empezando por el trigrama menos frecuente
+            listas = sorted((self._indice.get(n, set()) for n in buscados), key=len)
+            candidatos = set(listas[0])
+            for ids in listas[1:]:
+                candidatos &= ids
+                if not candidatos:
+                    break
+            if ids is not None:
+                candidatos &= ids
+            textos = {pk: self._textos[pk] for pk in candidatos}
+
+        resultados = []
+        for pk, texto in textos.items():
+            if consulta in texto:
+                resultados.append((pk, len(buscados) / len(ngramas(texto) | buscados)))
+        resultados.sort(key=lambda r: (-r[1], r[0]))
+        return resultados
+
+
+indice_ngramas = IndiceNgramas()
+
+
+class Similitud(Func):
+    """similarity() de la extensión pg_trgm"""
+    function = 'similarity'
+    output_field = FloatField()
+
+
+def buscar_pacientes(consulta, queryset=None):
+    """
+    Retorna ``queryset`` filtrado por la consulta y ordenado por relevancia:
+    primero la coincidencia exacta de número de documento, luego el más
+    similar y, a igualdad, por apellidos y nombres.
+    """
+    if queryset is None:
+        queryset = Paciente.objects.all()
+    documento = (consulta or '').strip()
+    consulta = normalizar_texto(consulta)
+    if not consulta:
+        return queryset.none()
+
+    queryset = queryset.annotate(
+        documento_exacto=Case(
+            When(numero_documento=documento, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    )
+
+    if connection.vendor == 'postgresql':
+        return queryset.filter(texto_busqueda__contains=consulta).annotate(
+            relevancia=Similitud('texto_busqueda', Value(consulta))
+        ).order_by('documento_exacto', '-relevancia', 'apellidos', 'nombres', 'pk')
+
+    if len(consulta) < N:
+        # Sin trigramas que consultar: búsqueda por subcadena en la base de datos
+        return queryset.filter(texto_busqueda__contains=consulta).order_by(
+            'documento_exacto', 'apellidos', 'nombres', 'pk'
+        )
+
+    # El filtro (y el conteo de la paginación) lo hace la base de datos; el
+    # índice ordena los MAXIMO_CANDIDATOS más similares entre los pacientes
+    # que pasan el filtro de quien llama
+    queryset = queryset.filter(texto_busqueda__contains=consulta)
+    ids = set(queryset.values_list('pk', flat=True))
+    if not ids:
+        return queryset.none()
+    resultados = indice_ngramas.buscar(consulta, ids)[:MAXIMO_CANDIDATOS]
+    posiciones = [When(pk=pk, then=Value(posicion)) for posicion, (pk, _) in enumerate(resultados)]
+    return queryset.annotate(
+        relevancia=Case(*posiciones, default=Value(len(posiciones)), output_field=IntegerField())
+    ).order_by('documento_exacto', 'relevancia', 'apellidos', 'nombres', 'pk')
@@ -0,0 +1,114 @@
+"""
+Importación masiva de pacientes (POST /api/pacientes/importar/).
+
+Cada lote se valida fila por fila sin consultar la base de datos; la
+unicidad del documento se comprueba con una sola consulta IN por lote y
+las filas válidas se insertan con bulk_create.
+"""
+from django.db import IntegrityError, transaction
+
+from apps.core.importacion import agregar_error, leer_filas, lotes, nuevo_resultado
+from .busqueda import indice_ngramas
+from .models import Paciente
+from .serializers import PacienteImportacionSerializer
+
+# Filas validadas por cada consulta de unicidad
+TAMANO_LOTE = 1000
+
+# Filas por cada INSERT
+TAMANO_INSERCION = 500
+
+CAMPOS = PacienteImportacionSerializer.Meta.fields
+
+MENSAJE_DUPLICADO = 'Ya existe un paciente con este número de documento.'
+
+
+def _insertar(pacientes):
+    """
+    bulk_create del lote. Si otro proceso registró alguno de los documentos
+    después de la consulta IN, se vuelve a consultar, se descartan esos
+    pacientes y se reintenta con el resto, tantas veces como haga falta
+    (retorna los creados y los descartados).
+    """
+    descartados = []
+    while True:
+        try:
+            with transaction.atomic():
+                return Paciente.objects.bulk_create(pacientes, batch_size=TAMANO_INSERCION), descartados
+        except IntegrityError:
+            existentes = set(Paciente.objects.filter(
+                numero_documento__in=[p.numero_documento for p in pacientes]
+            ).values_list('numero_documento', flat=True))
+            if not existentes:
+                # El error no se debe a un documento ya registrado
+                raise
+            descartados += [p for p in pacientes if p.numero_documento in existentes]
+            pacientes = [p for p in pacientes if p.numero_documento not in existentes]
+
+
+def _indexar(creados):
+    """Actualiza el índice de búsqueda (bulk_create no envía post_save)"""
+    if all(paciente.pk for paciente in creados):
+        entradas = [(paciente.pk, paciente.texto_busqueda) for paciente in creados]
+        transaction.on_commit(lambda: [indice_ngramas.actualizar(pk, texto) for pk, texto in entradas])
+    else:
+        # Bases de datos que no retornan los ids insertados
+        transaction.on_commit(indice_ngramas.invalidar)
+
+
+def importar_filas(filas, al_avanzar=None):
+    """
+    Importa [(número de fila, datos)] y retorna el resultado: total_filas,
+    filas_procesadas, creados, total_errores y errores por fila.
+    al_avanzar(resultado) se llama después de cada lote.
+    """
+    resultado = nuevo_resultado(len(filas))
+    for lote in lotes(filas, TAMANO_LOTE):
+        validas = []
+        for numero, datos in lote:
+            serializer = PacienteImportacionSerializer(data=datos)
+            if serializer.is_valid():
+                validas.append((numero, serializer.validated_data))
+            else:
+                agregar_error(resultado, numero, serializer.errors)
+
+        existentes = set(Paciente.objects.filter(
+            numero_documento__in=[datos['numero_documento'] for _, datos in validas]
+        ).values_list('numero_documento', flat=True))
+
+        filas_por_documento = {}
+        pacientes = []
+        for numero, datos in validas:
+            documento = datos['numero_documento']
+            if documento in existentes:
+                agregar_error(resultado, numero, {'numero_documento': [MENSAJE_DUPLICADO]})
+            elif documento in filas_por_documento:
+                agregar_error(resultado, numero, {'numero_documento': [
+                    f'Número de documento repetido en la fila {filas_por_documento[documento]}.'
+                ]})
+            else:
+                filas_por_documento[documento] = numero
+                paciente = Paciente(**datos)
+                paciente.actualizar_texto_busqueda()
+                pacientes.append(paciente)
+
+        creados, descartados = _insertar(pacientes)
+        for paciente in descartados:
+            agregar_error(
+                resultado, filas_por_documento[paciente.numero_documento],
+                {'numero_documento': [MENSAJE_DUPLICADO]}
+            )
+        _indexar(creados)
+
+        resultado['creados'] += len(creados)
+        resultado['filas_procesadas'] += len(lote)
+        if al_avanzar is not None:
+            al_avanzar(resultado)
+
+    resultado['errores'].sort(key=lambda error: error['fila'])
+    return resultado
+
+
+def importar_archivo(archivo, formato, usuario=None, al_avanzar=None):
+    """Importa un archivo CSV, XLSX o JSON (ver apps/core/importacion.py)"""
+    return importar_filas(leer_filas(archivo, formato, CAMPOS), al_avanzar)
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:20
+
+import unicodedata
+from django.db import migrations, models
+
+
+def normalizar_texto(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower().strip()
+
+
+def poblar_texto_busqueda(apps, schema_editor):
+    """Calcula el texto de búsqueda de los pacientes existentes"""
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    lote = []
+    for paciente in Paciente.objects.only(
+        'numero_documento', 'nombres', 'apellidos', 'email', 'telefono'
+    ).iterator(chunk_size=2000):
+        paciente.texto_busqueda = normalizar_texto(' '.join([
+            paciente.numero_documento, paciente.nombres, paciente.apellidos,
+            paciente.email or '', paciente.telefono or ''
+        ]))
+        lote.append(paciente)
+        if len(lote) >= 2000:
+            Paciente.objects.bulk_update(lote, ['texto_busqueda'])
+            lote = []
+    if lote:
+        Paciente.objects.bulk_update(lote, ['texto_busqueda'])
+
+
+def crear_indice_trigramas(apps, schema_editor):
+    """Índice GIN de trigramas (solo PostgreSQL)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS pacientes_texto_busqueda_trgm '
+        'ON pacientes USING gin (texto_busqueda gin_trgm_ops)'
+    )
+
+
+def eliminar_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS pacientes_texto_busqueda_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='texto_busqueda',
+            field=models.TextField(blank=True, editable=False, verbose_name='Texto de Búsqueda'),
+        ),
+        migrations.RunPython(poblar_texto_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_trigramas, eliminar_indice_trigramas),
+    ]
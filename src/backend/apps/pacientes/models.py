@@ -1,7 +1,14 @@
+import unicodedata
 from django.db import models
 from django.core.validators import RegexValidator
 
 
+def normalizar_texto(texto):
+    """Minúsculas y sin tildes, para búsquedas ("González" -> "gonzalez")"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower().strip()
+
+
 class Paciente(models.Model):
     """
     Modelo para almacenar información de pacientes de la óptica
@@ -83,6 +90,13 @@ class Paciente(models.Model):
         verbose_name='Activo'
     )
     
+    # Texto normalizado para búsqueda (ver apps/pacientes/busqueda.py)
+    texto_busqueda = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Texto de Búsqueda'
+    )
+    
     class Meta:
         db_table = 'pacientes'
         verbose_name = 'Paciente'
@@ -97,6 +111,21 @@ class Paciente(models.Model):
     def __str__(self):
         return f"{self.nombres} {self.apellidos} - {self.numero_documento}"
     
+    def save(self, *args, **kwargs):
+        """Mantiene actualizado el texto de búsqueda"""
+        self.actualizar_texto_busqueda()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'texto_busqueda'}
+        super().save(*args, **kwargs)
+    
+    def actualizar_texto_busqueda(self):
+        """Calcula texto_busqueda (usar también antes de bulk_create)"""
+        self.texto_busqueda = normalizar_texto(' '.join([
+            self.numero_documento, self.nombres, self.apellidos,
+            self.email or '', self.telefono or ''
+        ]))
+    
     @property
     def nombre_completo(self):
         """Retorna el nombre completo del paciente"""
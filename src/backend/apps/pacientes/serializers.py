@@ -72,6 +72,21 @@ class PacienteCreateSerializer(PacienteSerializer):
         ]
 
 
+class PacienteImportacionSerializer(PacienteCreateSerializer):
+    """
+    Serializer para las filas de la importación masiva: valida sin
+    consultar la base de datos; la unicidad del documento se comprueba por
+    lotes (ver apps/pacientes/importacion.py)
+    """
+    class Meta(PacienteCreateSerializer.Meta):
+        extra_kwargs = {'numero_documento': {'validators': []}}
+    
+    def validate_numero_documento(self, value):
+        if not value.strip():
+            raise serializers.ValidationError("El número de documento no puede estar vacío.")
+        return value.strip()
+
+
 class PacienteListSerializer(serializers.ModelSerializer):
     """
     Serializer simplificado para listado de pacientes
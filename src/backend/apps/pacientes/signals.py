@@ -0,0 +1,26 @@
+"""
+Mantiene el índice de búsqueda en memoria al día con los cambios de pacientes.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .busqueda import indice_ngramas
+from .models import Paciente
+
+
+@receiver(post_save, sender=Paciente, dispatch_uid='pacientes_indice_busqueda_guardar')
+def actualizar_indice_busqueda(sender, instance, raw=False, **kwargs):
+    if raw:
+        # loaddata guarda sin pasar por save(): se reconstruye desde la base de datos
+        indice_ngramas.invalidar()
+        return
+    # Tras el commit, para no indexar cambios que luego se revierten
+    pk, texto = instance.pk, instance.texto_busqueda
+    transaction.on_commit(lambda: indice_ngramas.actualizar(pk, texto))
+
+
+@receiver(post_delete, sender=Paciente, dispatch_uid='pacientes_indice_busqueda_eliminar')
+def eliminar_de_indice_busqueda(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: indice_ngramas.eliminar(pk))
@@ -1,7 +1,22 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from rest_framework.test import APITestCase
 from datetime import date, timedelta
+from io import BytesIO
+from openpyxl import Workbook, load_workbook
+from apps.core.models import Importacion
+from .busqueda import buscar_pacientes, indice_ngramas
+from .importacion import importar_filas
 from .models import Paciente
 
 
@@ -95,4 +110,409 @@ class PacienteModelTest(TestCase):
         self.assertEqual(paciente.telefono, '')
         self.assertEqual(paciente.email, '')
         self.assertEqual(paciente.direccion, '')
-        self.assertTrue(paciente.activo)
\ No newline at end of file
+        self.assertTrue(paciente.activo)
+
+class BusquedaPacientesTest(TestCase):
+    """
+    Pruebas de la búsqueda por texto (índice de trigramas en memoria en SQLite)
+    """
+    
+    def setUp(self):
+        indice_ngramas.invalidar()
+        self.gonzalez = Paciente.objects.create(
+            numero_documento='10203040', nombres='Andrés', apellidos='González',
+            fecha_nacimiento=date(1985, 1, 1), email='andres@correo.com'
+        )
+        self.gonzalo = Paciente.objects.create(
+            numero_documento='55667788', nombres='Gonzalo', apellidos='Ramírez Ospina',
+            fecha_nacimiento=date(1990, 1, 1), telefono='3109876543'
+        )
+        self.inactivo = Paciente.objects.create(
+            numero_documento='99887766', nombres='Luis', apellidos='Gonzalez',
+            fecha_nacimiento=date(1970, 1, 1), activo=False
+        )
+    
+    def tearDown(self):
+        indice_ngramas.invalidar()
+    
+    def test_texto_busqueda_normalizado(self):
+        self.assertIn('andres gonzalez', self.gonzalez.texto_busqueda)
+        self.gonzalez.nombres = 'Ánderson'
+        self.gonzalez.save(update_fields=['nombres'])
+        self.gonzalez.refresh_from_db()
+        self.assertIn('anderson gonzalez', self.gonzalez.texto_busqueda)
+    
+    def test_busqueda_sin_tildes_ni_mayusculas(self):
+        resultados = buscar_pacientes('GONZÁLEZ', Paciente.objects.filter(activo=True))
+        self.assertEqual(list(resultados), [self.gonzalez])
+    
+    def test_resultados_ordenados_por_relevancia(self):
+        # "gonza" aparece en ambos; el texto más corto es el más similar
+        resultados = list(buscar_pacientes('gonza', Paciente.objects.filter(activo=True)))
+        self.assertEqual(resultados, [self.gonzalez, self.gonzalo])
+    
+    def test_busqueda_por_documento_y_telefono(self):
+        self.assertEqual(list(buscar_pacientes('0203')), [self.gonzalez])
+        self.assertEqual(list(buscar_pacientes('987654')), [self.gonzalo])
+    
+    def test_consulta_corta_usa_base_de_datos(self):
+        resultados = buscar_pacientes('os', Paciente.objects.filter(activo=True))
+        self.assertEqual(set(resultados), {self.gonzalo})
+    
+    def test_orden_limitado_sin_recortar_resultados(self):
+        """Solo los más similares se ordenan por similitud; el resto sigue en los resultados"""
+        pacientes = [
+            Paciente(
+                numero_documento=f'6{i:07d}', nombres='Gonzalo', apellidos=f'Gonzalez Prieto {i}',
+                fecha_nacimiento=date(1990, 1, 1)
+            )
+            for i in range(20)
+        ]
+        for paciente in pacientes:
+            paciente.actualizar_texto_busqueda()
+        Paciente.objects.bulk_create(pacientes)
+        indice_ngramas.invalidar()
+        
+        with mock.patch('apps.pacientes.busqueda.MAXIMO_CANDIDATOS', 2):
+            resultados = list(buscar_pacientes('gonza', Paciente.objects.filter(activo=True)))
+        
+        self.assertEqual(len(resultados), 22)
+        mas_similares = [pk for pk, _ in indice_ngramas.buscar('gonza') if pk != self.inactivo.pk][:2]
+        self.assertEqual([paciente.pk for paciente in resultados[:2]], mas_similares)
+        # Los que no alcanzan a ordenarse, por apellidos
+        apellidos = [paciente.apellidos for paciente in resultados[2:]]
+        self.assertEqual(apellidos, sorted(apellidos))
+    
+    def test_paciente_de_otro_proceso(self):
+        """Un paciente que el índice de este proceso no conoce aparece igual"""
+        buscar_pacientes('gonza')
+        # Sin señales de este proceso, como si lo hubiera creado otro worker
+        Paciente.objects.bulk_create([Paciente(
+            numero_documento='12121212', nombres='Elena', apellidos='Gonzaga',
+            fecha_nacimiento=date(1990, 1, 1), texto_busqueda='12121212 elena gonzaga'
+        )])
+        
+        self.assertIn('Gonzaga', [p.apellidos for p in buscar_pacientes('gonza')])
+    
+    def test_indice_sigue_los_cambios(self):
+        self.assertEqual(list(buscar_pacientes('pardo')), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gonzalo.apellidos = 'Pardo'
+            self.gonzalo.save()
+        self.assertEqual(list(buscar_pacientes('pardo')), [self.gonzalo])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gonzalo.delete()
+        self.assertEqual(list(buscar_pacientes('pardo')), [])
+
+
+class BusquedaAvanzadaApiTest(APITestCase):
+    """
+    Pruebas del endpoint /api/pacientes/busqueda_avanzada/
+    """
+    url = '/api/pacientes/busqueda_avanzada/'
+    
+    def setUp(self):
+        indice_ngramas.invalidar()
+        self.usuario = User.objects.create_user(username='recepcion', password='clave12345')
+        self.client.force_authenticate(user=self.usuario)
+        Paciente.objects.create(
+            numero_documento='10203040', nombres='Andrés', apellidos='Muñoz',
+            fecha_nacimiento=date(1985, 1, 1)
+        )
+    
+    def tearDown(self):
+        indice_ngramas.invalidar()
+    
+    def test_busqueda_sin_tildes(self):
+        response = self.client.get(self.url, {'q': 'munoz'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['numero_documento'], '10203040')
+        self.assertIn('tiempo_ms', response.data)
+        self.assertTrue(response['Server-Timing'].startswith('busqueda;dur='))
+    
+    def test_sin_consulta(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 400)
+    
+    def test_resultados_paginados(self):
+        Paciente.objects.bulk_create([
+            Paciente(
+                numero_documento=f'7000{i:04d}', nombres='Ana', apellidos=f'Muñoz {i}',
+                fecha_nacimiento=date(1990, 1, 1), texto_busqueda=f'7000{i:04d} ana munoz {i}'
+            )
+            for i in range(25)
+        ])
+        response = self.client.get(self.url, {'q': 'muñoz'})
+        self.assertEqual(response.data['count'], 26)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+    
+    def test_mas_resultados_que_candidatos_ordenados(self):
+        """Más de MAXIMO_CANDIDATOS coincidencias: conteo y última página completos"""
+        pacientes = [
+            Paciente(
+                numero_documento=f'71{i:06d}', nombres='Ana', apellidos=f'Muñoz {i:03d}',
+                fecha_nacimiento=date(1990, 1, 1), activo=i >= 30
+            )
+            for i in range(300)
+        ]
+        for paciente in pacientes:
+            paciente.actualizar_texto_busqueda()
+        Paciente.objects.bulk_create(pacientes)
+        
+        # 270 activos más el del setUp. Los 30 inactivos empatan en similitud
+        # con los demás y, por tener el menor pk, encabezan el índice
+        response = self.client.get(self.url, {'q': 'munoz'})
+        self.assertEqual(response.data['count'], 271)
+        self.assertEqual(len(response.data['results']), 20)
+        
+        response = self.client.get(self.url, {'q': 'munoz', 'page': 14})
+        self.assertEqual(len(response.data['results']), 11)
+        self.assertIsNone(response.data['next'])
+        documentos = set()
+        for pagina in range(1, 15):
+            response = self.client.get(self.url, {'q': 'munoz', 'page': pagina})
+            documentos.update(r['numero_documento'] for r in response.data['results'])
+        self.assertEqual(len(documentos), 271)
+    
+    def test_documento_exacto_primero(self):
+        # Texto más corto (más similar), pero el documento exacto va primero
+        Paciente.objects.create(
+            numero_documento='1', nombres='Eva', apellidos='Paz',
+            fecha_nacimiento=date(1990, 1, 1), telefono='310203040'
+        )
+        response = self.client.get(self.url, {'q': '10203040'})
+        documentos = [p['numero_documento'] for p in response.data['results']]
+        self.assertEqual(documentos, ['10203040', '1'])
+    
+    def test_modo_autocompletado_sin_conteo(self):
+        Paciente.objects.create(
+            numero_documento='20304050', nombres='Mónica', apellidos='Muñoz',
+            fecha_nacimiento=date(1990, 1, 1)
+        )
+        # Una sola consulta: la página limitada, sin COUNT
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'q': 'mu', 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 1)
+    
+    def test_limite_invalido(self):
+        for limite in ('0', 'abc', '500'):
+            response = self.client.get(self.url, {'q': 'munoz', 'limit': limite})
+            self.assertEqual(response.status_code, 400)
+
+
+class ExportarPacientesApiTest(APITestCase):
+    """
+    Pruebas de /api/pacientes/exportar/
+    """
+    url = '/api/pacientes/exportar/'
+    
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='recepcion')
+        self.client.force_authenticate(user=self.usuario)
+        Paciente.objects.create(
+            numero_documento='10203040', nombres='Andrés', apellidos='Muñoz',
+            fecha_nacimiento=date(1985, 1, 1), telefono='3001234567'
+        )
+        Paciente.objects.create(
+            numero_documento='50607080', nombres='Lucía', apellidos='Rojas',
+            fecha_nacimiento=date(1992, 6, 30), activo=False
+        )
+    
+    def test_exportar_csv(self):
+        response = self.client.get(self.url, {'formato': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="pacientes_', response['Content-Disposition'])
+        
+        lineas = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lineas[0].split(',')[:3], ['Tipo Documento', 'Número Documento', 'Nombres'])
+        # Solo activos, como en el listado
+        self.assertEqual(len(lineas), 2)
+        self.assertIn('Andrés,Muñoz,1985-01-01,3001234567', lineas[1])
+    
+    def test_exportar_xlsx(self):
+        response = self.client.get(self.url, {'formato': 'xlsx', 'activo': 'false'})
+        self.assertEqual(response.status_code, 200)
+        
+        libro = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        filas = list(libro.active.iter_rows(values_only=True))
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][1:4], ('50607080', 'Lucía', 'Rojas'))
+        self.assertEqual(filas[1][-1], 'No')
+    
+    def test_formato_invalido(self):
+        response = self.client.get(self.url, {'formato': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportarPacientesApiTest(APITestCase):
+    """
+    Pruebas de /api/pacientes/importar/
+    """
+    url = '/api/pacientes/importar/'
+    
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='recepcion')
+        self.client.force_authenticate(user=self.usuario)
+        Paciente.objects.create(
+            numero_documento='10203040', nombres='Andrés', apellidos='Muñoz',
+            fecha_nacimiento=date(1985, 1, 1)
+        )
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+    
+    def subir(self, nombre, contenido, **params):
+        archivo = SimpleUploadedFile(nombre, contenido)
+        url = self.url + ('?asincrono=true' if params.pop('asincrono', False) else '')
+        return self.client.post(url, {'archivo': archivo, **params}, format='multipart')
+    
+    def test_importar_csv_con_errores_por_fila(self):
+        contenido = (
+            'Tipo Documento;Número Documento;Nombres;Apellidos;Fecha Nacimiento;Teléfono\n'
+            'CC;90000001;Lucía;Rojas;1992-06-30;3001234567\n'
+            'CC;10203040;Pedro;Gil;1980-01-01;\n'
+            'CC;90000002;;Díaz;1975-03-12;\n'
+            'CC;90000003;Marta;Díaz;1975-03-12;\n'
+            'TI;90000003;Ana;Díaz;2010-08-01;\n'
+        ).encode('utf-8-sig')
+        response = self.subir('pacientes.csv', contenido)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['estado'], 'completada')
+        self.assertEqual(response.data['total_filas'], 5)
+        self.assertEqual(response.data['creados'], 2)
+        self.assertEqual(response.data['total_errores'], 3)
+        errores = {error['fila']: error['errores'] for error in response.data['errores']}
+        self.assertEqual(sorted(errores), [3, 4, 6])
+        self.assertIn('numero_documento', errores[3])
+        self.assertIn('nombres', errores[4])
+        self.assertIn('fila 5', errores[6]['numero_documento'][0])
+        
+        # texto_busqueda calculado antes del bulk_create
+        lucia = Paciente.objects.get(numero_documento='90000001')
+        self.assertEqual(lucia.texto_busqueda, '90000001 lucia rojas  3001234567')
+    
+    def test_importar_xlsx(self):
+        libro = Workbook()
+        hoja = libro.active
+        hoja.append(['numero_documento', 'nombres', 'apellidos', 'fecha_nacimiento', 'email'])
+        # Documento numérico y fecha como celdas de Excel
+        hoja.append([90000010, 'Jorge', 'Pardo', date(1970, 2, 3), 'jorge@correo.com'])
+        hoja.append([])
+        hoja.append([90000011, 'Sara', 'León', date(2001, 11, 20), None])
+        archivo = BytesIO()
+        libro.save(archivo)
+        
+        response = self.subir('pacientes.xlsx', archivo.getvalue())
+        
+        self.assertEqual(response.data['creados'], 2)
+        self.assertEqual(response.data['total_errores'], 0)
+        jorge = Paciente.objects.get(numero_documento='90000010')
+        self.assertEqual(jorge.fecha_nacimiento, date(1970, 2, 3))
+        self.assertEqual(jorge.email, 'jorge@correo.com')
+    
+    def test_importar_json(self):
+        contenido = json.dumps([
+            {'numero_documento': '90000020', 'nombres': 'Iván', 'apellidos': 'Mora', 'fecha_nacimiento': '1999-09-09'},
+            {'numero_documento': '90000021', 'nombres': 'Eva', 'apellidos': 'Mora', 'fecha_nacimiento': 'ayer'},
+        ]).encode('utf-8')
+        response = self.subir('pacientes.json', contenido)
+        
+        self.assertEqual(response.data['creados'], 1)
+        self.assertEqual(response.data['errores'][0]['fila'], 2)
+        self.assertIn('fecha_nacimiento', response.data['errores'][0]['errores'])
+    
+    def test_archivo_invalido(self):
+        self.assertEqual(self.subir('pacientes.pdf', b'%PDF').status_code, 400)
+        self.assertEqual(self.subir('pacientes.json', b'{"a": 1}').status_code, 400)
+        self.assertEqual(self.client.post(self.url, {}, format='multipart').status_code, 400)
+    
+    def test_consultas_por_lote_no_por_fila(self):
+        filas = [
+            (i, {
+                'numero_documento': f'7{i:07d}', 'nombres': 'Paciente', 'apellidos': f'Importado {i}',
+                'fecha_nacimiento': '1990-01-01'
+            })
+            for i in range(200)
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = importar_filas(filas)
+        
+        self.assertEqual(resultado['creados'], 200)
+        # Un IN de unicidad y unos pocos INSERT (SQLite limita las variables
+        # por sentencia) más el savepoint, no 200 de cada uno
+        self.assertLessEqual(len(consultas), 10)
+    
+    def test_importacion_en_segundo_plano(self):
+        contenido = (
+            'numero_documento,nombres,apellidos,fecha_nacimiento\n'
+            '90000030,Luis,Vega,1960-04-04\n'
+            '10203040,Pedro,Gil,1980-01-01\n'
+        ).encode('utf-8')
+        with override_settings(MEDIA_ROOT=self.media):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.subir('pacientes.csv', contenido, asincrono=True)
+        
+        self.assertEqual(response.status_code, 202)
+        estado = self.client.get(response.data['url']).data
+        self.assertEqual(estado['estado'], 'completada')
+        self.assertEqual(estado['porcentaje'], 100)
+        self.assertEqual((estado['creados'], estado['total_errores']), (1, 1))
+        self.assertEqual(estado['errores'][0]['fila'], 3)
+        # El archivo no se conserva
+        self.assertFalse(Importacion.objects.get(pk=response.data['id']).archivo)
+        self.assertEqual(os.listdir(os.path.join(self.media, 'importaciones')), [])
+        
+        # Solo quien la inició (o el staff) ve el avance
+        self.client.force_authenticate(user=User.objects.create_user(username='otro'))
+        self.assertEqual(self.client.get(response.data['url']).status_code, 404)
+
+
+class ImportacionConcurrenteTest(TransactionTestCase):
+    """
+    Importación mientras otro proceso registra pacientes (una conexión por hilo)
+    """
+    
+    def test_documentos_registrados_durante_la_importacion(self):
+        """Cada reintento del bulk_create descarta los documentos que otro proceso registró"""
+        filas = [
+            (i, {
+                'numero_documento': f'8000000{i}', 'nombres': 'Paciente', 'apellidos': f'Importado {i}',
+                'fecha_nacimiento': '1990-01-01'
+            })
+            for i in range(1, 5)
+        ]
+        # Otro proceso registra (y confirma) un documento del lote justo antes
+        # de cada uno de los dos primeros INSERT
+        concurrentes = ['80000001', '80000003']
+        bulk_create = Paciente.objects.bulk_create
+        
+        def registrar(documento):
+            try:
+                Paciente.objects.create(
+                    numero_documento=documento, nombres='Otro', apellidos='Proceso',
+                    fecha_nacimiento=date(1990, 1, 1)
+                )
+            finally:
+                connection.close()
+        
+        def bulk_create_concurrente(pacientes, **kwargs):
+            if concurrentes:
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    executor.submit(registrar, concurrentes.pop(0)).result()
+            return bulk_create(pacientes, **kwargs)
+        
+        with mock.patch.object(Paciente.objects, 'bulk_create', side_effect=bulk_create_concurrente) as llamadas:
+            resultado = importar_filas(filas)
+        
+        self.assertEqual(llamadas.call_count, 3)
+        self.assertEqual(resultado['creados'], 2)
+        self.assertEqual([error['fila'] for error in resultado['errores']], [1, 3])
+        self.assertEqual(
+            set(Paciente.objects.filter(apellidos__startswith='Importado').values_list('numero_documento', flat=True)),
+            {'80000002', '80000004'}
+        )
@@ -1,12 +1,30 @@
+import time
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from apps.core.exportacion import FORMATOS, exportar
+from apps.core.views import responder_importacion
+from .busqueda import buscar_pacientes
 from .models import Paciente
 from .serializers import PacienteSerializer, PacienteCreateSerializer, PacienteListSerializer
 
 
+# Columnas de /api/pacientes/exportar/: (encabezado, valor)
+COLUMNAS_EXPORTACION = [
+    ('Tipo Documento', lambda p: p.tipo_documento),
+    ('Número Documento', lambda p: p.numero_documento),
+    ('Nombres', lambda p: p.nombres),
+    ('Apellidos', lambda p: p.apellidos),
+    ('Fecha Nacimiento', lambda p: p.fecha_nacimiento),
+    ('Teléfono', lambda p: p.telefono),
+    ('Email', lambda p: p.email),
+    ('Dirección', lambda p: p.direccion),
+    ('Fecha Registro', lambda p: p.fecha_registro),
+    ('Activo', lambda p: p.activo),
+]
+
+
 class PacienteViewSet(viewsets.ModelViewSet):
     """
     ViewSet para gestión completa de pacientes
@@ -116,11 +134,50 @@ class PacienteViewSet(viewsets.ModelViewSet):
             'mensaje': 'Facturas del paciente (pendiente implementar serializer)'
         })
     
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """
+        Exporta los pacientes a CSV o XLSX (?formato=csv|xlsx)
+        
+        Acepta los mismos filtros, búsqueda y orden del listado; el archivo
+        se genera por streaming, sin cargar todas las filas en memoria.
+        """
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response({
+                'error': 'Parámetro "formato" inválido (csv o xlsx)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        pacientes = self.filter_queryset(self.get_queryset())
+        return exportar(pacientes, COLUMNAS_EXPORTACION, 'pacientes', formato)
+    
+    @action(detail=False, methods=['post'])
+    def importar(self, request):
+        """
+        Importación masiva de pacientes desde CSV, XLSX o JSON (campo
+        "archivo")
+        
+        Las columnas son las del formulario de creación (o los encabezados
+        de /exportar/). Retorna los creados y los errores por fila; los
+        archivos grandes se procesan en segundo plano y responden 202 con la
+        URL para consultar el avance.
+        """
+        return responder_importacion(request, 'pacientes')
+    
+    # Máximo de resultados en modo autocompletado (?limit=)
+    LIMITE_AUTOCOMPLETADO = 50
+    
     @action(detail=False, methods=['get'])
     def busqueda_avanzada(self, request):
         """
         Búsqueda avanzada de pacientes
+        
+        Resultados paginados y ordenados por relevancia (el documento exacto
+        primero). Con ?limit=N retorna solo los N primeros sin contar el
+        total, para autocompletado, en la misma clave "results" de la
+        paginación. tiempo_ms y el encabezado Server-Timing informan la
+        duración de la búsqueda.
         """
+        inicio = time.perf_counter()
         query = request.query_params.get('q', '')
         
         if not query:
@@ -128,17 +185,30 @@ class PacienteViewSet(viewsets.ModelViewSet):
                 'error': 'Parámetro de búsqueda "q" requerido'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Búsqueda por múltiples campos
-        pacientes = Paciente.objects.filter(
-            Q(numero_documento__icontains=query) |
-            Q(nombres__icontains=query) |
-            Q(apellidos__icontains=query) |
-            Q(email__icontains=query) |
-            Q(telefono__icontains=query)
-        ).filter(activo=True)
+        limite = request.query_params.get('limit')
+        if limite is not None:
+            try:
+                limite = int(limite)
+            except ValueError:
+                limite = 0
+            if not 1 <= limite <= self.LIMITE_AUTOCOMPLETADO:
+                return Response({
+                    'error': f'"limit" debe ser un entero entre 1 y {self.LIMITE_AUTOCOMPLETADO}'
+                }, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = PacienteListSerializer(pacientes, many=True)
-        return Response({
-            'total': pacientes.count(),
-            'resultados': serializer.data
-        })
\ No newline at end of file
+        # Documento, nombres, apellidos, email o teléfono, sin distinguir
+        # tildes ni mayúsculas
+        pacientes = buscar_pacientes(query, Paciente.objects.filter(activo=True))
+        
+        if limite is not None:
+            serializer = PacienteListSerializer(pacientes[:limite], many=True)
+            response = Response({'results': serializer.data})
+        else:
+            page = self.paginate_queryset(pacientes)
+            serializer = PacienteListSerializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+        
+        duracion = (time.perf_counter() - inicio) * 1000
+        response.data['tiempo_ms'] = round(duracion, 2)
+        response['Server-Timing'] = f'busqueda;dur={duracion:.2f}'
+        return response
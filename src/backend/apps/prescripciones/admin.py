@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Prescripcion, HistorialCambios
+from .models import Prescripcion, HistorialCambios, SecuenciaPrescripcion
 
 
 @admin.register(Prescripcion)
@@ -18,6 +18,7 @@ class PrescripcionAdmin(admin.ModelAdmin):
     readonly_fields = (
         'numero_prescripcion', 'fecha_registro', 'fecha_actualizacion',
         'edad_paciente_en_examen', 'es_vigente', 'dias_hasta_vencimiento',
+        'fecha_vencimiento', 'recordatorio_enviado',
         'graduacion_od_completa', 'graduacion_os_completa'
     )
     
@@ -43,7 +44,7 @@ class PrescripcionAdmin(admin.ModelAdmin):
             'fields': ('observaciones',)
         }),
         ('Control', {
-            'fields': ('vigente',)
+            'fields': ('vigente', 'fecha_vencimiento', 'recordatorio_enviado')
         }),
         ('Información del Sistema', {
             'fields': (
@@ -100,4 +101,18 @@ class HistorialCambiosAdmin(admin.ModelAdmin):
     
     def has_delete_permission(self, request, obj=None):
         # No se pueden eliminar registros de auditoría
-        return False
\ No newline at end of file
+        return False
+
+
+@admin.register(SecuenciaPrescripcion)
+class SecuenciaPrescripcionAdmin(admin.ModelAdmin):
+    list_display = ('anio', 'ultimo_numero')
+    ordering = ('-anio',)
+    
+    def has_add_permission(self, request):
+        # Los contadores se crean automáticamente al asignar números
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        # Editar el contador manualmente podría generar números duplicados
+        return False
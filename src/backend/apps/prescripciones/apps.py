@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class PrescripcionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.prescripciones'
-    verbose_name = 'Gestión de Prescripciones Oftalmológicas'
\ No newline at end of file
+    verbose_name = 'Gestión de Prescripciones Oftalmológicas'
+    
+    def ready(self):
+        # Conecta la invalidación de la caché de respuestas
+        from . import cache  # noqa: F401
@@ -0,0 +1,94 @@
+"""
+Invalidación de la caché de los listados de vigencia (vigentes, por_vencer)
+
+Solo las prescripciones vigentes y no vencidas aparecen en esos
+listados: un cambio invalida el grupo si la prescripción cumplía esa
+condición antes del cambio (copia guardada en post_init) o la cumple
+después.
+
+Los listados también muestran el nombre del paciente y del profesional:
+cambiar esos campos de un Paciente o de un User también invalida el grupo.
+"""
+from datetime import date
+from django.contrib.auth.models import User
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from apps.core.cache import invalidar
+from apps.pacientes.models import Paciente
+from .models import Prescripcion
+from .signals import prescripciones_actualizadas
+
+GRUPO_VIGENCIA = 'prescripciones_vigencia'
+
+# Campos de nombre que muestran los listados (paciente_nombre, profesional_nombre)
+CAMPOS_NOMBRE = {
+    Paciente: ('nombres', 'apellidos'),
+    User: ('first_name', 'last_name'),
+}
+
+
+def _en_listados(vigente, fecha_vencimiento):
+    if vigente is None or not isinstance(fecha_vencimiento, date):
+        # Estado desconocido (campo diferido o sin asignar): invalidar
+        return True
+    return vigente and fecha_vencimiento >= date.today()
+
+
+def _estado(instance):
+    return (instance.__dict__.get('vigente'), instance.__dict__.get('fecha_vencimiento'))
+
+
+@receiver(post_init, sender=Prescripcion, dispatch_uid='prescripciones_cache_init')
+def guardar_estado_vigencia(sender, instance, **kwargs):
+    instance._estado_cache = _estado(instance)
+
+
+@receiver(post_save, sender=Prescripcion, dispatch_uid='prescripciones_cache_guardar')
+def invalidar_vigencia_guardada(sender, instance, raw=False, **kwargs):
+    anterior = getattr(instance, '_estado_cache', (None, None))
+    actual = _estado(instance)
+    if raw or _en_listados(*anterior) or _en_listados(*actual):
+        invalidar(GRUPO_VIGENCIA)
+    instance._estado_cache = actual
+
+
+@receiver(post_delete, sender=Prescripcion, dispatch_uid='prescripciones_cache_eliminar')
+def invalidar_vigencia_eliminada(sender, instance, **kwargs):
+    if _en_listados(*_estado(instance)):
+        invalidar(GRUPO_VIGENCIA)
+
+
+@receiver(prescripciones_actualizadas, sender=Prescripcion, dispatch_uid='prescripciones_cache_masivo')
+def invalidar_vigencia_masiva(sender, **kwargs):
+    invalidar(GRUPO_VIGENCIA)
+
+
+def _nombre(instance):
+    return tuple(instance.__dict__.get(campo) for campo in CAMPOS_NOMBRE[type(instance)])
+
+
+def guardar_nombre(sender, instance, **kwargs):
+    instance._nombre_cache = _nombre(instance)
+
+
+def invalidar_nombre_guardado(sender, instance, created, raw=False, **kwargs):
+    # Un registro nuevo todavía no tiene prescripciones
+    actual = _nombre(instance)
+    if raw or (not created and getattr(instance, '_nombre_cache', None) != actual):
+        invalidar(GRUPO_VIGENCIA)
+    instance._nombre_cache = actual
+
+
+def invalidar_nombre_eliminado(sender, instance, **kwargs):
+    invalidar(GRUPO_VIGENCIA)
+
+
+for modelo in CAMPOS_NOMBRE:
+    etiqueta = modelo._meta.label_lower
+    post_init.connect(guardar_nombre, sender=modelo, dispatch_uid=f'prescripciones_cache_nombre_init_{etiqueta}')
+    post_save.connect(
+        invalidar_nombre_guardado, sender=modelo, dispatch_uid=f'prescripciones_cache_nombre_guardar_{etiqueta}'
+    )
+    post_delete.connect(
+        invalidar_nombre_eliminado, sender=modelo, dispatch_uid=f'prescripciones_cache_nombre_eliminar_{etiqueta}'
+    )
@@ -0,0 +1,116 @@
+"""
+Importación masiva de prescripciones (exámenes históricos).
+
+Por cada lote: una consulta IN para los pacientes (por número de
+documento), un bloque contiguo de números reservado con
+SecuenciaPrescripcion.reservar, bulk_create (todas como no vigentes) y
+dos UPDATE: uno retira la vigencia de las anteriores y otro deja vigente
+la más reciente de cada paciente del lote, de modo que nunca hay dos
+vigentes del mismo paciente (prescripcion_una_vigente). Las
+estadísticas diarias y la caché de vigencia se actualizan con una sola
+señal prescripciones_actualizadas por lote.
+
+Se usa desde POST /api/prescripciones/importar/ y el comando
+importar_prescripciones.
+"""
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from apps.core.importacion import ErrorImportacion, agregar_error, leer_filas, lotes, nuevo_resultado
+from apps.pacientes.models import Paciente
+from .models import DIAS_VIGENCIA, Prescripcion, SecuenciaPrescripcion
+from .serializers import PrescripcionImportacionSerializer
+from .signals import prescripciones_actualizadas
+
+# Filas por lote (una consulta de pacientes y una reserva de números)
+TAMANO_LOTE = 1000
+
+# Filas por cada INSERT
+TAMANO_INSERCION = 500
+
+# Campos de cada fila, más los encabezados de /api/prescripciones/exportar/
+# que no coinciden con el nombre del campo
+CAMPOS = {
+    'OI Esfera': 'os_esfera',
+    'OI Cilindro': 'os_cilindro',
+    'OI Eje': 'os_eje',
+    'Tipo de Lente': 'tipo_lente_recomendado',
+    **{campo: campo for campo in PrescripcionImportacionSerializer.Meta.fields},
+}
+
+
+def _insertar(prescripciones):
+    """
+    Numera e inserta el lote y recalcula la vigencia de sus pacientes.
+    Retorna las prescripciones creadas.
+    """
+    anio = date.today().year
+    hoy = date.today()
+    with transaction.atomic():
+        numeros = SecuenciaPrescripcion.reservar(anio, len(prescripciones))
+        for prescripcion, numero in zip(prescripciones, numeros):
+            prescripcion.numero_prescripcion = SecuenciaPrescripcion.formatear(anio, numero)
+            # bulk_create no pasa por save()
+            prescripcion.fecha_vencimiento = prescripcion.fecha_examen + timedelta(days=DIAS_VIGENCIA)
+            # La vigente se decide después, por paciente
+            prescripcion.vigente = False
+        creadas = Prescripcion.objects.bulk_create(prescripciones, batch_size=TAMANO_INSERCION)
+
+        afectadas = Prescripcion.objects.filter(
+            paciente_id__in={p.paciente_id for p in creadas}
+        ).recalcular_vigencia()
+        Prescripcion.objects.filter(id__in=[p.id for p in creadas]).activar_ultimas(hoy)
+        afectadas |= {(p.fecha_examen, p.profesional_id) for p in creadas}
+        # Estadísticas diarias y caché de vigencia
+        prescripciones_actualizadas.send(sender=Prescripcion, afectadas=afectadas)
+    return creadas
+
+
+def importar_filas(filas, profesional, al_avanzar=None, tamano_lote=TAMANO_LOTE):
+    """
+    Importa [(número de fila, datos)] como prescripciones del profesional
+    y retorna el resultado: total_filas, filas_procesadas, creados,
+    total_errores y errores por fila. al_avanzar(resultado) se llama
+    después de cada lote.
+    """
+    resultado = nuevo_resultado(len(filas))
+    for lote in lotes(filas, tamano_lote):
+        validas = []
+        for numero, datos in lote:
+            serializer = PrescripcionImportacionSerializer(data=datos)
+            if serializer.is_valid():
+                validas.append((numero, serializer.validated_data))
+            else:
+                agregar_error(resultado, numero, serializer.errors)
+
+        pacientes = dict(Paciente.objects.filter(
+            numero_documento__in={datos['documento_paciente'] for _, datos in validas}
+        ).values_list('numero_documento', 'id'))
+
+        prescripciones = []
+        for numero, datos in validas:
+            datos = dict(datos)
+            paciente_id = pacientes.get(datos.pop('documento_paciente'))
+            if paciente_id is None:
+                agregar_error(resultado, numero, {
+                    'documento_paciente': ['No existe un paciente con este número de documento.']
+                })
+                continue
+            prescripciones.append(Prescripcion(paciente_id=paciente_id, profesional=profesional, **datos))
+
+        if prescripciones:
+            resultado['creados'] += len(_insertar(prescripciones))
+        resultado['filas_procesadas'] += len(lote)
+        if al_avanzar is not None:
+            al_avanzar(resultado)
+
+    resultado['errores'].sort(key=lambda error: error['fila'])
+    return resultado
+
+
+def importar_archivo(archivo, formato, usuario=None, al_avanzar=None):
+    """Importa un archivo CSV, XLSX o JSON con usuario como profesional"""
+    if usuario is None:
+        raise ErrorImportacion('La importación de prescripciones requiere un profesional.')
+    return importar_filas(leer_filas(archivo, formato, CAMPOS), usuario, al_avanzar)
@@ -0,0 +1,86 @@
+"""
+Genera los PDF de las prescripciones de un día para imprimirlas en lote
+
+Los PDF se dibujan en un pool de procesos, fuera de los workers web, y
+quedan en la caché para las descargas desde la API.
+
+Uso:
+    python manage.py generar_pdfs_prescripciones
+    python manage.py generar_pdfs_prescripciones --fecha 2026-10-17 --procesos 4
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from apps.prescripciones.models import Prescripcion
+from apps.prescripciones.pdf import pdfs_prescripciones
+
+# Prescripciones por lote (acota la memoria usada por los PDF en curso)
+TAMANO_LOTE = 200
+
+
+class Command(BaseCommand):
+    help = 'Genera los PDF de las prescripciones de un día'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha',
+            help='Fecha de examen (YYYY-MM-DD); por defecto hoy'
+        )
+        parser.add_argument(
+            '--destino',
+            help='Carpeta de salida; por defecto MEDIA_ROOT/prescripciones/<fecha>'
+        )
+        parser.add_argument(
+            '--procesos', type=int,
+            help='Procesos para dibujar los PDF; por defecto uno por CPU'
+        )
+    
+    def handle(self, *args, **options):
+        dia = timezone.localdate()
+        if options['fecha']:
+            try:
+                dia = parse_date(options['fecha'])
+            except ValueError:
+                dia = None
+            if dia is None:
+                raise CommandError('--fecha inválida, use el formato YYYY-MM-DD')
+        
+        destino = Path(options['destino'] or Path(settings.MEDIA_ROOT) / 'prescripciones' / dia.isoformat())
+        destino.mkdir(parents=True, exist_ok=True)
+        
+        prescripciones = Prescripcion.objects.filter(fecha_examen=dia).select_related(
+            'paciente', 'profesional'
+        ).order_by('numero_prescripcion')
+        
+        if options['procesos'] == 1:
+            pool = nullcontext()
+        else:
+            # Un solo pool para todos los lotes. spawn: los procesos hijos no
+            # heredan conexiones a la base de datos
+            pool = ProcessPoolExecutor(
+                max_workers=options['procesos'], mp_context=multiprocessing.get_context('spawn')
+            )
+        
+        generados = 0
+        lote = []
+        with pool as ejecutor:
+            for prescripcion in prescripciones.iterator(chunk_size=TAMANO_LOTE):
+                lote.append(prescripcion)
+                if len(lote) == TAMANO_LOTE:
+                    generados += self.escribir(lote, destino, ejecutor)
+                    lote = []
+            if lote:
+                generados += self.escribir(lote, destino, ejecutor)
+        
+        self.stdout.write(self.style.SUCCESS(f'PDF generados: {generados} en {destino}'))
+    
+    def escribir(self, prescripciones, destino, pool):
+        pdfs = pdfs_prescripciones(prescripciones, pool=pool)
+        for prescripcion in prescripciones:
+            (destino / f'{prescripcion.numero_prescripcion}.pdf').write_bytes(pdfs[prescripcion.pk])
+        return len(prescripciones)
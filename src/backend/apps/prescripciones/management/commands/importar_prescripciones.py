@@ -0,0 +1,71 @@
+"""
+Importa prescripciones históricas desde un archivo CSV, XLSX o JSON
+
+Usa la misma importación por lotes que POST /api/prescripciones/importar/
+(ver apps/prescripciones/importacion.py): números reservados por bloques,
+bulk_create y recálculo de la vigencia por lote.
+
+Uso:
+    python manage.py importar_prescripciones examenes.csv --profesional optometra
+    python manage.py importar_prescripciones examenes.xlsx --profesional optometra --lote 2000
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.importacion import ErrorImportacion, formato_de, leer_filas
+from apps.prescripciones import importacion
+
+# Errores de fila que se muestran al terminar
+ERRORES_MOSTRADOS = 20
+
+
+class Command(BaseCommand):
+    help = 'Importa prescripciones históricas desde CSV, XLSX o JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo')
+        parser.add_argument(
+            '--profesional', required=True,
+            help='Usuario (username) que queda como profesional de las prescripciones'
+        )
+        parser.add_argument(
+            '--formato', choices=['csv', 'xlsx', 'json'],
+            help='Formato del archivo; por defecto según la extensión'
+        )
+        parser.add_argument(
+            '--lote', type=int, default=importacion.TAMANO_LOTE,
+            help=f'Filas por lote (por defecto {importacion.TAMANO_LOTE})'
+        )
+
+    def handle(self, *args, **options):
+        profesional = User.objects.filter(username=options['profesional']).first()
+        if profesional is None:
+            raise CommandError(f"No existe el usuario {options['profesional']}")
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que cero')
+
+        try:
+            formato = formato_de(options['archivo'], options['formato'])
+            with open(options['archivo'], 'rb') as archivo:
+                filas = leer_filas(archivo, formato, importacion.CAMPOS)
+        except (ErrorImportacion, OSError) as error:
+            raise CommandError(str(error))
+
+        def al_avanzar(resultado):
+            self.stdout.write(
+                f"{resultado['filas_procesadas']}/{resultado['total_filas']} filas, "
+                f"{resultado['creados']} creadas, {resultado['total_errores']} con errores"
+            )
+
+        resultado = importacion.importar_filas(filas, profesional, al_avanzar, options['lote'])
+
+        for error in resultado['errores'][:ERRORES_MOSTRADOS]:
+            detalle = '; '.join(
+                f"{campo}: {' '.join(mensajes)}" for campo, mensajes in error['errores'].items()
+            )
+            self.stderr.write(f"Fila {error['fila']}: {detalle}")
+        if resultado['total_errores'] > ERRORES_MOSTRADOS:
+            self.stderr.write(f"... y {resultado['total_errores'] - ERRORES_MOSTRADOS} filas más con errores")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Prescripciones importadas: {resultado['creados']} de {resultado['total_filas']}"
+        ))
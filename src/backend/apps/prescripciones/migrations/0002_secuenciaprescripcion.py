@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+def poblar_secuencias(apps, schema_editor):
+    """Inicializa los contadores con el mayor número existente de cada año"""
+    Prescripcion = apps.get_model('prescripciones', 'Prescripcion')
+    SecuenciaPrescripcion = apps.get_model('prescripciones', 'SecuenciaPrescripcion')
+
+    ultimos = {}
+    for numero in Prescripcion.objects.values_list('numero_prescripcion', flat=True).iterator():
+        partes = numero.split('-')
+        if len(partes) != 3 or partes[0] != 'PRES':
+            continue
+        if not (partes[1].isdigit() and partes[2].isdigit()):
+            continue
+        anio, consecutivo = int(partes[1]), int(partes[2])
+        ultimos[anio] = max(ultimos.get(anio, 0), consecutivo)
+
+    SecuenciaPrescripcion.objects.bulk_create([
+        SecuenciaPrescripcion(anio=anio, ultimo_numero=ultimo)
+        for anio, ultimo in ultimos.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescripciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaPrescripcion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveIntegerField(unique=True, verbose_name='Año')),
+                ('ultimo_numero', models.PositiveIntegerField(default=0, verbose_name='Último Número Asignado')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Prescripciones',
+                'verbose_name_plural': 'Secuencias de Prescripciones',
+                'db_table': 'secuencias_prescripciones',
+                'ordering': ['-anio'],
+            },
+        ),
+        migrations.RunPython(poblar_secuencias, migrations.RunPython.noop),
+    ]
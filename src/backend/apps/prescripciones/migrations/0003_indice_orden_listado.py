@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescripciones', '0002_secuenciaprescripcion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prescripcion',
+            index=models.Index(fields=['-fecha_examen', '-fecha_registro'], name='prescripcio_fecha_e_4115a6_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescripciones', '0003_indice_orden_listado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prescripcion',
+            name='fecha_vencimiento',
+            field=models.DateField(blank=True, editable=False, help_text='fecha_examen + 730 días, calculada al guardar', null=True, verbose_name='Fecha de Vencimiento'),
+        ),
+        migrations.AddField(
+            model_name='prescripcion',
+            name='recordatorio_enviado',
+            field=models.BooleanField(default=False, editable=False, help_text='Ya se programó el aviso de vencimiento próximo', verbose_name='Recordatorio Enviado'),
+        ),
+    ]
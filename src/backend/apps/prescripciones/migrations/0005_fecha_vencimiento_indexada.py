@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:13
+
+from datetime import timedelta
+from django.db import migrations, models
+
+
+def calcular_fechas_vencimiento(apps, schema_editor):
+    """fecha_vencimiento = fecha_examen + 730 días para las filas existentes"""
+    Prescripcion = apps.get_model('prescripciones', 'Prescripcion')
+    pendientes = Prescripcion.objects.filter(fecha_vencimiento__isnull=True).order_by('id')
+    while True:
+        lote = list(pendientes.only('id', 'fecha_examen')[:2000])
+        if not lote:
+            break
+        for prescripcion in lote:
+            prescripcion.fecha_vencimiento = prescripcion.fecha_examen + timedelta(days=730)
+        Prescripcion.objects.bulk_update(lote, ['fecha_vencimiento'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescripciones', '0004_vencimiento_y_recordatorio'),
+    ]
+
+    operations = [
+        migrations.RunPython(calcular_fechas_vencimiento, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='prescripcion',
+            index=models.Index(
+                condition=models.Q(('vigente', True)),
+                fields=['fecha_vencimiento'],
+                name='prescripcion_vence_vig_idx'
+            ),
+        ),
+    ]
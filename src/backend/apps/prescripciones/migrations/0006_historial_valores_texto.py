@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescripciones', '0005_fecha_vencimiento_indexada'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historialcambios',
+            name='valor_anterior',
+            field=models.TextField(),
+        ),
+        migrations.AlterField(
+            model_name='historialcambios',
+            name='valor_nuevo',
+            field=models.TextField(),
+        ),
+    ]
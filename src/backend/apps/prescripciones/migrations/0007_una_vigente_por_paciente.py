@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def dejar_una_vigente(apps, schema_editor):
+    """
+    Deja vigente solo la prescripción más reciente de cada paciente, para
+    poder crear la restricción. Las estadísticas diarias se recalculan
+    después con el comando reconstruir_estadisticas.
+    """
+    Prescripcion = apps.get_model('prescripciones', 'Prescripcion')
+    ultima = Prescripcion.objects.filter(
+        paciente=OuterRef('paciente')
+    ).order_by('-fecha_examen', '-id').values('id')[:1]
+    Prescripcion.objects.filter(vigente=True).exclude(id=Subquery(ultima)).update(vigente=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescripciones', '0006_historial_valores_texto'),
+    ]
+
+    operations = [
+        migrations.RunPython(dejar_una_vigente, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='prescripcion',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('vigente', True)),
+                fields=('paciente',),
+                name='prescripcion_una_vigente'
+            ),
+        ),
+    ]
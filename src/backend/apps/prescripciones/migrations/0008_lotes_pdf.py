@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('prescripciones', '0007_una_vigente_por_paciente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotePdf',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prescripciones', models.JSONField(default=list, help_text='Ids de las prescripciones, en el orden solicitado', verbose_name='Prescripciones')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('fallido', 'Fallido')], default='pendiente', max_length=12, verbose_name='Estado')),
+                ('archivo', models.FileField(blank=True, upload_to='pdf_lotes/', verbose_name='Archivo ZIP')),
+                ('mensaje', models.TextField(blank=True, help_text='Motivo si la generación falló', verbose_name='Mensaje')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_finalizacion', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Finalización')),
+                ('usuario', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lotes_pdf', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Lote de PDF',
+                'verbose_name_plural': 'Lotes de PDF',
+                'db_table': 'lotes_pdf',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+    ]
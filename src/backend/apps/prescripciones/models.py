@@ -1,14 +1,83 @@
-from django.db import models
+from datetime import date, timedelta
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Lag
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User
 from apps.pacientes.models import Paciente
 
+# Vigencia de una prescripción desde la fecha del examen (2 años)
+DIAS_VIGENCIA = 730
+
+# Días antes del vencimiento en que una prescripción está "por vencer"
+DIAS_AVISO_VENCIMIENTO = 90
+
+
+class PrescripcionQuerySet(models.QuerySet):
+    """
+    QuerySet con anotaciones calculadas en la base de datos
+    """
+    
+    CAMPOS_DIFERENCIA = ['od_esfera', 'od_cilindro', 'os_esfera', 'os_cilindro']
+    
+    def con_diferencia_anterior(self):
+        """
+        Anota los valores de la prescripción anterior del mismo paciente
+        usando LAG(), para calcular diferencias sin una consulta por fila.
+        
+        Debe aplicarse después de los filtros: la ventana solo ve las filas
+        que quedan en el WHERE.
+        """
+        def anterior(campo):
+            return Window(
+                expression=Lag(campo),
+                partition_by=[F('paciente')],
+                order_by=[F('fecha_examen').asc(), F('id').asc()]
+            )
+        
+        anotaciones = {
+            f'anterior_{campo}': anterior(campo)
+            for campo in self.CAMPOS_DIFERENCIA + ['fecha_examen']
+        }
+        return self.annotate(**anotaciones)
+    
+    def recalcular_vigencia(self):
+        """
+        Deja como vigente solo la prescripción más reciente (por fecha de
+        examen) de cada paciente del queryset, con un único UPDATE. Retorna
+        los grupos (fecha_examen, profesional_id) de las filas que dejaron
+        de estar vigentes, para prescripciones_actualizadas.
+        """
+        ultima = self.model.objects.filter(
+            paciente=OuterRef('paciente')
+        ).order_by('-fecha_examen', '-id').values('id')[:1]
+        anteriores = self.filter(vigente=True).exclude(id=Subquery(ultima))
+        afectadas = set(anteriores.values_list('fecha_examen', 'profesional_id'))
+        if afectadas:
+            anteriores.update(vigente=False)
+        return afectadas
+    
+    def activar_ultimas(self, hoy=None):
+        """
+        Marca como vigentes, con un único UPDATE, las prescripciones del
+        queryset que son la más reciente de su paciente y no han vencido.
+        Usar después de recalcular_vigencia() (una sola vigente por paciente).
+        """
+        ultima = self.model.objects.filter(
+            paciente=OuterRef('paciente')
+        ).order_by('-fecha_examen', '-id').values('id')[:1]
+        return self.filter(
+            id=Subquery(ultima), vigente=False, fecha_vencimiento__gte=hoy or date.today()
+        ).update(vigente=True)
+
 
 class Prescripcion(models.Model):
     """
     Modelo para almacenar prescripciones oftalmológicas (fórmulas visuales)
     """
     
+    objects = PrescripcionQuerySet.as_manager()
+    
     # Relaciones
     paciente = models.ForeignKey(
         Paciente,
@@ -131,6 +200,19 @@ class Prescripcion(models.Model):
         verbose_name='Vigente',
         help_text='Las prescripciones tienen vigencia de 2 años'
     )
+    fecha_vencimiento = models.DateField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Fecha de Vencimiento',
+        help_text='fecha_examen + 730 días, calculada al guardar'
+    )
+    recordatorio_enviado = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Recordatorio Enviado',
+        help_text='Ya se programó el aviso de vencimiento próximo'
+    )
     
     # Campos de auditoría
     fecha_registro = models.DateTimeField(
@@ -152,30 +234,62 @@ class Prescripcion(models.Model):
             models.Index(fields=['numero_prescripcion']),
             models.Index(fields=['vigente', '-fecha_examen']),
             models.Index(fields=['profesional', '-fecha_registro']),
+            # Orden por defecto del listado (paginación por cursor)
+            models.Index(fields=['-fecha_examen', '-fecha_registro']),
+            # "Por vencer en N días" como un rango sobre el índice. Parcial
+            # (solo vigentes): es más pequeño y SQLite no usa un índice
+            # compuesto para "vigente" sin comparación explícita.
+            models.Index(
+                fields=['fecha_vencimiento'],
+                condition=Q(vigente=True),
+                name='prescripcion_vence_vig_idx'
+            ),
+        ]
+        constraints = [
+            # Una sola prescripción vigente por paciente (índice único
+            # parcial); también sirve para buscar la vigente de un paciente
+            models.UniqueConstraint(
+                fields=['paciente'],
+                condition=Q(vigente=True),
+                name='prescripcion_una_vigente'
+            ),
         ]
     
     def __str__(self):
         return f"Prescripción {self.numero_prescripcion} - {self.paciente.nombre_completo} ({self.fecha_examen})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Para saber en save() si la prescripción pasa a ser vigente
+        instance._vigente_guardada = instance.__dict__.get('vigente')
+        return instance
+    
     def save(self, *args, **kwargs):
-        """Generar número de prescripción automáticamente"""
+        """
+        Generar número de prescripción automáticamente. Si la prescripción
+        es nueva y vigente (o pasa a serlo), las demás del paciente dejan de
+        estarlo en la misma transacción, antes de guardarla: la restricción
+        prescripcion_una_vigente no admite dos a la vez.
+        """
         if not self.numero_prescripcion:
             # Formato: PRES-YYYY-NNNN
-            from datetime import date
             year = date.today().year
-            last_prescription = Prescripcion.objects.filter(
-                numero_prescripcion__startswith=f'PRES-{year}-'
-            ).order_by('-numero_prescripcion').first()
-            
-            if last_prescription:
-                last_number = int(last_prescription.numero_prescripcion.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
-            self.numero_prescripcion = f'PRES-{year}-{new_number:04d}'
+            numero = SecuenciaPrescripcion.reservar(year).start
+            self.numero_prescripcion = SecuenciaPrescripcion.formatear(year, numero)
+        
+        if isinstance(self.fecha_examen, date):
+            self.fecha_vencimiento = self.fecha_examen + timedelta(days=DIAS_VIGENCIA)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'fecha_examen' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'fecha_vencimiento'}
         
-        super().save(*args, **kwargs)
+        # Una transacción también para las estadísticas diarias (post_save)
+        with transaction.atomic():
+            if self.vigente and (self._state.adding or not getattr(self, '_vigente_guardada', False)):
+                self.invalidar_prescripciones_anteriores()
+            super().save(*args, **kwargs)
+        self._vigente_guardada = self.vigente
     
     @property
     def edad_paciente_en_examen(self):
@@ -188,24 +302,24 @@ class Prescripcion(models.Model):
             )
         return None
     
+    @property
+    def vence_el(self):
+        """fecha_vencimiento guardada (calculada si la fila aún no la tiene)"""
+        return self.fecha_vencimiento or self.fecha_examen + timedelta(days=DIAS_VIGENCIA)
+    
     @property
     def es_vigente(self):
         """Verifica si la prescripción está vigente (2 años)"""
-        from datetime import date, timedelta
         if not self.vigente:
             return False
-        fecha_vencimiento = self.fecha_examen + timedelta(days=730)  # 2 años
-        return date.today() <= fecha_vencimiento
+        return date.today() <= self.vence_el
     
     @property
     def dias_hasta_vencimiento(self):
         """Días restantes hasta el vencimiento"""
-        from datetime import date, timedelta
         if not self.vigente:
             return 0
-        fecha_vencimiento = self.fecha_examen + timedelta(days=730)
-        diferencia = fecha_vencimiento - date.today()
-        return max(0, diferencia.days)
+        return max(0, (self.vence_el - date.today()).days)
     
     @property
     def tiene_astigmatismo(self):
@@ -239,21 +353,32 @@ class Prescripcion(models.Model):
     
     def calcular_diferencia_con_anterior(self):
         """Calcula la diferencia con la prescripción anterior"""
-        anterior = Prescripcion.objects.filter(
-            paciente=self.paciente,
-            fecha_examen__lt=self.fecha_examen,
-            vigente=True
-        ).order_by('-fecha_examen').first()
+        if hasattr(self, 'anterior_fecha_examen'):
+            # Valores ya anotados con PrescripcionQuerySet.con_diferencia_anterior()
+            if self.anterior_fecha_examen is None:
+                return None
+            anterior = {
+                campo: getattr(self, f'anterior_{campo}')
+                for campo in PrescripcionQuerySet.CAMPOS_DIFERENCIA + ['fecha_examen']
+            }
+        else:
+            anterior = Prescripcion.objects.filter(
+                Q(fecha_examen__lt=self.fecha_examen) |
+                Q(fecha_examen=self.fecha_examen, id__lt=self.id),
+                paciente_id=self.paciente_id
+            ).order_by('-fecha_examen', '-id').values(
+                *PrescripcionQuerySet.CAMPOS_DIFERENCIA, 'fecha_examen'
+            ).first()
         
         if not anterior:
             return None
         
         diferencias = {
-            'od_esfera': abs(float(self.od_esfera) - float(anterior.od_esfera)),
-            'od_cilindro': abs(float(self.od_cilindro) - float(anterior.od_cilindro)),
-            'os_esfera': abs(float(self.os_esfera) - float(anterior.os_esfera)),
-            'os_cilindro': abs(float(self.os_cilindro) - float(anterior.os_cilindro)),
-            'meses_transcurridos': (self.fecha_examen - anterior.fecha_examen).days // 30
+            'od_esfera': abs(float(self.od_esfera) - float(anterior['od_esfera'])),
+            'od_cilindro': abs(float(self.od_cilindro) - float(anterior['od_cilindro'])),
+            'os_esfera': abs(float(self.os_esfera) - float(anterior['os_esfera'])),
+            'os_cilindro': abs(float(self.os_cilindro) - float(anterior['os_cilindro'])),
+            'meses_transcurridos': (self.fecha_examen - anterior['fecha_examen']).days // 30
         }
         
         # Diferencia máxima
@@ -265,11 +390,27 @@ class Prescripcion(models.Model):
         return diferencias
     
     def invalidar_prescripciones_anteriores(self):
-        """Marca como no vigentes las prescripciones anteriores del mismo paciente"""
-        Prescripcion.objects.filter(
-            paciente=self.paciente,
+        """
+        Marca como no vigentes las demás prescripciones del mismo paciente
+        (como máximo una, por prescripcion_una_vigente). La fila se bloquea
+        hasta el final de la transacción, para que dos altas simultáneas del
+        mismo paciente se atiendan una tras otra.
+        """
+        from .signals import prescripciones_actualizadas
+        
+        anteriores = Prescripcion.objects.filter(
+            paciente_id=self.paciente_id,
             vigente=True
-        ).exclude(id=self.id).update(vigente=False)
+        ).exclude(id=self.id)
+        with transaction.atomic():
+            afectadas = list(anteriores.select_for_update().values_list('id', 'fecha_examen', 'profesional_id'))
+            if afectadas:
+                Prescripcion.objects.filter(id__in=[id_ for id_, _, _ in afectadas]).update(vigente=False)
+        
+        if afectadas:
+            prescripciones_actualizadas.send(
+                sender=Prescripcion, afectadas={(fecha, profesional) for _, fecha, profesional in afectadas}
+            )
 
 
 class HistorialCambios(models.Model):
@@ -277,14 +418,25 @@ class HistorialCambios(models.Model):
     Modelo para llevar un historial de cambios en prescripciones
     """
     
+    # Campos clínicos cuyos cambios se registran al editar una prescripción
+    CAMPOS_REGISTRADOS = [
+        'fecha_examen',
+        'od_esfera', 'od_cilindro', 'od_eje',
+        'os_esfera', 'os_cilindro', 'os_eje',
+        'adicion', 'distancia_pupilar',
+        'agudeza_visual_od', 'agudeza_visual_os',
+        'tipo_lente_recomendado', 'observaciones',
+    ]
+    
     prescripcion = models.ForeignKey(
         Prescripcion,
         on_delete=models.CASCADE,
         related_name='historial_cambios'
     )
     campo_modificado = models.CharField(max_length=50)
-    valor_anterior = models.CharField(max_length=100)
-    valor_nuevo = models.CharField(max_length=100)
+    # Texto: observaciones no tiene límite de longitud
+    valor_anterior = models.TextField()
+    valor_nuevo = models.TextField()
     usuario = models.ForeignKey(User, on_delete=models.PROTECT)
     fecha_cambio = models.DateTimeField(auto_now_add=True)
     motivo = models.TextField(blank=True)
@@ -293,4 +445,173 @@ class HistorialCambios(models.Model):
         db_table = 'historial_cambios_prescripciones'
         verbose_name = 'Historial de Cambio'
         verbose_name_plural = 'Historial de Cambios'
-        ordering = ['-fecha_cambio']
\ No newline at end of file
+        ordering = ['-fecha_cambio']
+    
+    @classmethod
+    def valores(cls, prescripcion):
+        """Valores actuales de CAMPOS_REGISTRADOS (sin consultas)"""
+        return {campo: getattr(prescripcion, campo) for campo in cls.CAMPOS_REGISTRADOS}
+    
+    @classmethod
+    def registrar(cls, prescripcion, anteriores, usuario, motivo=''):
+        """
+        Guarda con un solo INSERT un registro por cada campo que cambió
+        respecto a `anteriores` (tomados con valores() antes de guardar).
+        Retorna los registros creados.
+        """
+        cambios = [
+            cls(
+                prescripcion=prescripcion,
+                campo_modificado=campo,
+                valor_anterior=str(valor_anterior),
+                valor_nuevo=str(getattr(prescripcion, campo)),
+                usuario=usuario,
+                motivo=motivo,
+            )
+            for campo, valor_anterior in anteriores.items()
+            if valor_anterior != getattr(prescripcion, campo)
+        ]
+        if cambios:
+            cls.objects.bulk_create(cambios)
+        return cambios
+
+
+class SecuenciaPrescripcion(models.Model):
+    """
+    Contador por año para asignar números de prescripción sin escanear la tabla
+    """
+    
+    PREFIJO = 'PRES'
+    
+    anio = models.PositiveIntegerField(
+        unique=True,
+        verbose_name='Año'
+    )
+    ultimo_numero = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Último Número Asignado'
+    )
+    
+    class Meta:
+        db_table = 'secuencias_prescripciones'
+        verbose_name = 'Secuencia de Prescripciones'
+        verbose_name_plural = 'Secuencias de Prescripciones'
+        ordering = ['-anio']
+    
+    def __str__(self):
+        return f"{self.PREFIJO}-{self.anio}: {self.ultimo_numero}"
+    
+    @classmethod
+    def formatear(cls, anio, numero):
+        """Formato estándar PRES-YYYY-NNNN (crece a 5+ dígitos después de 9999)"""
+        return f'{cls.PREFIJO}-{anio}-{numero:04d}'
+    
+    @classmethod
+    def reservar(cls, anio, cantidad=1):
+        """
+        Reserva un bloque contiguo de números para el año y retorna un range.
+        
+        El incremento se hace con un UPDATE condicional (F()), que toma el
+        bloqueo de fila en PostgreSQL y el bloqueo de escritura en SQLite,
+        por lo que dos transacciones concurrentes nunca reciben el mismo número.
+        """
+        if cantidad < 1:
+            raise ValueError('La cantidad a reservar debe ser mayor que cero.')
+        
+        with transaction.atomic(savepoint=False):
+            actualizadas = cls.objects.filter(anio=anio).update(
+                ultimo_numero=F('ultimo_numero') + cantidad
+            )
+            if not actualizadas:
+                cls._crear_contador(anio)
+                cls.objects.filter(anio=anio).update(
+                    ultimo_numero=F('ultimo_numero') + cantidad
+                )
+            ultimo = cls.objects.filter(anio=anio).values_list(
+                'ultimo_numero', flat=True
+            ).get()
+        
+        return range(ultimo - cantidad + 1, ultimo + 1)
+    
+    @classmethod
+    def _crear_contador(cls, anio):
+        """Crea el contador del año partiendo del mayor número ya existente"""
+        prefijo = f'{cls.PREFIJO}-{anio}-'
+        existentes = Prescripcion.objects.filter(
+            numero_prescripcion__startswith=prefijo
+        ).values_list('numero_prescripcion', flat=True)
+        
+        # Se compara numéricamente: el orden lexicográfico falla después de 9999
+        ultimo = max(
+            (int(numero.rsplit('-', 1)[-1]) for numero in existentes
+             if numero.rsplit('-', 1)[-1].isdigit()),
+            default=0
+        )
+        
+        try:
+            with transaction.atomic():
+                cls.objects.create(anio=anio, ultimo_numero=ultimo)
+        except IntegrityError:
+            # Otra transacción creó el contador primero
+            pass
+
+
+class LotePdf(models.Model):
+    """
+    ZIP con los PDF de varias prescripciones, generado en segundo plano
+    (ver tasks.generar_pdf_lote)
+    """
+    PENDIENTE = 'pendiente'
+    PROCESANDO = 'procesando'
+    COMPLETADO = 'completado'
+    FALLIDO = 'fallido'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (PROCESANDO, 'Procesando'),
+        (COMPLETADO, 'Completado'),
+        (FALLIDO, 'Fallido'),
+    ]
+    
+    # Días que se conservan los ZIP generados (tasks.limpiar_lotes_pdf)
+    DIAS_CONSERVACION = 1
+    
+    prescripciones = models.JSONField(
+        default=list,
+        verbose_name='Prescripciones',
+        help_text='Ids de las prescripciones, en el orden solicitado'
+    )
+    estado = models.CharField(
+        max_length=12,
+        choices=ESTADOS,
+        default=PENDIENTE,
+        verbose_name='Estado'
+    )
+    archivo = models.FileField(
+        upload_to='pdf_lotes/',
+        blank=True,
+        verbose_name='Archivo ZIP'
+    )
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='lotes_pdf',
+        verbose_name='Usuario'
+    )
+    mensaje = models.TextField(
+        blank=True,
+        verbose_name='Mensaje',
+        help_text='Motivo si la generación falló'
+    )
+    
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
+    fecha_finalizacion = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de Finalización')
+    
+    class Meta:
+        db_table = 'lotes_pdf'
+        verbose_name = 'Lote de PDF'
+        verbose_name_plural = 'Lotes de PDF'
+        ordering = ['-fecha_creacion']
+    
+    def __str__(self):
+        return f"Lote de PDF #{self.pk} ({self.estado})"
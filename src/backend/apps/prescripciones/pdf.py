@@ -0,0 +1,231 @@
+"""
+PDF imprimible de las prescripciones.
+
+El dibujo (renderizar_pdf) recibe solo datos simples, sin modelos ni
+consultas, para poder ejecutarse en un pool de procesos (solo el comando
+generar_pdfs_prescripciones lo usa; la API dibuja en el proceso o encola
+los lotes grandes en Celery, ver tasks.generar_pdf_lote). La plantilla de la
+página (encabezado de la empresa, etiquetas, tabla) se calcula una vez por
+proceso y se dibuja como un XObject de formulario. Los PDF se guardan en la
+caché por (id, fecha_actualizacion) más los datos del paciente y del
+profesional que se imprimen (ver clave_pdf), de modo que reimprimir una
+prescripción sin cambios no vuelve a dibujarla.
+"""
+import hashlib
+import zipfile
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas
+
+# Segundos que un PDF renderizado permanece en la caché
+PDF_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Por debajo de esta cantidad se dibuja en el mismo proceso (arrancar el
+# pool cuesta más que dibujar unas pocas páginas)
+MINIMO_PARA_PROCESOS = 20
+
+ANCHO, ALTO = letter
+MARGEN = 20 * mm
+COLUMNAS_TABLA = ['Ojo', 'Esfera', 'Cilindro', 'Eje', 'Adición', 'AV']
+
+
+class _Plantilla:
+    """Posiciones y textos fijos de la página, calculados una vez por proceso"""
+
+    def __init__(self, empresa):
+        self.empresa = empresa
+        self.ancho_columna = (ANCHO - 2 * MARGEN) / len(COLUMNAS_TABLA)
+        self.x_columnas = [MARGEN + i * self.ancho_columna for i in range(len(COLUMNAS_TABLA))]
+        self.y_datos = ALTO - MARGEN - 42 * mm
+        self.y_tabla = self.y_datos - 34 * mm
+        self.y_detalle = self.y_tabla - 30 * mm
+        self.y_firma = MARGEN + 25 * mm
+        self.etiquetas = [
+            (MARGEN, self.y_datos, 'Paciente:'),
+            (MARGEN, self.y_datos - 7 * mm, 'Documento:'),
+            (MARGEN, self.y_datos - 14 * mm, 'Edad:'),
+            (ANCHO / 2, self.y_datos, 'N°:'),
+            (ANCHO / 2, self.y_datos - 7 * mm, 'Fecha de examen:'),
+            (ANCHO / 2, self.y_datos - 14 * mm, 'Válida hasta:'),
+            (MARGEN, self.y_detalle, 'Distancia pupilar:'),
+            (MARGEN, self.y_detalle - 7 * mm, 'Tipo de lente:'),
+            (MARGEN, self.y_detalle - 14 * mm, 'Observaciones:'),
+        ]
+
+    def dibujar(self, c):
+        empresa = self.empresa
+        c.setFont('Helvetica-Bold', 16)
+        c.drawString(MARGEN, ALTO - MARGEN, empresa['NOMBRE'])
+        c.setFont('Helvetica', 9)
+        c.drawString(MARGEN, ALTO - MARGEN - 6 * mm, f"NIT {empresa['NIT']} · {empresa['DIRECCION']}")
+        c.drawString(MARGEN, ALTO - MARGEN - 11 * mm, f"Tel. {empresa['TELEFONO']} · {empresa['EMAIL']}")
+        c.line(MARGEN, ALTO - MARGEN - 15 * mm, ANCHO - MARGEN, ALTO - MARGEN - 15 * mm)
+        c.setFont('Helvetica-Bold', 13)
+        c.drawCentredString(ANCHO / 2, ALTO - MARGEN - 27 * mm, 'PRESCRIPCIÓN OPTOMÉTRICA')
+
+        c.setFont('Helvetica-Bold', 10)
+        for x, y, texto in self.etiquetas:
+            c.drawString(x, y, texto)
+
+        # Tabla de graduación: encabezado y etiquetas de fila
+        c.rect(MARGEN, self.y_tabla - 16 * mm, ANCHO - 2 * MARGEN, 24 * mm)
+        c.line(MARGEN, self.y_tabla - 2 * mm, ANCHO - MARGEN, self.y_tabla - 2 * mm)
+        for x, titulo in zip(self.x_columnas, COLUMNAS_TABLA):
+            c.drawString(x + 2 * mm, self.y_tabla + 2 * mm, titulo)
+        c.drawString(self.x_columnas[0] + 2 * mm, self.y_tabla - 7 * mm, 'OD')
+        c.drawString(self.x_columnas[0] + 2 * mm, self.y_tabla - 14 * mm, 'OI')
+
+        c.line(ANCHO - MARGEN - 70 * mm, self.y_firma, ANCHO - MARGEN, self.y_firma)
+        c.setFont('Helvetica', 9)
+        c.drawCentredString(ANCHO - MARGEN - 35 * mm, self.y_firma - 5 * mm, 'Firma del profesional')
+
+
+@lru_cache(maxsize=4)
+def _plantilla(empresa):
+    return _Plantilla(dict(empresa))
+
+
+def renderizar_pdf(datos):
+    """Dibuja una prescripción (dict de datos_pdf) y retorna los bytes del PDF"""
+    plantilla = _plantilla(tuple(sorted(datos['empresa'].items())))
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter, pageCompression=1)
+    c.setTitle(f"Prescripción {datos['numero']}")
+    c.setAuthor(plantilla.empresa['NOMBRE'])
+
+    c.beginForm('plantilla')
+    plantilla.dibujar(c)
+    c.endForm()
+    c.doForm('plantilla')
+
+    c.setFont('Helvetica', 10)
+    x_valor = MARGEN + 24 * mm
+    x_valor_derecha = ANCHO / 2 + 32 * mm
+    c.drawString(x_valor, plantilla.y_datos, datos['paciente'])
+    c.drawString(x_valor, plantilla.y_datos - 7 * mm, datos['documento'])
+    c.drawString(x_valor, plantilla.y_datos - 14 * mm, datos['edad'])
+    c.drawString(x_valor_derecha, plantilla.y_datos, datos['numero'])
+    c.drawString(x_valor_derecha, plantilla.y_datos - 7 * mm, datos['fecha_examen'])
+    c.drawString(x_valor_derecha, plantilla.y_datos - 14 * mm, datos['valida_hasta'])
+
+    for fila, y in ((datos['od'], plantilla.y_tabla - 7 * mm), (datos['oi'], plantilla.y_tabla - 14 * mm)):
+        for x, valor in zip(plantilla.x_columnas[1:], fila):
+            c.drawString(x + 2 * mm, y, valor)
+
+    x_detalle = MARGEN + 34 * mm
+    c.drawString(x_detalle, plantilla.y_detalle, datos['distancia_pupilar'])
+    c.drawString(x_detalle, plantilla.y_detalle - 7 * mm, datos['tipo_lente'])
+    lineas = simpleSplit(datos['observaciones'], 'Helvetica', 10, ANCHO - MARGEN - x_detalle)
+    y = plantilla.y_detalle - 14 * mm
+    for linea in lineas[:12]:
+        c.drawString(x_detalle, y, linea)
+        y -= 5 * mm
+
+    c.drawCentredString(ANCHO - MARGEN - 35 * mm, plantilla.y_firma + 2 * mm, datos['profesional'])
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def datos_pdf(prescripcion):
+    """Datos simples (serializables entre procesos) de una prescripción"""
+    def dioptrias(valor):
+        return f'{valor:+.2f}' if valor is not None else ''
+
+    edad = prescripcion.edad_paciente_en_examen
+    return {
+        'empresa': dict(settings.EMPRESA_CONFIG),
+        'numero': prescripcion.numero_prescripcion,
+        'fecha_examen': prescripcion.fecha_examen.strftime('%d/%m/%Y'),
+        'valida_hasta': prescripcion.vence_el.strftime('%d/%m/%Y'),
+        'paciente': prescripcion.paciente.nombre_completo,
+        'documento': f'{prescripcion.paciente.tipo_documento} {prescripcion.paciente.numero_documento}',
+        'edad': f'{edad} años' if edad is not None else '',
+        'profesional': nombre_profesional(prescripcion.profesional),
+        'od': [
+            dioptrias(prescripcion.od_esfera),
+            dioptrias(prescripcion.od_cilindro) if prescripcion.od_cilindro else '',
+            f'{prescripcion.od_eje}°' if prescripcion.od_cilindro else '',
+            dioptrias(prescripcion.adicion) if prescripcion.adicion else '',
+            prescripcion.agudeza_visual_od,
+        ],
+        'oi': [
+            dioptrias(prescripcion.os_esfera),
+            dioptrias(prescripcion.os_cilindro) if prescripcion.os_cilindro else '',
+            f'{prescripcion.os_eje}°' if prescripcion.os_cilindro else '',
+            dioptrias(prescripcion.adicion) if prescripcion.adicion else '',
+            prescripcion.agudeza_visual_os,
+        ],
+        'distancia_pupilar': f'{prescripcion.distancia_pupilar} mm' if prescripcion.distancia_pupilar else '',
+        'tipo_lente': prescripcion.tipo_lente_recomendado,
+        'observaciones': prescripcion.observaciones,
+    }
+
+
+def nombre_profesional(profesional):
+    """Nombre del profesional tal como se imprime en la firma"""
+    return profesional.get_full_name() or profesional.username
+
+
+def clave_pdf(prescripcion):
+    """
+    Clave de caché: id y fecha_actualizacion de la prescripción, más la del
+    paciente (su nombre y documento también se imprimen) y el profesional
+    con el nombre impreso (User no tiene fecha de actualización; el nombre
+    va como hash para no poner espacios en la clave)
+    """
+    marcas = [prescripcion.fecha_actualizacion, prescripcion.paciente.fecha_actualizacion]
+    profesional = prescripcion.profesional
+    nombre = hashlib.sha1(nombre_profesional(profesional).encode()).hexdigest()[:12]
+    return (
+        f"pdf_prescripcion:{prescripcion.pk}:{':'.join(str(m.timestamp()) for m in marcas)}"
+        f":{profesional.pk}:{nombre}"
+    )
+
+
+def pdfs_prescripciones(prescripciones, pool=None):
+    """
+    Retorna {id: bytes del PDF} para las prescripciones dadas (con paciente
+    y profesional ya cargados). Las que no están en la caché se dibujan en
+    el proceso actual o, si son muchas y se pasa `pool` (un
+    ProcessPoolExecutor), en ese pool.
+    """
+    prescripciones = list(prescripciones)
+    claves = {prescripcion.pk: clave_pdf(prescripcion) for prescripcion in prescripciones}
+    en_cache = cache.get_many(list(claves.values()))
+
+    pendientes = [p for p in prescripciones if claves[p.pk] not in en_cache]
+    datos = [datos_pdf(p) for p in pendientes]
+    if pool is not None and len(datos) >= MINIMO_PARA_PROCESOS:
+        renderizados = list(pool.map(renderizar_pdf, datos, chunksize=10))
+    else:
+        renderizados = [renderizar_pdf(d) for d in datos]
+
+    nuevos = {claves[p.pk]: pdf for p, pdf in zip(pendientes, renderizados)}
+    cache.set_many(nuevos, PDF_CACHE_TIMEOUT)
+    en_cache.update(nuevos)
+    return {pk: en_cache[clave] for pk, clave in claves.items()}
+
+
+def pdf_prescripcion(prescripcion):
+    """PDF de una sola prescripción"""
+    return pdfs_prescripciones([prescripcion])[prescripcion.pk]
+
+
+def zip_pdfs(prescripciones, destino):
+    """
+    Escribe en `destino` (archivo binario) un ZIP con el PDF de cada
+    prescripción, nombrado por su número
+    """
+    prescripciones = list(prescripciones)
+    pdfs = pdfs_prescripciones(prescripciones)
+    # Los PDF ya van comprimidos: se guardan sin volver a comprimir
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_STORED) as archivo:
+        for prescripcion in prescripciones:
+            archivo.writestr(f'{prescripcion.numero_prescripcion}.pdf', pdfs[prescripcion.pk])
@@ -33,13 +33,15 @@ class PrescripcionSerializer(serializers.ModelSerializer):
             'adicion', 'distancia_pupilar',
             'agudeza_visual_od', 'agudeza_visual_os',
             'observaciones', 'tipo_lente_recomendado',
-            'vigente', 'fecha_registro', 'fecha_actualizacion',
+            'vigente', 'fecha_vencimiento', 'fecha_registro', 'fecha_actualizacion',
             # Campos calculados
             'edad_paciente_en_examen', 'es_vigente', 'dias_hasta_vencimiento',
             'tiene_astigmatismo', 'tiene_presbicia',
             'graduacion_od_completa', 'graduacion_os_completa'
         ]
-        read_only_fields = ['id', 'numero_prescripcion', 'fecha_registro', 'fecha_actualizacion']
+        read_only_fields = [
+            'id', 'numero_prescripcion', 'fecha_vencimiento', 'fecha_registro', 'fecha_actualizacion'
+        ]
     
     def validate_fecha_examen(self, value):
         """Validar que la fecha de examen no sea futura"""
@@ -101,6 +103,20 @@ class PrescripcionCreateSerializer(PrescripcionSerializer):
         ]
 
 
+class PrescripcionImportacionSerializer(PrescripcionCreateSerializer):
+    """
+    Serializer para las filas de la importación masiva: el paciente se
+    indica por número de documento y se busca por lotes (ver
+    apps/prescripciones/importacion.py), no con una consulta por fila
+    """
+    documento_paciente = serializers.CharField(max_length=20)
+    
+    class Meta(PrescripcionCreateSerializer.Meta):
+        fields = ['documento_paciente'] + [
+            campo for campo in PrescripcionCreateSerializer.Meta.fields if campo != 'paciente'
+        ]
+
+
 class PrescripcionListSerializer(serializers.ModelSerializer):
     """
     Serializer simplificado para listado de prescripciones
@@ -116,7 +132,7 @@ class PrescripcionListSerializer(serializers.ModelSerializer):
             'id', 'numero_prescripcion', 'fecha_examen',
             'paciente_nombre', 'profesional_nombre',
             'graduacion_od_completa', 'graduacion_os_completa',
-            'es_vigente', 'dias_hasta_vencimiento', 'vigente'
+            'es_vigente', 'dias_hasta_vencimiento', 'vigente', 'fecha_vencimiento'
         ]
 
 
@@ -139,7 +155,7 @@ class PrescripcionPacienteHistorialSerializer(serializers.ModelSerializer):
         ]
     
     def get_diferencia_anterior(self, obj):
-        """Obtener diferencia con prescripción anterior"""
+        """Obtener diferencia con prescripción anterior (usa las anotaciones LAG si existen)"""
         diferencia = obj.calcular_diferencia_con_anterior()
         if diferencia:
             return {
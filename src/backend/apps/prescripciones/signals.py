@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# Enviada después de actualizaciones masivas (QuerySet.update) que no disparan
+# post_save. Argumento: afectadas = conjunto de tuplas (fecha_examen, profesional_id)
+prescripciones_actualizadas = Signal()
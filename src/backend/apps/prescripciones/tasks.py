@@ -0,0 +1,159 @@
+"""
+Tareas de Celery para la vigencia y los PDF de las prescripciones
+
+vencer_prescripciones y limpiar_lotes_pdf se ejecutan a diario con Celery
+beat (ver CELERY_BEAT_SCHEDULE en settings/base.py). Todo se hace por lotes
+de ids, con UPDATE por lote, para no bloquear la tabla ni cargarla en
+memoria.
+"""
+from datetime import timedelta
+from io import BytesIO
+from celery import shared_task
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
+from .models import LotePdf, Prescripcion, DIAS_AVISO_VENCIMIENTO, DIAS_VIGENCIA
+from .pdf import zip_pdfs
+from .signals import prescripciones_actualizadas
+
+TAMANO_LOTE = 1000
+
+
+@shared_task
+def vencer_prescripciones(tamano_lote=TAMANO_LOTE):
+    """
+    Completa fecha_vencimiento donde falte, marca como no vigentes las
+    prescripciones vencidas y programa los avisos de las que entran en los
+    últimos 90 días de vigencia
+    """
+    hoy = timezone.localdate()
+    return {
+        'fechas_calculadas': calcular_fechas_vencimiento(tamano_lote),
+        'vencidas': marcar_vencidas(hoy, tamano_lote),
+        'recordatorios': programar_recordatorios(hoy, tamano_lote),
+    }
+
+
+def calcular_fechas_vencimiento(tamano_lote=TAMANO_LOTE):
+    """fecha_vencimiento para las filas guardadas antes de existir el campo"""
+    total = 0
+    pendientes = Prescripcion.objects.filter(fecha_vencimiento__isnull=True).order_by('id')
+    while True:
+        lote = list(pendientes.only('id', 'fecha_examen')[:tamano_lote])
+        if not lote:
+            return total
+        for prescripcion in lote:
+            prescripcion.fecha_vencimiento = prescripcion.fecha_examen + timedelta(days=DIAS_VIGENCIA)
+        Prescripcion.objects.bulk_update(lote, ['fecha_vencimiento'])
+        total += len(lote)
+
+
+def marcar_vencidas(hoy, tamano_lote=TAMANO_LOTE):
+    """vigente=False para las prescripciones con fecha_vencimiento pasada"""
+    total = 0
+    vencidas = Prescripcion.objects.filter(vigente=True, fecha_vencimiento__lt=hoy)
+    while True:
+        with transaction.atomic():
+            filas = list(
+                vencidas.order_by('id').values_list('id', 'fecha_examen', 'profesional_id')[:tamano_lote]
+            )
+            if not filas:
+                return total
+            vencidas.filter(id__in=[fila[0] for fila in filas]).update(vigente=False)
+            # Estadísticas diarias y caché de vigentes
+            prescripciones_actualizadas.send(
+                sender=Prescripcion,
+                afectadas={(fecha, profesional_id) for _, fecha, profesional_id in filas}
+            )
+        total += len(filas)
+
+
+def programar_recordatorios(hoy, tamano_lote=TAMANO_LOTE):
+    """
+    Encola un aviso por cada prescripción vigente que vence en los próximos
+    DIAS_AVISO_VENCIMIENTO días y no tiene aviso todavía
+    """
+    total = 0
+    pendientes = Prescripcion.objects.filter(
+        vigente=True,
+        recordatorio_enviado=False,
+        fecha_vencimiento__gte=hoy,
+        fecha_vencimiento__lte=hoy + timedelta(days=DIAS_AVISO_VENCIMIENTO),
+    )
+    while True:
+        with transaction.atomic():
+            ids = list(pendientes.order_by('id').values_list('id', flat=True)[:tamano_lote])
+            if not ids:
+                return total
+            pendientes.filter(id__in=ids).update(recordatorio_enviado=True)
+            # Se encolan al confirmar, para que el worker vea la marca
+            transaction.on_commit(lambda ids=ids: [
+                enviar_recordatorio_vencimiento.delay(prescripcion_id) for prescripcion_id in ids
+            ])
+        total += len(ids)
+
+
+@shared_task(autoretry_for=(OSError,), retry_backoff=True, max_retries=3)
+def enviar_recordatorio_vencimiento(prescripcion_id):
+    """Envía al paciente el aviso de vencimiento próximo (si tiene email)"""
+    prescripcion = Prescripcion.objects.select_related('paciente').filter(id=prescripcion_id).first()
+    if prescripcion is None or not prescripcion.paciente.email:
+        return False
+
+    empresa = settings.EMPRESA_CONFIG
+    send_mail(
+        subject=f"Su fórmula visual vence el {prescripcion.fecha_vencimiento:%d/%m/%Y}",
+        message=(
+            f"Hola {prescripcion.paciente.nombre_completo},\n\n"
+            f"Su prescripción {prescripcion.numero_prescripcion} del "
+            f"{prescripcion.fecha_examen:%d/%m/%Y} vence el "
+            f"{prescripcion.fecha_vencimiento:%d/%m/%Y}. Le recomendamos agendar un "
+            f"nuevo examen visual.\n\n"
+            f"{empresa['NOMBRE']} · Tel. {empresa['TELEFONO']}"
+        ),
+        from_email=empresa['EMAIL'],
+        recipient_list=[prescripcion.paciente.email],
+    )
+    return True
+
+
+@shared_task
+def generar_pdf_lote(lote_id):
+    """
+    Genera el ZIP de un LotePdf pendiente, fuera de los workers web (el
+    worker de Celery dibuja los PDF en su propio proceso)
+    """
+    lote = LotePdf.objects.filter(pk=lote_id, estado=LotePdf.PENDIENTE).first()
+    if lote is None:
+        return None
+    LotePdf.objects.filter(pk=lote.pk).update(estado=LotePdf.PROCESANDO)
+    
+    try:
+        encontradas = Prescripcion.objects.select_related('paciente', 'profesional').in_bulk(lote.prescripciones)
+        contenido = BytesIO()
+        zip_pdfs([encontradas[pk] for pk in lote.prescripciones if pk in encontradas], contenido)
+        lote.archivo.save(f'prescripciones-{lote.pk}.zip', ContentFile(contenido.getvalue()), save=False)
+    except Exception:
+        lote.estado = LotePdf.FALLIDO
+        lote.mensaje = 'Error inesperado al generar los PDF.'
+        raise
+    else:
+        lote.estado = LotePdf.COMPLETADO
+    finally:
+        lote.fecha_finalizacion = timezone.now()
+        lote.save()
+    return lote.estado
+
+
+@shared_task
+def limpiar_lotes_pdf():
+    """Elimina los lotes de PDF (y sus ZIP) de más de DIAS_CONSERVACION días"""
+    antiguos = LotePdf.objects.filter(
+        fecha_creacion__lt=timezone.now() - timedelta(days=LotePdf.DIAS_CONSERVACION)
+    )
+    almacenamiento = LotePdf._meta.get_field('archivo').storage
+    for nombre in antiguos.exclude(archivo='').values_list('archivo', flat=True):
+        almacenamiento.delete(nombre)
+    return antiguos.delete()[0]
@@ -1,9 +1,32 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.utils import timezone
+from django.db import DatabaseError, IntegrityError, connection, models, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
 from django.core.exceptions import ValidationError
 from datetime import date, timedelta
 from decimal import Decimal
-from .models import Prescripcion, HistorialCambios
+from io import BytesIO, StringIO
+from unittest import mock
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from openpyxl import load_workbook
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from .models import LotePdf, Prescripcion, HistorialCambios, SecuenciaPrescripcion
+from . import pdf
+from .importacion import importar_filas
+from .tasks import generar_pdf_lote, limpiar_lotes_pdf, vencer_prescripciones
+from .views import PrescripcionViewSet
+from apps.core.pruebas import PresupuestoConsultasMixin
+from apps.reportes.models import EstadisticaDiariaPrescripcion
 from apps.pacientes.models import Paciente
 
 
@@ -233,4 +256,972 @@ class HistorialCambiosTest(TestCase):
         self.assertEqual(cambio.prescripcion, self.prescripcion)
         self.assertEqual(cambio.campo_modificado, 'od_esfera')
         self.assertEqual(cambio.usuario, self.profesional)
-        self.assertIsNotNone(cambio.fecha_cambio)
\ No newline at end of file
+        self.assertIsNotNone(cambio.fecha_cambio)
+
+
+class EditarPrescripcionHistorialApiTest(APITestCase):
+    """
+    Pruebas del historial de cambios al editar una prescripción por la API
+    """
+    
+    def setUp(self):
+        self.profesional = User.objects.create_user(username='optometra1')
+        self.client.force_authenticate(user=self.profesional)
+        paciente = Paciente.objects.create(
+            numero_documento='12345678', nombres='Test', apellidos='Paciente',
+            fecha_nacimiento=date(1980, 1, 1)
+        )
+        self.prescripcion = Prescripcion.objects.create(
+            paciente=paciente, profesional=self.profesional, fecha_examen=date.today(),
+            od_esfera=Decimal('-2.00'), os_esfera=Decimal('-2.00')
+        )
+        self.url = f'/api/prescripciones/{self.prescripcion.id}/'
+    
+    def test_registra_todos_los_campos_clinicos(self):
+        observaciones = ' '.join(['Control en seis meses.'] * 10)
+        response = self.client.patch(self.url, {
+            'od_esfera': '-2.50',
+            'agudeza_visual_od': '20/40',
+            'observaciones': observaciones,
+            'os_esfera': '-2.00',
+        }, format='json')
+        
+        self.assertEqual(response.status_code, 200)
+        cambios = {
+            c.campo_modificado: (c.valor_anterior, c.valor_nuevo, c.usuario_id)
+            for c in self.prescripcion.historial_cambios.all()
+        }
+        self.assertEqual(cambios, {
+            'od_esfera': ('-2.00', '-2.50', self.profesional.id),
+            'agudeza_visual_od': ('', '20/40', self.profesional.id),
+            'observaciones': ('', observaciones, self.profesional.id),
+        })
+    
+    def test_un_solo_insert_sin_releer_la_prescripcion(self):
+        with CaptureQueriesContext(connection) as capturadas:
+            self.client.patch(self.url, {
+                'od_esfera': '-2.50', 'od_cilindro': '-0.75', 'od_eje': 90, 'adicion': '1.50'
+            }, format='json')
+        
+        sentencias = [consulta['sql'] for consulta in capturadas.captured_queries]
+        inserts = [sql for sql in sentencias if sql.startswith('INSERT INTO "historial_cambios_prescripciones"')]
+        lecturas = [sql for sql in sentencias if sql.startswith('SELECT "prescripciones"."id"')]
+        self.assertEqual(len(inserts), 1)
+        # Solo la de get_object() (las estadísticas diarias hacen un COUNT aparte)
+        self.assertEqual(len(lecturas), 1)
+        self.assertEqual(self.prescripcion.historial_cambios.count(), 4)
+    
+    def test_sin_cambios_no_registra(self):
+        self.client.patch(self.url, {'od_esfera': '-2.00'}, format='json')
+        self.assertFalse(self.prescripcion.historial_cambios.exists())
+
+
+class SecuenciaPrescripcionTest(TestCase):
+    """
+    Pruebas para el asignador de números de prescripción
+    """
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.profesional = User.objects.create_user(username='optometra1')
+        self.paciente = Paciente.objects.create(
+            numero_documento='12345678',
+            nombres='Test',
+            apellidos='Paciente',
+            fecha_nacimiento=date(1980, 1, 1)
+        )
+        self.year = date.today().year
+    
+    def crear_prescripcion(self, **kwargs):
+        return Prescripcion.objects.create(
+            paciente=self.paciente,
+            profesional=self.profesional,
+            fecha_examen=date.today(),
+            od_esfera=Decimal('-2.00'),
+            os_esfera=Decimal('-2.00'),
+            **kwargs
+        )
+    
+    def test_numeros_consecutivos(self):
+        """Las prescripciones reciben números consecutivos del año actual"""
+        prescripcion1 = self.crear_prescripcion()
+        prescripcion2 = self.crear_prescripcion()
+        
+        self.assertEqual(prescripcion1.numero_prescripcion, f'PRES-{self.year}-0001')
+        self.assertEqual(prescripcion2.numero_prescripcion, f'PRES-{self.year}-0002')
+        self.assertEqual(
+            SecuenciaPrescripcion.objects.get(anio=self.year).ultimo_numero, 2
+        )
+    
+    def test_reservar_bloque(self):
+        """Reservar un bloque entrega un rango contiguo sin solaparse"""
+        bloque = SecuenciaPrescripcion.reservar(self.year, cantidad=50)
+        self.assertEqual(bloque, range(1, 51))
+        
+        prescripcion = self.crear_prescripcion()
+        self.assertEqual(prescripcion.numero_prescripcion, f'PRES-{self.year}-0051')
+    
+    def test_reservar_cantidad_invalida(self):
+        """No se pueden reservar bloques vacíos"""
+        with self.assertRaises(ValueError):
+            SecuenciaPrescripcion.reservar(self.year, cantidad=0)
+    
+    def test_contador_parte_de_numeros_existentes(self):
+        """El contador nuevo continúa después del mayor número ya registrado"""
+        self.crear_prescripcion(numero_prescripcion=f'PRES-{self.year}-9999')
+        self.crear_prescripcion(numero_prescripcion=f'PRES-{self.year}-10000')
+        
+        prescripcion = self.crear_prescripcion()
+        self.assertEqual(prescripcion.numero_prescripcion, f'PRES-{self.year}-10001')
+    
+    def test_asignacion_no_consulta_prescripciones(self):
+        """Con el contador creado, asignar un número no escanea la tabla"""
+        SecuenciaPrescripcion.reservar(self.year)
+        
+        with self.assertNumQueries(2):
+            SecuenciaPrescripcion.reservar(self.year)
+
+
+class SecuenciaPrescripcionConcurrenciaTest(TransactionTestCase):
+    """
+    Pruebas de concurrencia del asignador (requiere bloqueo por fila)
+    """
+    
+    def test_sin_duplicados_con_escritores_concurrentes(self):
+        """100 escritores concurrentes nunca reciben el mismo número"""
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('SQLite en memoria (cache compartida) no admite escrituras concurrentes')
+        
+        year = date.today().year
+        SecuenciaPrescripcion.reservar(year)
+        
+        def reservar(_):
+            try:
+                return SecuenciaPrescripcion.reservar(year).start
+            finally:
+                connection.close()
+        
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            numeros = list(executor.map(reservar, range(100)))
+        
+        self.assertEqual(len(set(numeros)), 100)
+        self.assertEqual(sorted(numeros), list(range(2, 102)))
+
+
+class HistorialPacienteApiTest(PresupuestoConsultasMixin, APITestCase):
+    """
+    Pruebas del endpoint de historial de prescripciones de un paciente
+    """
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.profesional = User.objects.create_user(
+            username='optometra1',
+            first_name='Dr. Juan',
+            last_name='Pérez'
+        )
+        self.client.force_authenticate(user=self.profesional)
+        
+        self.paciente = Paciente.objects.create(
+            numero_documento='12345678',
+            nombres='Test',
+            apellidos='Paciente',
+            fecha_nacimiento=date(1980, 1, 1)
+        )
+        self.url = f'/api/prescripciones/paciente/{self.paciente.id}/'
+    
+    def crear_historial(self, cantidad, desde=0):
+        for i in range(desde, desde + cantidad):
+            Prescripcion.objects.create(
+                paciente=self.paciente,
+                profesional=self.profesional,
+                fecha_examen=date(2010, 1, 1) + timedelta(days=i * 180),
+                od_esfera=Decimal('-1.00') - Decimal('0.25') * i,
+                os_esfera=Decimal('-1.00'),
+                vigente=False
+            )
+    
+    def test_diferencia_anterior_en_historial(self):
+        """Cada fila del historial trae la diferencia con la anterior"""
+        self.crear_historial(3)
+        
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, 200)
+        historial = response.data['historial']
+        self.assertEqual(len(historial), 3)
+        # Ordenado de más reciente a más antigua; la más antigua no tiene anterior
+        self.assertIsNone(historial[-1]['diferencia_anterior'])
+        self.assertEqual(historial[0]['diferencia_anterior']['max_diferencia_dioptricas'], 0.25)
+        self.assertEqual(historial[0]['diferencia_anterior']['meses_desde_anterior'], 6)
+    
+    def test_anotacion_coincide_con_calculo_por_instancia(self):
+        """El cálculo con LAG coincide con el método por instancia"""
+        self.crear_historial(5)
+        
+        for anotada in Prescripcion.objects.filter(paciente=self.paciente).con_diferencia_anterior():
+            sin_anotar = Prescripcion.objects.get(id=anotada.id)
+            self.assertEqual(
+                anotada.calcular_diferencia_con_anterior(),
+                sin_anotar.calcular_diferencia_con_anterior()
+            )
+    
+    def test_numero_de_consultas_constante(self):
+        """El historial usa el mismo número de consultas sin importar su tamaño"""
+        self.crear_historial(3)
+        Prescripcion.objects.filter(
+            id=Prescripcion.objects.filter(paciente=self.paciente).latest('fecha_examen').id
+        ).update(vigente=True)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        
+        self.crear_historial(30, desde=3)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['total_prescripciones'], 33)
+    
+    def test_listado_sin_consultas_por_fila(self):
+        self.crear_historial(12)
+        with self.assertPresupuestoConsultas(3):
+            response = self.client.get('/api/prescripciones/')
+        self.assertEqual(response.data['count'], 12)
+
+
+class EstadisticasApiTest(APITestCase):
+    """
+    Pruebas del endpoint de estadísticas de prescripciones
+    """
+    
+    url = '/api/prescripciones/estadisticas/'
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.profesional1 = User.objects.create_user(
+            username='optometra1', first_name='Juan', last_name='Pérez'
+        )
+        self.profesional2 = User.objects.create_user(
+            username='optometra2', first_name='Ana', last_name='Gómez'
+        )
+        self.client.force_authenticate(user=self.profesional1)
+        
+        self.paciente = Paciente.objects.create(
+            numero_documento='12345678',
+            nombres='Test',
+            apellidos='Paciente',
+            fecha_nacimiento=date(1960, 1, 1)
+        )
+        
+        base = {
+            'paciente': self.paciente,
+            'od_esfera': Decimal('-2.00'),
+            'os_esfera': Decimal('-2.00'),
+        }
+        # Vigente reciente con astigmatismo y presbicia
+        Prescripcion.objects.create(
+            profesional=self.profesional1, fecha_examen=date.today(),
+            od_cilindro=Decimal('-1.00'), od_eje=90, adicion=Decimal('2.00'), **base
+        )
+        # Vigente próxima a vencer (de otro paciente: una vigente por paciente)
+        otro_paciente = Paciente.objects.create(
+            numero_documento='87654321',
+            nombres='Otro',
+            apellidos='Paciente',
+            fecha_nacimiento=date(1990, 1, 1)
+        )
+        Prescripcion.objects.create(
+            profesional=self.profesional1, fecha_examen=date.today() - timedelta(days=700),
+            **{**base, 'paciente': otro_paciente}
+        )
+        # No vigente de otro profesional
+        Prescripcion.objects.create(
+            profesional=self.profesional2, fecha_examen=date.today() - timedelta(days=30),
+            vigente=False, **base
+        )
+    
+    def test_contadores(self):
+        """Los contadores coinciden con los datos"""
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['resumen']['total_prescripciones'], 3)
+        self.assertEqual(response.data['resumen']['vigentes'], 2)
+        self.assertEqual(response.data['resumen']['por_vencer_90_dias'], 1)
+        self.assertEqual(response.data['caracteristicas']['con_astigmatismo'], 1)
+        self.assertEqual(response.data['caracteristicas']['con_presbicia'], 1)
+        self.assertEqual(response.data['por_profesional'][0]['total'], 2)
+    
+    def test_una_consulta_para_contadores(self):
+        """Contadores y top de profesionales se resuelven en dos consultas sobre el rollup"""
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+    
+    def test_filtro_por_profesional(self):
+        """El parámetro profesional limita todas las cifras"""
+        response = self.client.get(self.url, {'profesional': self.profesional2.id})
+        
+        self.assertEqual(response.data['resumen']['total_prescripciones'], 1)
+        self.assertEqual(response.data['resumen']['vigentes'], 0)
+        self.assertEqual(len(response.data['por_profesional']), 1)
+    
+    def test_profesional_invalido(self):
+        for profesional in ('abc', '²', '1.5'):
+            response = self.client.get(self.url, {'profesional': profesional})
+            self.assertEqual(response.status_code, 400)
+    
+    def test_filtro_por_fechas(self):
+        """Los parámetros de fecha limitan por fecha de examen"""
+        desde = (date.today() - timedelta(days=60)).isoformat()
+        response = self.client.get(self.url, {'fecha_desde': desde})
+        
+        self.assertEqual(response.data['resumen']['total_prescripciones'], 2)
+        self.assertEqual(response.data['resumen']['por_vencer_90_dias'], 0)
+    
+    def test_tendencia_con_rango(self):
+        """Con rango de fechas se incluye la serie diaria"""
+        desde = (date.today() - timedelta(days=60)).isoformat()
+        response = self.client.get(self.url, {'fecha_desde': desde})
+        
+        self.assertEqual(len(response.data['tendencia']), 2)
+        self.assertEqual(response.data['tendencia'][-1]['fecha'], date.today())
+        self.assertNotIn('tendencia', self.client.get(self.url).data)
+    
+    def test_fecha_invalida(self):
+        """Una fecha mal formada retorna 400"""
+        response = self.client.get(self.url, {'fecha_hasta': '18-10-2026'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheVigenciaApiTest(APITestCase):
+    """
+    Pruebas de la caché de vigentes y por_vencer
+    """
+    
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        self.profesional = User.objects.create_user(username='optometra1')
+        self.client.force_authenticate(user=self.profesional)
+        self.paciente = Paciente.objects.create(
+            numero_documento='12345678',
+            nombres='Test',
+            apellidos='Paciente',
+            fecha_nacimiento=date(1980, 1, 1)
+        )
+        self.antigua = Prescripcion.objects.create(
+            paciente=self.paciente,
+            profesional=self.profesional,
+            fecha_examen=date.today() - timedelta(days=1200),
+            od_esfera=Decimal('-1.00'),
+            os_esfera=Decimal('-1.00'),
+            vigente=False
+        )
+    
+    def test_nueva_prescripcion_invalida(self):
+        self.assertEqual(len(self.client.get('/api/prescripciones/vigentes/').data), 0)
+        with self.assertNumQueries(0):
+            self.client.get('/api/prescripciones/vigentes/')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Prescripcion.objects.create(
+                paciente=self.paciente,
+                profesional=self.profesional,
+                fecha_examen=date.today(),
+                od_esfera=Decimal('-1.25'),
+                os_esfera=Decimal('-1.25')
+            )
+        self.assertEqual(len(self.client.get('/api/prescripciones/vigentes/').data), 1)
+    
+    def test_cambio_de_nombre_invalida(self):
+        Prescripcion.objects.create(
+            paciente=self.paciente,
+            profesional=self.profesional,
+            fecha_examen=date.today(),
+            od_esfera=Decimal('-1.25'),
+            os_esfera=Decimal('-1.25')
+        )
+        self.assertEqual(
+            self.client.get('/api/prescripciones/vigentes/').data[0]['paciente_nombre'], 'Test Paciente'
+        )
+        
+        # Un campo que los listados no muestran no invalida
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paciente.telefono = '3001234567'
+            self.paciente.save()
+        with self.assertNumQueries(0):
+            self.client.get('/api/prescripciones/vigentes/')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paciente.nombres = 'Nuevo'
+            self.paciente.save()
+        self.assertEqual(
+            self.client.get('/api/prescripciones/vigentes/').data[0]['paciente_nombre'], 'Nuevo Paciente'
+        )
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profesional.first_name = 'Ana'
+            self.profesional.last_name = 'Díaz'
+            self.profesional.save()
+        self.assertEqual(
+            self.client.get('/api/prescripciones/vigentes/').data[0]['profesional_nombre'], 'Ana Díaz'
+        )
+    
+    def test_cambio_fuera_de_los_listados_no_invalida(self):
+        self.client.get('/api/prescripciones/vigentes/')
+        self.client.get('/api/prescripciones/por_vencer/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.antigua.observaciones = 'Revisada'
+            self.antigua.save()
+        
+        with self.assertNumQueries(0):
+            self.client.get('/api/prescripciones/vigentes/')
+            self.client.get('/api/prescripciones/por_vencer/')
+
+
+class UnaVigentePorPacienteTest(APITestCase):
+    """
+    Pruebas de la restricción de una sola prescripción vigente por paciente
+    """
+    url = '/api/prescripciones/'
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.profesional = User.objects.create_user(username='optometra1')
+        self.client.force_authenticate(user=self.profesional)
+        self.paciente = Paciente.objects.create(
+            numero_documento='12345678',
+            nombres='Test',
+            apellidos='Paciente',
+            fecha_nacimiento=date(1980, 1, 1)
+        )
+        self.anterior = Prescripcion.objects.create(
+            paciente=self.paciente,
+            profesional=self.profesional,
+            fecha_examen=date.today() - timedelta(days=200),
+            od_esfera=Decimal('-1.00'),
+            os_esfera=Decimal('-1.00')
+        )
+        self.datos = {
+            'paciente': self.paciente.id,
+            'fecha_examen': date.today().isoformat(),
+            'od_esfera': '-1.50',
+            'os_esfera': '-1.25',
+        }
+    
+    def test_restriccion_en_la_base_de_datos(self):
+        otra = Prescripcion.objects.create(
+            paciente=self.paciente,
+            profesional=self.profesional,
+            fecha_examen=date.today() - timedelta(days=100),
+            od_esfera=Decimal('-1.00'),
+            os_esfera=Decimal('-1.00'),
+            vigente=False
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Prescripcion.objects.filter(id=otra.id).update(vigente=True)
+    
+    def test_crear_reemplaza_la_vigente(self):
+        response = self.client.post(self.url, self.datos)
+        
+        self.assertEqual(response.status_code, 201)
+        self.anterior.refresh_from_db()
+        self.assertFalse(self.anterior.vigente)
+        self.assertEqual(
+            list(Prescripcion.objects.filter(paciente=self.paciente, vigente=True).values_list('fecha_examen', flat=True)),
+            [date.today()]
+        )
+    
+    def test_invalidacion_se_revierte_si_falla_el_insert(self):
+        with mock.patch.object(models.Model, 'save', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                Prescripcion.objects.create(
+                    paciente=self.paciente,
+                    profesional=self.profesional,
+                    numero_prescripcion='PRES-2000-0001',
+                    fecha_examen=date.today(),
+                    od_esfera=Decimal('-1.50'),
+                    os_esfera=Decimal('-1.50')
+                )
+        
+        self.anterior.refresh_from_db()
+        self.assertTrue(self.anterior.vigente)
+    
+    def test_alta_simultanea_responde_400(self):
+        # Simula otra alta del mismo paciente que ganó la carrera
+        with mock.patch.object(Prescripcion, 'invalidar_prescripciones_anteriores'):
+            response = self.client.post(self.url, self.datos)
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('paciente', response.data)
+        self.assertEqual(Prescripcion.objects.filter(paciente=self.paciente).count(), 1)
+    
+    def test_reactivacion_simultanea_responde_400(self):
+        otra = Prescripcion.objects.create(
+            paciente=self.paciente,
+            profesional=self.profesional,
+            fecha_examen=date.today() - timedelta(days=100),
+            od_esfera=Decimal('-1.00'),
+            os_esfera=Decimal('-1.00'),
+            vigente=False
+        )
+        # Simula otra reactivación del mismo paciente que ganó la carrera
+        with mock.patch.object(Prescripcion, 'invalidar_prescripciones_anteriores'):
+            response = self.client.patch(f'{self.url}{otra.id}/', {'vigente': True})
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('vigente', response.data)
+        otra.refresh_from_db()
+        self.assertFalse(otra.vigente)
+        self.assertFalse(otra.historial_cambios.exists())
+    
+    def test_historial_prescripcion_actual(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/prescripciones/paciente/{self.paciente.id}/')
+        
+        actual = response.data['prescripcion_actual']
+        self.assertEqual(actual['id'], self.anterior.id)
+        self.assertEqual(actual['paciente_nombre'], self.paciente.nombre_completo)
+
+
+class ExportarPrescripcionesApiTest(APITestCase):
+    """
+    Pruebas de /api/prescripciones/exportar/
+    """
+    url = '/api/prescripciones/exportar/'
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.profesional = User.objects.create_user(
+            username='optometra1', first_name='Ana', last_name='Díaz'
+        )
+        self.client.force_authenticate(user=self.profesional)
+        self.paciente = Paciente.objects.create(
+            numero_documento='12345678',
+            nombres='Test',
+            apellidos='Paciente',
+            fecha_nacimiento=date(1980, 1, 1)
+        )
+        for i in range(3):
+            Prescripcion.objects.create(
+                paciente=self.paciente,
+                profesional=self.profesional,
+                fecha_examen=date(2024, 1, 1) + timedelta(days=30 * i),
+                od_esfera=Decimal('-1.25'),
+                os_esfera=Decimal('-1.00'),
+                od_cilindro=Decimal('-0.50') if i == 0 else Decimal('0.00'),
+                od_eje=90 if i == 0 else 0,
+                vigente=False
+            )
+    
+    def test_exportar_csv_con_filtros(self):
+        response = self.client.get(self.url, {'astigmatismo': 'true'})
+        lineas = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lineas), 2)
+        self.assertIn('2024-01-01,12345678,Test Paciente,Ana Díaz,-1.25,-0.50,90', lineas[1])
+    
+    def test_exportar_xlsx(self):
+        response = self.client.get(self.url, {'formato': 'xlsx'})
+        self.assertEqual(
+            response['Content-Type'],
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        libro = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        filas = list(libro.active.iter_rows(values_only=True))
+        self.assertEqual(filas[0][0], 'Número')
+        # Orden del listado: examen más reciente primero
+        self.assertEqual(len(filas), 4)
+        self.assertEqual(filas[1][1].date(), date(2024, 3, 1))
+        self.assertEqual(filas[1][5], -1.25)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PdfPrescripcionTest(APITestCase):
+    """
+    Pruebas del PDF imprimible de prescripciones
+    """
+    
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        self.profesional = User.objects.create_user(
+            username='optometra1', first_name='Ana', last_name='Díaz'
+        )
+        self.client.force_authenticate(user=self.profesional)
+        self.paciente = Paciente.objects.create(
+            numero_documento='12345678',
+            nombres='Test',
+            apellidos='Paciente',
+            fecha_nacimiento=date(1980, 1, 1)
+        )
+        self.prescripciones = [
+            Prescripcion.objects.create(
+                paciente=self.paciente,
+                profesional=self.profesional,
+                fecha_examen=date(2026, 10, 17),
+                od_esfera=Decimal('-1.25'),
+                os_esfera=Decimal('-1.00'),
+                od_cilindro=Decimal('-0.50'),
+                od_eje=90,
+                adicion=Decimal('1.50'),
+                observaciones='Uso permanente. ' * 20,
+                vigente=False
+            )
+            for _ in range(3)
+        ]
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+    
+    def contar_renderizados(self):
+        return mock.patch.object(pdf, 'renderizar_pdf', wraps=pdf.renderizar_pdf)
+    
+    def test_pdf_de_una_prescripcion(self):
+        prescripcion = self.prescripciones[0]
+        response = self.client.get(f'/api/prescripciones/{prescripcion.id}/pdf/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertIn(prescripcion.numero_prescripcion, response['Content-Disposition'])
+    
+    def test_pdf_se_reutiliza_hasta_que_cambia(self):
+        prescripcion = self.prescripciones[0]
+        url = f'/api/prescripciones/{prescripcion.id}/pdf/'
+        with self.contar_renderizados() as renderizar:
+            self.client.get(url)
+            self.client.get(url)
+            self.assertEqual(renderizar.call_count, 1)
+            
+            prescripcion.observaciones = 'Control en seis meses'
+            prescripcion.save()
+            self.client.get(url)
+            self.assertEqual(renderizar.call_count, 2)
+    
+    def test_pdf_se_renueva_si_cambia_el_profesional(self):
+        prescripcion = self.prescripciones[0]
+        url = f'/api/prescripciones/{prescripcion.id}/pdf/'
+        with self.contar_renderizados() as renderizar:
+            self.client.get(url)
+            
+            profesional = prescripcion.profesional
+            profesional.last_name = 'Díaz Roldán'
+            profesional.save()
+            self.client.get(url)
+            self.assertEqual(renderizar.call_count, 2)
+            self.assertIn('Díaz Roldán', renderizar.call_args.args[0]['profesional'])
+    
+    def test_pdf_lote_zip(self):
+        ids = [p.id for p in self.prescripciones]
+        response = self.client.post('/api/prescripciones/pdf_lote/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(BytesIO(response.content)) as zip_pdfs:
+            nombres = sorted(zip_pdfs.namelist())
+            self.assertEqual(nombres, sorted(f'{p.numero_prescripcion}.pdf' for p in self.prescripciones))
+            self.assertTrue(zip_pdfs.read(nombres[0]).startswith(b'%PDF'))
+    
+    def test_pdf_lote_invalido(self):
+        url = '/api/prescripciones/pdf_lote/'
+        self.assertEqual(self.client.post(url, {'ids': 'uno'}, format='json').status_code, 400)
+        response = self.client.post(url, {'ids': [self.prescripciones[0].id, 999]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['ids'], [999])
+    
+    def test_pdf_lote_grande_en_segundo_plano(self):
+        ids = [p.id for p in reversed(self.prescripciones)]
+        with override_settings(MEDIA_ROOT=self.media), \
+                mock.patch.object(PrescripcionViewSet, 'MAXIMO_PDF_LOTE_SINCRONO', 2):
+            with self.contar_renderizados() as renderizar:
+                with self.captureOnCommitCallbacks() as callbacks:
+                    response = self.client.post('/api/prescripciones/pdf_lote/', {'ids': ids}, format='json')
+                # Nada se dibuja dentro de la petición
+                self.assertEqual(renderizar.call_count, 0)
+                self.assertEqual(response.status_code, 202)
+                self.assertEqual(response.data['estado'], LotePdf.PENDIENTE)
+                for callback in callbacks:
+                    callback()
+                self.assertEqual(renderizar.call_count, 3)
+            
+            estado = self.client.get(response.data['url']).data
+            self.assertEqual(estado['estado'], LotePdf.COMPLETADO)
+            descarga = self.client.get(estado['descarga'])
+            self.assertEqual(descarga.status_code, 200)
+            with zipfile.ZipFile(BytesIO(b''.join(descarga.streaming_content))) as zip_pdfs:
+                # En el orden solicitado
+                self.assertEqual(
+                    zip_pdfs.namelist(),
+                    [f'{p.numero_prescripcion}.pdf' for p in reversed(self.prescripciones)]
+                )
+            
+            # Solo quien lo pidió (o el staff) ve el lote
+            self.client.force_authenticate(user=User.objects.create_user(username='otro'))
+            self.assertEqual(self.client.get(response.data['url']).status_code, 404)
+            self.assertEqual(self.client.get(estado['descarga']).status_code, 404)
+    
+    def test_limpiar_lotes_pdf(self):
+        with override_settings(MEDIA_ROOT=self.media):
+            lote = LotePdf.objects.create(prescripciones=[self.prescripciones[0].id], usuario=self.profesional)
+            generar_pdf_lote(lote.pk)
+            LotePdf.objects.filter(pk=lote.pk).update(fecha_creacion=timezone.now() - timedelta(days=2))
+            reciente = LotePdf.objects.create(prescripciones=[], usuario=self.profesional)
+            
+            self.assertEqual(limpiar_lotes_pdf(), 1)
+            self.assertEqual(list(LotePdf.objects.values_list('id', flat=True)), [reciente.id])
+            self.assertEqual(os.listdir(os.path.join(self.media, 'pdf_lotes')), [])
+    
+    def test_lote_en_pool_de_procesos(self):
+        prescripciones = Prescripcion.objects.select_related('paciente', 'profesional')
+        contexto = multiprocessing.get_context('spawn')
+        with mock.patch.object(pdf, 'MINIMO_PARA_PROCESOS', 2), \
+                ProcessPoolExecutor(max_workers=2, mp_context=contexto) as pool:
+            pdfs = pdf.pdfs_prescripciones(prescripciones, pool=pool)
+        self.assertEqual(set(pdfs), {p.id for p in self.prescripciones})
+        self.assertTrue(all(contenido.startswith(b'%PDF') for contenido in pdfs.values()))
+    
+    def test_comando_genera_pdfs_del_dia(self):
+        with tempfile.TemporaryDirectory() as destino:
+            call_command(
+                'generar_pdfs_prescripciones', fecha='2026-10-17', destino=destino,
+                procesos=1, stdout=StringIO()
+            )
+            self.assertEqual(len(os.listdir(destino)), 3)
+
+
+class VencerPrescripcionesTaskTest(TestCase):
+    """
+    Pruebas de la tarea periódica de vencimiento (Celery en modo eager)
+    """
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.profesional = User.objects.create_user(username='optometra1')
+        self.hoy = date.today()
+    
+    def crear(self, dias_atras, email='', documento=None):
+        paciente = Paciente.objects.create(
+            numero_documento=documento or f'9{Paciente.objects.count():07d}',
+            nombres='Test',
+            apellidos='Paciente',
+            fecha_nacimiento=date(1980, 1, 1),
+            email=email
+        )
+        return Prescripcion.objects.create(
+            paciente=paciente,
+            profesional=self.profesional,
+            fecha_examen=self.hoy - timedelta(days=dias_atras),
+            od_esfera=Decimal('-1.00'),
+            os_esfera=Decimal('-1.00')
+        )
+    
+    def test_fecha_vencimiento_al_guardar(self):
+        prescripcion = self.crear(10)
+        self.assertEqual(prescripcion.fecha_vencimiento, prescripcion.fecha_examen + timedelta(days=730))
+    
+    def test_vence_por_lotes_y_actualiza_estadisticas(self):
+        vencidas = [self.crear(731 + i) for i in range(5)]
+        vigente = self.crear(100)
+        
+        resultado = vencer_prescripciones.delay(tamano_lote=2).get()
+        
+        self.assertEqual(resultado['vencidas'], 5)
+        self.assertFalse(Prescripcion.objects.filter(id__in=[p.id for p in vencidas], vigente=True).exists())
+        vigente.refresh_from_db()
+        self.assertTrue(vigente.vigente)
+        estadistica = EstadisticaDiariaPrescripcion.objects.get(fecha=vencidas[0].fecha_examen)
+        self.assertEqual(estadistica.vigentes, 0)
+    
+    def test_completa_fechas_faltantes(self):
+        prescripcion = self.crear(10)
+        Prescripcion.objects.update(fecha_vencimiento=None)
+        
+        resultado = vencer_prescripciones.delay().get()
+        
+        self.assertEqual(resultado['fechas_calculadas'], 1)
+        prescripcion.refresh_from_db()
+        self.assertEqual(prescripcion.fecha_vencimiento, prescripcion.fecha_examen + timedelta(days=730))
+    
+    def test_recordatorio_una_sola_vez(self):
+        self.crear(700, email='paciente@correo.com')
+        self.crear(700)
+        self.crear(100, email='otro@correo.com')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = vencer_prescripciones.delay().get()
+        self.assertEqual(resultado['recordatorios'], 2)
+        # Solo el paciente con email recibe el aviso
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['paciente@correo.com'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = vencer_prescripciones.delay().get()
+        self.assertEqual(resultado['recordatorios'], 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class PorVencerApiTest(APITestCase):
+    """
+    Pruebas de vigentes / por_vencer sobre fecha_vencimiento guardada
+    """
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.profesional = User.objects.create_user(username='optometra1')
+        self.client.force_authenticate(user=self.profesional)
+        self.hoy = date.today()
+        for i, dias_atras in enumerate([10, 650, 710, 800]):
+            paciente = Paciente.objects.create(
+                numero_documento=f'8000000{i}',
+                nombres='Test',
+                apellidos='Paciente',
+                fecha_nacimiento=date(1980, 1, 1)
+            )
+            Prescripcion.objects.create(
+                paciente=paciente,
+                profesional=self.profesional,
+                fecha_examen=self.hoy - timedelta(days=dias_atras),
+                od_esfera=Decimal('-1.00'),
+                os_esfera=Decimal('-1.00')
+            )
+    
+    def test_vigentes_excluye_vencidas(self):
+        response = self.client.get('/api/prescripciones/vigentes/')
+        self.assertEqual(len(response.data), 3)
+        self.assertTrue(all(p['es_vigente'] for p in response.data))
+    
+    def test_por_vencer_horizonte(self):
+        response = self.client.get('/api/prescripciones/por_vencer/')
+        self.assertEqual(response.data['total'], 2)
+        # Las más próximas a vencer primero
+        self.assertEqual(
+            [p['dias_hasta_vencimiento'] for p in response.data['prescripciones']], [20, 80]
+        )
+        
+        response = self.client.get('/api/prescripciones/por_vencer/', {'dias': 30})
+        self.assertEqual(response.data['total'], 1)
+    
+    def test_por_vencer_dias_invalido(self):
+        for dias in ('0', 'abc', '731', '²'):
+            response = self.client.get('/api/prescripciones/por_vencer/', {'dias': dias})
+            self.assertEqual(response.status_code, 400)
+    
+    def test_usa_indice_parcial_de_vencimiento(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan de consulta específico de SQLite')
+        consulta = Prescripcion.objects.filter(
+            vigente=True,
+            fecha_vencimiento__gte=self.hoy,
+            fecha_vencimiento__lte=self.hoy + timedelta(days=90)
+        ).order_by('fecha_vencimiento', 'id')
+        plan = consulta.explain()
+        self.assertIn('prescripcion_vence_vig_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ImportarPrescripcionesTest(APITestCase):
+    """
+    Pruebas de la importación masiva de prescripciones (API y comando)
+    """
+    url = '/api/prescripciones/importar/'
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.profesional = User.objects.create_user(username='optometra1')
+        self.client.force_authenticate(user=self.profesional)
+        self.hoy = date.today()
+        self.ana = Paciente.objects.create(
+            numero_documento='60000001', nombres='Ana', apellidos='Ruiz',
+            fecha_nacimiento=date(1970, 1, 1)
+        )
+        self.beto = Paciente.objects.create(
+            numero_documento='60000002', nombres='Beto', apellidos='Paz',
+            fecha_nacimiento=date(1985, 1, 1)
+        )
+        self.actual_ana = Prescripcion.objects.create(
+            paciente=self.ana, profesional=self.profesional,
+            fecha_examen=self.hoy - timedelta(days=100),
+            od_esfera=Decimal('-1.00'), os_esfera=Decimal('-1.00')
+        )
+    
+    def fila(self, documento, dias_atras, **datos):
+        return {
+            'documento_paciente': documento,
+            'fecha_examen': (self.hoy - timedelta(days=dias_atras)).isoformat(),
+            'od_esfera': '-1.25', 'os_esfera': '-1.50', **datos
+        }
+    
+    def test_importar_csv(self):
+        filas = [
+            # Más antigua que la actual de Ana: no le quita la vigencia
+            self.fila('60000001', 400),
+            self.fila('60000002', 800),
+            self.fila('60000002', 30, od_cilindro='-0.75', od_eje='90'),
+            self.fila('99999999', 30),
+            self.fila('60000002', -5),
+        ]
+        encabezados = list(filas[2])
+        contenido = '\n'.join(
+            [','.join(encabezados)] + [','.join(f.get(c, '') for c in encabezados) for f in filas]
+        ).encode('utf-8')
+        
+        response = self.client.post(
+            self.url, {'archivo': SimpleUploadedFile('examenes.csv', contenido)}, format='multipart'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['creados'], 3)
+        self.assertEqual([e['fila'] for e in response.data['errores']], [5, 6])
+        self.assertIn('documento_paciente', response.data['errores'][0]['errores'])
+        self.assertIn('fecha_examen', response.data['errores'][1]['errores'])
+        
+        # Solo la más reciente de cada paciente queda vigente
+        vigentes = Prescripcion.objects.filter(vigente=True)
+        self.assertEqual(
+            sorted(vigentes.values_list('paciente_id', 'fecha_examen')),
+            sorted([(self.ana.id, self.actual_ana.fecha_examen), (self.beto.id, self.hoy - timedelta(days=30))])
+        )
+        importadas = Prescripcion.objects.exclude(id=self.actual_ana.id)
+        self.assertTrue(all(p.profesional_id == self.profesional.id for p in importadas))
+        self.assertTrue(all(
+            p.fecha_vencimiento == p.fecha_examen + timedelta(days=730) for p in importadas
+        ))
+        # Estadística diaria del día importado
+        estadistica = EstadisticaDiariaPrescripcion.objects.get(fecha=self.hoy - timedelta(days=30))
+        self.assertEqual((estadistica.total, estadistica.vigentes, estadistica.con_astigmatismo), (1, 1, 1))
+    
+    def test_numeros_reservados_en_bloque(self):
+        filas = [(i, self.fila('60000002', 200 + i)) for i in range(1, 26)]
+        with mock.patch.object(
+            SecuenciaPrescripcion, 'reservar', wraps=SecuenciaPrescripcion.reservar
+        ) as reservar:
+            resultado = importar_filas(filas, self.profesional, tamano_lote=10)
+        
+        self.assertEqual(resultado['creados'], 25)
+        # Una reserva por lote, no por fila
+        self.assertEqual(reservar.call_count, 3)
+        numeros = sorted(
+            int(n.rsplit('-', 1)[1])
+            for n in Prescripcion.objects.exclude(id=self.actual_ana.id).values_list('numero_prescripcion', flat=True)
+        )
+        self.assertEqual(numeros, list(range(numeros[0], numeros[0] + 25)))
+        # La más reciente importada de Beto es la única vigente
+        self.assertEqual(
+            list(Prescripcion.objects.filter(paciente=self.beto, vigente=True).values_list('fecha_examen', flat=True)),
+            [self.hoy - timedelta(days=201)]
+        )
+    
+    def test_importacion_reemplaza_vigente_anterior(self):
+        importar_filas([(1, self.fila('60000001', 5))], self.profesional)
+        
+        self.actual_ana.refresh_from_db()
+        self.assertFalse(self.actual_ana.vigente)
+        self.assertEqual(Prescripcion.objects.filter(paciente=self.ana, vigente=True).count(), 1)
+    
+    def test_comando(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as archivo:
+            archivo.write('Documento Paciente,Fecha Examen,OD Esfera,OI Esfera\n')
+            archivo.write(f'60000002,{self.hoy - timedelta(days=60)},-2.00,-2.25\n')
+        self.addCleanup(os.remove, archivo.name)
+        
+        salida = StringIO()
+        call_command('importar_prescripciones', archivo.name, profesional='optometra1', stdout=salida)
+        
+        self.assertIn('Prescripciones importadas: 1 de 1', salida.getvalue())
+        prescripcion = Prescripcion.objects.get(paciente=self.beto)
+        self.assertEqual(prescripcion.os_esfera, Decimal('-2.25'))
@@ -1,16 +1,48 @@
-from rest_framework import viewsets, filters, status, permissions
+from rest_framework import viewsets, filters, serializers, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.http import FileResponse, Http404, HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
 from datetime import date, timedelta
-from .models import Prescripcion, HistorialCambios
+from io import BytesIO
+from .cache import GRUPO_VIGENCIA
+from .models import LotePdf, Prescripcion, HistorialCambios, DIAS_AVISO_VENCIMIENTO, DIAS_VIGENCIA
+from .pdf import pdf_prescripcion, zip_pdfs
 from .serializers import (
     PrescripcionSerializer, PrescripcionCreateSerializer, 
     PrescripcionListSerializer, PrescripcionPacienteHistorialSerializer,
     HistorialCambiosSerializer, PrescripcionComparacionSerializer
 )
+from .tasks import generar_pdf_lote
+from apps.core.cache import cachear_respuesta
+from apps.core.exportacion import FORMATOS, exportar
+from apps.core.views import responder_importacion
 from apps.pacientes.models import Paciente
+from apps.reportes.models import EstadisticaDiariaPrescripcion
+
+
+# Columnas de /api/prescripciones/exportar/: (encabezado, valor)
+COLUMNAS_EXPORTACION = [
+    ('Número', lambda p: p.numero_prescripcion),
+    ('Fecha Examen', lambda p: p.fecha_examen),
+    ('Documento Paciente', lambda p: p.paciente.numero_documento),
+    ('Paciente', lambda p: p.paciente.nombre_completo),
+    ('Profesional', lambda p: p.profesional.get_full_name() or p.profesional.username),
+    ('OD Esfera', lambda p: p.od_esfera),
+    ('OD Cilindro', lambda p: p.od_cilindro),
+    ('OD Eje', lambda p: p.od_eje),
+    ('OI Esfera', lambda p: p.os_esfera),
+    ('OI Cilindro', lambda p: p.os_cilindro),
+    ('OI Eje', lambda p: p.os_eje),
+    ('Adición', lambda p: p.adicion),
+    ('Distancia Pupilar', lambda p: p.distancia_pupilar),
+    ('Tipo de Lente', lambda p: p.tipo_lente_recomendado),
+    ('Vigente', lambda p: p.vigente),
+]
 
 
 class PrescripcionViewSet(viewsets.ModelViewSet):
@@ -46,8 +78,7 @@ class PrescripcionViewSet(viewsets.ModelViewSet):
         vigentes_solo = self.request.query_params.get('vigentes_solo', None)
         if vigentes_solo and vigentes_solo.lower() == 'true':
             # Filtrar por vigencia real (no solo el campo booleano)
-            fecha_limite = date.today() - timedelta(days=730)  # 2 años atrás
-            queryset = queryset.filter(vigente=True, fecha_examen__gte=fecha_limite)
+            queryset = queryset.filter(vigente=True, fecha_vencimiento__gte=date.today())
         
         # Filtro por rango de fechas
         fecha_desde = self.request.query_params.get('fecha_desde', None)
@@ -80,64 +111,72 @@ class PrescripcionViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Configuraciones adicionales al crear prescripción"""
-        # Asignar el usuario actual como profesional
-        serializer.save(profesional=self.request.user)
-        
-        # Invalidar prescripciones anteriores del mismo paciente
-        prescripcion = serializer.instance
-        prescripcion.invalidar_prescripciones_anteriores()
+        # Asignar el usuario actual como profesional. Prescripcion.save()
+        # invalida la vigente anterior del paciente en la misma transacción
+        try:
+            with transaction.atomic():
+                serializer.save(profesional=self.request.user)
+        except IntegrityError:
+            # Otra prescripción vigente del paciente se creó al mismo tiempo
+            raise serializers.ValidationError({
+                'paciente': ['El paciente ya tiene una prescripción vigente en creación, intente de nuevo.']
+            })
     
     def perform_update(self, serializer):
         """Registrar cambios en el historial"""
-        # Obtener valores anteriores
-        prescripcion_anterior = Prescripcion.objects.get(id=serializer.instance.id)
+        # Valores anteriores de la instancia ya cargada por get_object(),
+        # antes de que el serializer le asigne los nuevos
+        anteriores = HistorialCambios.valores(serializer.instance)
         
-        # Guardar cambios
-        serializer.save()
-        
-        # Registrar en historial (solo campos principales)
-        campos_importantes = [
-            'od_esfera', 'od_cilindro', 'od_eje',
-            'os_esfera', 'os_cilindro', 'os_eje',
-            'adicion', 'distancia_pupilar'
-        ]
-        
-        for campo in campos_importantes:
-            valor_anterior = getattr(prescripcion_anterior, campo)
-            valor_nuevo = getattr(serializer.instance, campo)
-            
-            if valor_anterior != valor_nuevo:
-                HistorialCambios.objects.create(
-                    prescripcion=serializer.instance,
-                    campo_modificado=campo,
-                    valor_anterior=str(valor_anterior),
-                    valor_nuevo=str(valor_nuevo),
-                    usuario=self.request.user
-                )
+        # El UPDATE y el INSERT del historial en la misma transacción
+        try:
+            with transaction.atomic():
+                serializer.save()
+                HistorialCambios.registrar(serializer.instance, anteriores, self.request.user)
+        except IntegrityError:
+            # Otra prescripción del paciente pasó a vigente al mismo tiempo
+            raise serializers.ValidationError({
+                'vigente': ['El paciente ya tiene otra prescripción vigente, intente de nuevo.']
+            })
     
     @action(detail=False, methods=['get'])
+    @cachear_respuesta(GRUPO_VIGENCIA)
     def vigentes(self, request):
         """Obtener solo prescripciones vigentes"""
-        fecha_limite = date.today() - timedelta(days=730)
         prescripciones = Prescripcion.objects.filter(
             vigente=True,
-            fecha_examen__gte=fecha_limite
+            fecha_vencimiento__gte=date.today()
         ).select_related('paciente', 'profesional')
         
         serializer = PrescripcionListSerializer(prescripciones, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cachear_respuesta(GRUPO_VIGENCIA)
     def por_vencer(self, request):
-        """Prescripciones que vencen en los próximos 90 días"""
-        fecha_limite_inferior = date.today() - timedelta(days=640)  # Vencen en 90 días
-        fecha_limite_superior = date.today() - timedelta(days=730)  # Ya vencidas
+        """
+        Prescripciones que vencen en los próximos 90 días
+        
+        Parámetro opcional: dias (1-730) para otro horizonte.
+        """
+        try:
+            dias = int(request.query_params.get('dias', DIAS_AVISO_VENCIMIENTO))
+        except ValueError:
+            dias = 0
+        if not 1 <= dias <= DIAS_VIGENCIA:
+            return Response(
+                {'error': f'Parámetro "dias" inválido (1 a {DIAS_VIGENCIA})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
+        # Rango sobre el índice parcial de vencimiento (solo vigentes), que también da
+        # el orden: las más próximas a vencer primero
+        hoy = date.today()
         prescripciones = Prescripcion.objects.filter(
             vigente=True,
-            fecha_examen__gte=fecha_limite_superior,
-            fecha_examen__lte=fecha_limite_inferior
-        ).select_related('paciente', 'profesional')
+            fecha_vencimiento__gte=hoy,
+            fecha_vencimiento__lte=hoy + timedelta(days=dias)
+        ).select_related('paciente', 'profesional').order_by('fecha_vencimiento', 'id')
         
         serializer = PrescripcionListSerializer(prescripciones, many=True)
         return Response({
@@ -145,6 +184,132 @@ class PrescripcionViewSet(viewsets.ModelViewSet):
             'prescripciones': serializer.data
         })
     
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """
+        Exporta las prescripciones a CSV o XLSX (?formato=csv|xlsx)
+        
+        Acepta los mismos filtros, búsqueda y orden del listado; el archivo
+        se genera por streaming, sin cargar todas las filas en memoria.
+        """
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response(
+                {'error': 'Parámetro "formato" inválido (csv o xlsx)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        prescripciones = self.filter_queryset(self.get_queryset())
+        return exportar(prescripciones, COLUMNAS_EXPORTACION, 'prescripciones', formato)
+    
+    @action(detail=False, methods=['post'])
+    def importar(self, request):
+        """
+        Importación masiva de exámenes históricos desde CSV, XLSX o JSON
+        (campo "archivo"), con el usuario actual como profesional
+        
+        El paciente se indica con "documento_paciente"; el resto de columnas
+        son las del formulario de creación (o los encabezados de
+        /exportar/). Los números se asignan por bloques y queda vigente la
+        prescripción más reciente de cada paciente. Los archivos grandes se
+        procesan en segundo plano (202 con la URL de avance).
+        """
+        return responder_importacion(request, 'prescripciones')
+    
+    @action(detail=True, methods=['get'])
+    def pdf(self, request, pk=None):
+        """PDF imprimible de la prescripción"""
+        prescripcion = self.get_object()
+        response = HttpResponse(pdf_prescripcion(prescripcion), content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="{prescripcion.numero_prescripcion}.pdf"'
+        return response
+    
+    # Máximo de prescripciones por solicitud de pdf_lote, y hasta cuántas
+    # se dibujan dentro de la petición (las demás se encolan en Celery)
+    MAXIMO_PDF_LOTE = 500
+    MAXIMO_PDF_LOTE_SINCRONO = 10
+    
+    @action(detail=False, methods=['post'])
+    def pdf_lote(self, request):
+        """
+        PDF de varias prescripciones en un ZIP
+        
+        Body: {"ids": [1, 2, 3]}. Hasta MAXIMO_PDF_LOTE_SINCRONO se responde
+        el ZIP directamente; los lotes mayores se generan en segundo plano
+        (202 con la URL de avance). Para la impresión de fin de día, ver el
+        comando generar_pdfs_prescripciones.
+        """
+        ids = request.data.get('ids')
+        if (not isinstance(ids, list) or not ids
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+            return Response(
+                {'error': 'Se requiere "ids": una lista de ids de prescripción'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(ids) > self.MAXIMO_PDF_LOTE:
+            return Response(
+                {'error': f'Máximo {self.MAXIMO_PDF_LOTE} prescripciones por lote'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > self.MAXIMO_PDF_LOTE_SINCRONO:
+            encontrados = set(self.get_queryset().filter(id__in=ids).values_list('id', flat=True))
+        else:
+            prescripciones = list(self.get_queryset().filter(id__in=ids))
+            encontrados = {p.id for p in prescripciones}
+        faltantes = sorted(set(ids) - encontrados)
+        if faltantes:
+            return Response(
+                {'error': 'Prescripciones no encontradas', 'ids': faltantes},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if len(ids) > self.MAXIMO_PDF_LOTE_SINCRONO:
+            lote = LotePdf.objects.create(prescripciones=ids, usuario=request.user)
+            transaction.on_commit(lambda: generar_pdf_lote.delay(lote.pk))
+            return Response(
+                self.datos_lote_pdf(request, lote), status=status.HTTP_202_ACCEPTED
+            )
+        
+        archivo = BytesIO()
+        zip_pdfs(sorted(prescripciones, key=lambda p: ids.index(p.id)), archivo)
+        response = HttpResponse(archivo.getvalue(), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="prescripciones.zip"'
+        return response
+    
+    def lote_pdf(self, request, lote_id):
+        """Lote de PDF de quien lo pidió (o cualquiera, para el staff)"""
+        lotes = LotePdf.objects.all()
+        if not request.user.is_staff:
+            lotes = lotes.filter(usuario=request.user)
+        return get_object_or_404(lotes, pk=lote_id)
+    
+    def datos_lote_pdf(self, request, lote):
+        datos = {
+            'id': lote.pk,
+            'estado': lote.estado,
+            'total': len(lote.prescripciones),
+            'mensaje': lote.mensaje,
+            'url': request.build_absolute_uri(f'/api/prescripciones/pdf_lote/{lote.pk}/'),
+            'descarga': None,
+        }
+        if lote.estado == LotePdf.COMPLETADO:
+            datos['descarga'] = request.build_absolute_uri(f'/api/prescripciones/pdf_lote/{lote.pk}/zip/')
+        return datos
+    
+    @action(detail=False, methods=['get'], url_path=r'pdf_lote/(?P<lote_id>[0-9]+)')
+    def estado_pdf_lote(self, request, lote_id=None):
+        """Avance de un lote de PDF en segundo plano, con la URL del ZIP al terminar"""
+        return Response(self.datos_lote_pdf(request, self.lote_pdf(request, lote_id)))
+    
+    @action(detail=False, methods=['get'], url_path=r'pdf_lote/(?P<lote_id>[0-9]+)/zip')
+    def descargar_pdf_lote(self, request, lote_id=None):
+        """ZIP de un lote de PDF terminado"""
+        lote = self.lote_pdf(request, lote_id)
+        if lote.estado != LotePdf.COMPLETADO or not lote.archivo:
+            raise Http404
+        return FileResponse(lote.archivo.open('rb'), as_attachment=True, filename='prescripciones.zip')
+    
     @action(detail=False, methods=['get'], url_path='paciente/(?P<paciente_id>[^/.]+)')
     def historial_paciente(self, request, paciente_id=None):
         """Obtener historial completo de prescripciones de un paciente"""
@@ -160,7 +325,9 @@ class PrescripcionViewSet(viewsets.ModelViewSet):
             paciente=paciente
         ).select_related('profesional').order_by('-fecha_examen')
         
-        serializer = PrescripcionPacienteHistorialSerializer(prescripciones, many=True)
+        # Diferencias con la prescripción anterior calculadas en una sola consulta (LAG)
+        historial = list(prescripciones.con_diferencia_anterior())
+        serializer = PrescripcionPacienteHistorialSerializer(historial, many=True)
         
         # Información adicional del paciente
         data = {
@@ -170,14 +337,16 @@ class PrescripcionViewSet(viewsets.ModelViewSet):
                 'numero_documento': paciente.numero_documento,
                 'edad_actual': paciente.edad
             },
-            'total_prescripciones': prescripciones.count(),
+            'total_prescripciones': len(historial),
             'prescripcion_actual': None,
             'historial': serializer.data
         }
         
-        # Identificar prescripción actual (vigente más reciente)
-        prescripcion_actual = prescripciones.filter(vigente=True).first()
+        # Prescripción actual: la única vigente (prescripcion_una_vigente),
+        # ya incluida en el historial cargado
+        prescripcion_actual = next((p for p in historial if p.vigente), None)
         if prescripcion_actual:
+            prescripcion_actual.paciente = paciente
             data['prescripcion_actual'] = PrescripcionSerializer(prescripcion_actual).data
         
         return Response(data)
@@ -248,49 +417,115 @@ class PrescripcionViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def estadisticas(self, request):
-        """Estadísticas generales de prescripciones"""
-        total_prescripciones = Prescripcion.objects.count()
-        vigentes = Prescripcion.objects.filter(vigente=True).count()
+        """
+        Estadísticas generales de prescripciones
         
-        # Por vencer en 90 días
-        fecha_limite = date.today() - timedelta(days=640)
-        por_vencer = Prescripcion.objects.filter(
-            vigente=True,
-            fecha_examen__lte=fecha_limite
-        ).count()
+        Se leen de la tabla de estadísticas diarias (apps.reportes), por lo que
+        el costo depende del número de días y no del número de prescripciones.
+        Parámetros opcionales: fecha_desde, fecha_hasta (YYYY-MM-DD) y profesional (id).
+        Con un rango de fechas se incluye además la tendencia por día.
+        """
+        estadisticas = EstadisticaDiariaPrescripcion.objects.all()
         
-        # Con astigmatismo
-        con_astigmatismo = Prescripcion.objects.filter(
-            Q(od_cilindro__gt=0) | Q(od_cilindro__lt=0) |
-            Q(os_cilindro__gt=0) | Q(os_cilindro__lt=0)
-        ).count()
+        rango = False
+        for parametro, lookup in (('fecha_desde', 'fecha__gte'), ('fecha_hasta', 'fecha__lte')):
+            valor = request.query_params.get(parametro)
+            if valor:
+                try:
+                    fecha = parse_date(valor)
+                except ValueError:
+                    fecha = None
+                if fecha is None:
+                    return Response(
+                        {'error': f'Parámetro "{parametro}" inválido, use el formato YYYY-MM-DD'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                estadisticas = estadisticas.filter(**{lookup: fecha})
+                rango = True
         
-        # Con presbicia
-        con_presbicia = Prescripcion.objects.filter(adicion__gt=0).count()
+        profesional = request.query_params.get('profesional')
+        if profesional:
+            try:
+                profesional = int(profesional)
+            except ValueError:
+                return Response(
+                    {'error': 'Parámetro "profesional" inválido'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            estadisticas = estadisticas.filter(profesional_id=profesional)
+        
+        # Todos los contadores en una sola consulta
+        # Las estadísticas van por fecha de examen: vence en <= 90 días si
+        # fecha_examen <= hoy + 90 - 730
+        fecha_limite = date.today() + timedelta(days=DIAS_AVISO_VENCIMIENTO - DIAS_VIGENCIA)
+        suma = estadisticas.aggregate(
+            suma_total=Sum('total'),
+            suma_vigentes=Sum('vigentes'),
+            suma_por_vencer=Sum('vigentes', filter=Q(fecha__lte=fecha_limite)),
+            suma_astigmatismo=Sum('con_astigmatismo'),
+            suma_presbicia=Sum('con_presbicia'),
+        )
+        contadores = {
+            'total': suma['suma_total'] or 0,
+            'vigentes': suma['suma_vigentes'] or 0,
+            'por_vencer': suma['suma_por_vencer'] or 0,
+            'con_astigmatismo': suma['suma_astigmatismo'] or 0,
+            'con_presbicia': suma['suma_presbicia'] or 0,
+        }
         
         # Por profesional (top 5)
-        from django.db.models import Count
-        por_profesional = Prescripcion.objects.values(
-            'profesional__first_name', 'profesional__last_name'
-        ).annotate(
-            total=Count('id')
-        ).order_by('-total')[:5]
+        por_profesional = [
+            {
+                'profesional__first_name': fila['profesional__first_name'],
+                'profesional__last_name': fila['profesional__last_name'],
+                'total': fila['suma_total']
+            }
+            for fila in estadisticas.values(
+                'profesional__first_name', 'profesional__last_name'
+            ).annotate(
+                suma_total=Sum('total')
+            ).order_by('-suma_total')[:5]
+        ]
         
-        return Response({
+        total_prescripciones = contadores['total']
+        
+        def porcentaje(valor):
+            return round((valor / total_prescripciones * 100) if total_prescripciones > 0 else 0, 2)
+        
+        data = {
             'resumen': {
                 'total_prescripciones': total_prescripciones,
-                'vigentes': vigentes,
-                'por_vencer_90_dias': por_vencer,
-                'porcentaje_vigentes': round((vigentes / total_prescripciones * 100) if total_prescripciones > 0 else 0, 2)
+                'vigentes': contadores['vigentes'],
+                'por_vencer_90_dias': contadores['por_vencer'],
+                'porcentaje_vigentes': porcentaje(contadores['vigentes'])
             },
             'caracteristicas': {
-                'con_astigmatismo': con_astigmatismo,
-                'con_presbicia': con_presbicia,
-                'porcentaje_astigmatismo': round((con_astigmatismo / total_prescripciones * 100) if total_prescripciones > 0 else 0, 2),
-                'porcentaje_presbicia': round((con_presbicia / total_prescripciones * 100) if total_prescripciones > 0 else 0, 2)
+                'con_astigmatismo': contadores['con_astigmatismo'],
+                'con_presbicia': contadores['con_presbicia'],
+                'porcentaje_astigmatismo': porcentaje(contadores['con_astigmatismo']),
+                'porcentaje_presbicia': porcentaje(contadores['con_presbicia'])
             },
             'por_profesional': por_profesional
-        })
+        }
+        
+        if rango:
+            data['tendencia'] = [
+                {
+                    'fecha': fila['fecha'],
+                    'total': fila['suma_total'],
+                    'vigentes': fila['suma_vigentes'],
+                    'con_astigmatismo': fila['suma_astigmatismo'],
+                    'con_presbicia': fila['suma_presbicia']
+                }
+                for fila in estadisticas.values('fecha').annotate(
+                    suma_total=Sum('total'),
+                    suma_vigentes=Sum('vigentes'),
+                    suma_astigmatismo=Sum('con_astigmatismo'),
+                    suma_presbicia=Sum('con_presbicia')
+                ).order_by('fecha')
+            ]
+        
+        return Response(data)
 
 
 class HistorialCambiosViewSet(viewsets.ReadOnlyModelViewSet):
@@ -2,7 +2,7 @@
 Configuración del admin para productos
 """
 from django.contrib import admin
-from .models import Producto
+from .models import Producto, MovimientoStock, CorteStock
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
@@ -46,4 +46,39 @@ class ProductoAdmin(admin.ModelAdmin):
     ]
     
     # Campos que son solo de lectura
-    readonly_fields = ['fecha_creacion', 'fecha_actualizacion']
\ No newline at end of file
+    readonly_fields = ['fecha_creacion', 'fecha_actualizacion']
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    """
+    Kardex de movimientos de stock (solo lectura)
+    """
+    list_display = ['fecha', 'producto', 'tipo', 'cantidad', 'stock_resultante', 'usuario']
+    list_filter = ['tipo', 'fecha']
+    search_fields = ['producto__nombre', 'producto__codigo']
+    date_hierarchy = 'fecha'
+    
+    # El kardex es de solo inserción: se llena automáticamente
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(CorteStock)
+class CorteStockAdmin(admin.ModelAdmin):
+    """
+    Cortes periódicos de stock (solo lectura)
+    """
+    list_display = ['fecha', 'producto', 'stock']
+    search_fields = ['producto__nombre', 'producto__codigo']
+    date_hierarchy = 'fecha'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
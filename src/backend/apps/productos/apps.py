@@ -3,4 +3,13 @@ from django.apps import AppConfig
 class ProductosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.productos'
-    verbose_name = 'Gestión de Productos'
\ No newline at end of file
+    verbose_name = 'Gestión de Productos'
+    
+    def ready(self):
+        # Conecta la invalidación de la caché de respuestas
+        from . import cache  # noqa: F401
+        
+        # Registro de cambios (incluye list_editable del admin)
+        from apps.core import auditoria
+        from .models import Producto
+        auditoria.registrar(Producto)
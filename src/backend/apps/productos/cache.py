@@ -0,0 +1,61 @@
+"""
+Invalidación de la caché de por_categoria y bajo_stock
+
+por_categoria lista los productos activos; bajo_stock los activos con
+stock <= stock_minimo. Un cambio invalida cada grupo solo si el producto
+aparecía en él antes del cambio (copia guardada en post_init) o aparece
+después.
+"""
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from apps.core.cache import invalidar
+from .models import Producto
+from .signals import stock_actualizado
+
+GRUPO_CATEGORIAS = 'productos_por_categoria'
+GRUPO_BAJO_STOCK = 'productos_bajo_stock'
+
+
+def _estado(instance):
+    return tuple(instance.__dict__.get(campo) for campo in ('activo', 'stock', 'stock_minimo'))
+
+
+def _grupos(activo, stock, stock_minimo):
+    if activo is None or stock is None or stock_minimo is None:
+        # Estado desconocido (campo diferido o sin asignar)
+        return {GRUPO_CATEGORIAS, GRUPO_BAJO_STOCK}
+    if not activo:
+        return set()
+    if stock <= stock_minimo:
+        return {GRUPO_CATEGORIAS, GRUPO_BAJO_STOCK}
+    return {GRUPO_CATEGORIAS}
+
+
+@receiver(post_init, sender=Producto, dispatch_uid='productos_cache_init')
+def guardar_estado_producto(sender, instance, **kwargs):
+    instance._estado_cache = _estado(instance)
+
+
+@receiver(post_save, sender=Producto, dispatch_uid='productos_cache_guardar')
+def invalidar_producto_guardado(sender, instance, raw=False, **kwargs):
+    actual = _estado(instance)
+    if raw:
+        grupos = {GRUPO_CATEGORIAS, GRUPO_BAJO_STOCK}
+    else:
+        grupos = _grupos(*getattr(instance, '_estado_cache', (None, None, None))) | _grupos(*actual)
+    if grupos:
+        invalidar(*grupos)
+    instance._estado_cache = actual
+
+
+@receiver(post_delete, sender=Producto, dispatch_uid='productos_cache_eliminar')
+def invalidar_producto_eliminado(sender, instance, **kwargs):
+    grupos = _grupos(*_estado(instance))
+    if grupos:
+        invalidar(*grupos)
+
+
+@receiver(stock_actualizado, sender=Producto, dispatch_uid='productos_cache_stock')
+def invalidar_stock_actualizado(sender, **kwargs):
+    # Las reducciones por UPDATE no pasan por save(); el stock cambió
+    invalidar(GRUPO_CATEGORIAS, GRUPO_BAJO_STOCK)
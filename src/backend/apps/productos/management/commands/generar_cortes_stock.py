@@ -0,0 +1,40 @@
+"""
+Genera cortes de stock por producto para acotar las consultas al kardex
+
+Pensado para ejecutarse a diario (cron). Por defecto el corte se toma al
+inicio del día actual, cuando ya no quedan ventas del día anterior en curso.
+
+Uso:
+    python manage.py generar_cortes_stock
+    python manage.py generar_cortes_stock --fecha 2025-12-31
+"""
+from datetime import datetime, time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from apps.productos.models import CorteStock
+
+
+class Command(BaseCommand):
+    help = 'Genera cortes de stock a partir del kardex de movimientos'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha',
+            help='Día del corte (YYYY-MM-DD); el corte se toma al inicio de ese día'
+        )
+    
+    def handle(self, *args, **options):
+        dia = timezone.localdate()
+        if options['fecha']:
+            try:
+                dia = parse_date(options['fecha'])
+            except ValueError:
+                dia = None
+            if dia is None:
+                raise CommandError('--fecha inválida, use el formato YYYY-MM-DD')
+        
+        momento = timezone.make_aware(datetime.combine(dia, time.min))
+        creados = CorteStock.generar(momento)
+        
+        self.stdout.write(self.style.SUCCESS(f'Cortes de stock creados: {creados} ({momento})'))
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def corte_inicial(apps, schema_editor):
+    """El kardex empieza con un corte del stock actual de cada producto"""
+    Producto = apps.get_model('productos', 'Producto')
+    CorteStock = apps.get_model('productos', 'CorteStock')
+
+    ahora = django.utils.timezone.now()
+    CorteStock.objects.bulk_create([
+        CorteStock(producto_id=pk, fecha=ahora, stock=stock)
+        for pk, stock in Producto.objects.values_list('pk', 'stock').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('productos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('stock', models.PositiveIntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cortes_stock', to='productos.producto')),
+            ],
+            options={
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('INICIAL', 'Stock inicial'), ('VENTA', 'Venta'), ('AJUSTE', 'Ajuste manual')], max_length=10)),
+                ('cantidad', models.IntegerField(help_text='Cambio en el stock (negativo para salidas)')),
+                ('stock_resultante', models.PositiveIntegerField(help_text='Stock del producto después del movimiento')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_stock', to='productos.producto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='productos_m_product_21750f_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cortestock',
+            constraint=models.UniqueConstraint(fields=('producto', 'fecha'), name='corte_stock_producto_fecha_unico'),
+        ),
+        migrations.RunPython(corte_inicial, migrations.RunPython.noop),
+    ]
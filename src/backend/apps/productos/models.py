@@ -1,8 +1,11 @@
 """
 Modelos para el manejo de productos de la óptica
 """
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Case, When, Value, Sum, OuterRef, Subquery
 from django.core.validators import MinValueValidator
+from django.contrib.auth.models import User
+from django.utils import timezone
 from decimal import Decimal
 
 class Producto(models.Model):
@@ -90,6 +93,7 @@ class Producto(models.Model):
             models.Index(fields=['categoria']),
             models.Index(fields=['codigo']),
             models.Index(fields=['activo']),
+            models.Index(fields=['categoria', 'nombre']),  # Orden por defecto
         ]
     
     def __str__(self):
@@ -110,10 +114,305 @@ class Producto(models.Model):
         """Verifica si necesitas comprar más"""
         return self.stock <= self.stock_minimo
     
-    def reducir_stock(self, cantidad):
-        """Reduce el stock cuando vendes"""
-        if self.stock >= cantidad:
-            self.stock -= cantidad
-            self.save()
-            return True
-        return False
\ No newline at end of file
+    # Campos que cuentan en las estadísticas de inventario (apps.reportes)
+    CAMPOS_INVENTARIO = ('categoria', 'activo', 'stock', 'precio_compra', 'precio_venta', 'stock_minimo')
+    
+    def save(self, *args, **kwargs):
+        """
+        Guarda el producto y registra en el kardex cualquier cambio de stock
+        
+        Deja en _inventario_anterior los CAMPOS_INVENTARIO que había en la
+        base de datos (None si es nuevo), para las estadísticas de
+        apps.reportes, que se actualizan en la misma transacción (post_save).
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not set(update_fields) & set(self.CAMPOS_INVENTARIO):
+            return super().save(*args, **kwargs)
+        
+        nuevo = self._state.adding
+        with transaction.atomic():
+            anterior = None
+            if not nuevo:
+                # Se compara contra la base de datos (no contra la instancia)
+                # para que el movimiento refleje el cambio real
+                anterior = Producto.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values(*self.CAMPOS_INVENTARIO).first()
+            self._inventario_anterior = anterior
+            
+            super().save(*args, **kwargs)
+            
+            stock_anterior = anterior['stock'] if anterior else 0
+            if (update_fields is None or 'stock' in update_fields) and self.stock != stock_anterior:
+                MovimientoStock.objects.create(
+                    producto=self,
+                    tipo='INICIAL' if nuevo else 'AJUSTE',
+                    cantidad=self.stock - stock_anterior,
+                    stock_resultante=self.stock
+                )
+    
+    def reducir_stock(self, cantidad, usuario=None):
+        """
+        Reduce el stock cuando vendes
+        
+        Usa un UPDATE condicional (stock = stock - n WHERE stock >= n), así
+        dos ventas simultáneas nunca dejan el stock negativo. Retorna True si
+        la base de datos aplicó el descuento.
+        """
+        from .signals import stock_actualizado
+        
+        with transaction.atomic():
+            actualizados = Producto.objects.filter(
+                pk=self.pk,
+                stock__gte=cantidad
+            ).update(
+                stock=F('stock') - cantidad,
+                fecha_actualizacion=timezone.now()
+            )
+            if not actualizados:
+                return False
+            
+            actual = Producto.objects.filter(pk=self.pk).values(
+                'fecha_actualizacion', *self.CAMPOS_INVENTARIO
+            ).get()
+            self.fecha_actualizacion = actual.pop('fecha_actualizacion')
+            self.stock = actual['stock']
+            MovimientoStock.objects.create(
+                producto=self,
+                tipo='VENTA',
+                cantidad=-cantidad,
+                stock_resultante=self.stock,
+                usuario=usuario
+            )
+            stock_actualizado.send(
+                sender=Producto, cambios=[({**actual, 'stock': self.stock + cantidad}, actual)]
+            )
+        return True
+    
+    def ajustar_stock(self, stock, usuario=None):
+        """
+        Fija el stock en un valor (conteo físico, entrada de mercancía)
+        
+        Retorna el stock que había antes del ajuste.
+        """
+        from .signals import stock_actualizado
+        
+        with transaction.atomic():
+            anterior = Producto.objects.select_for_update().filter(
+                pk=self.pk
+            ).values(*self.CAMPOS_INVENTARIO).get()
+            Producto.objects.filter(pk=self.pk).update(
+                stock=stock,
+                fecha_actualizacion=timezone.now()
+            )
+            if stock != anterior['stock']:
+                MovimientoStock.objects.create(
+                    producto=self,
+                    tipo='AJUSTE',
+                    cantidad=stock - anterior['stock'],
+                    stock_resultante=stock,
+                    usuario=usuario
+                )
+            stock_actualizado.send(sender=Producto, cambios=[(anterior, {**anterior, 'stock': stock})])
+        
+        self.stock = stock
+        return anterior['stock']
+    
+    @classmethod
+    def reducir_stock_lote(cls, cantidades, usuario=None):
+        """
+        Reduce el stock de varios productos en un solo UPDATE (todo o nada)
+        
+        cantidades: diccionario {producto_id: cantidad}. Si algún producto no
+        existe o no tiene stock suficiente no se descuenta nada.
+        Retorna (aplicado, productos) donde productos es un diccionario
+        {id: {'nombre', 'stock', 'categoria'}} con el stock después del intento.
+        """
+        from .signals import stock_actualizado
+        
+        por_producto = Case(
+            *[When(pk=pk, then=Value(cantidad)) for pk, cantidad in cantidades.items()],
+            output_field=models.IntegerField()
+        )
+        
+        def leer_productos():
+            return {
+                fila.pop('id'): fila
+                for fila in cls.objects.filter(pk__in=cantidades.keys()).values(
+                    'id', 'nombre', *cls.CAMPOS_INVENTARIO
+                )
+            }
+        
+        with transaction.atomic():
+            actualizados = cls.objects.filter(
+                pk__in=cantidades.keys(),
+                stock__gte=por_producto
+            ).update(
+                stock=F('stock') - por_producto,
+                fecha_actualizacion=timezone.now()
+            )
+            aplicado = actualizados == len(cantidades)
+            
+            if aplicado:
+                productos = leer_productos()
+                MovimientoStock.objects.bulk_create([
+                    MovimientoStock(
+                        producto_id=pk,
+                        tipo='VENTA',
+                        cantidad=-cantidad,
+                        stock_resultante=productos[pk]['stock'],
+                        usuario=usuario
+                    )
+                    for pk, cantidad in cantidades.items()
+                ])
+                stock_actualizado.send(sender=cls, cambios=[
+                    ({**producto, 'stock': producto['stock'] + cantidades[pk]}, producto)
+                    for pk, producto in productos.items()
+                ])
+            else:
+                transaction.set_rollback(True)
+        
+        if not aplicado:
+            # Se lee después de revertir para informar el stock real
+            productos = leer_productos()
+        
+        return aplicado, {
+            pk: {campo: producto[campo] for campo in ('nombre', 'stock', 'categoria')}
+            for pk, producto in productos.items()
+        }
+    
+    def stock_en_fecha(self, fecha):
+        """
+        Stock que tenía el producto en un momento dado (datetime)
+        
+        Parte del último corte anterior a la fecha y suma solo los movimientos
+        posteriores a ese corte, en vez de recorrer todo el kardex.
+        """
+        corte = self.cortes_stock.filter(fecha__lte=fecha).order_by('-fecha').first()
+        movimientos = self.movimientos_stock.filter(fecha__lte=fecha)
+        
+        stock = 0
+        if corte:
+            stock = corte.stock
+            movimientos = movimientos.filter(fecha__gt=corte.fecha)
+        
+        return stock + (movimientos.aggregate(total=Sum('cantidad'))['total'] or 0)
+
+
+class MovimientoStock(models.Model):
+    """
+    Kardex: registro de solo inserción de cada cambio de stock
+    """
+    
+    TIPO_CHOICES = [
+        ('INICIAL', 'Stock inicial'),
+        ('VENTA', 'Venta'),
+        ('AJUSTE', 'Ajuste manual'),
+    ]
+    
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='movimientos_stock'
+    )
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    cantidad = models.IntegerField(
+        help_text="Cambio en el stock (negativo para salidas)"
+    )
+    stock_resultante = models.PositiveIntegerField(
+        help_text="Stock del producto después del movimiento"
+    )
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True
+    )
+    fecha = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['producto', 'fecha']),
+        ]
+    
+    def __str__(self):
+        return f"{self.producto} {self.cantidad:+d} ({self.get_tipo_display()})"
+
+
+class CorteStock(models.Model):
+    """
+    Foto del stock de un producto en un momento dado
+    
+    Acota cuántos movimientos hay que sumar para saber el stock en una fecha.
+    Se generan periódicamente con: python manage.py generar_cortes_stock
+    """
+    
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='cortes_stock'
+    )
+    fecha = models.DateTimeField()
+    stock = models.PositiveIntegerField()
+    
+    class Meta:
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['producto', 'fecha'],
+                name='corte_stock_producto_fecha_unico'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.producto} @ {self.fecha}: {self.stock}"
+    
+    @classmethod
+    def generar(cls, fecha):
+        """
+        Crea un corte en la fecha para cada producto con movimientos desde su
+        último corte. El stock se calcula desde el kardex (último corte más los
+        movimientos intermedios). Retorna cuántos cortes se crearon.
+        """
+        ultimo_corte = cls.objects.filter(
+            producto=OuterRef('pk'),
+            fecha__lte=fecha
+        ).order_by('-fecha')
+        
+        def suma_movimientos(desde_corte):
+            movimientos = MovimientoStock.objects.filter(
+                producto=OuterRef('pk'),
+                fecha__lte=fecha
+            )
+            if desde_corte:
+                movimientos = movimientos.filter(fecha__gt=OuterRef('corte_fecha'))
+            return Subquery(
+                movimientos.order_by().values('producto').annotate(
+                    total=Sum('cantidad')
+                ).values('total'),
+                output_field=models.IntegerField()
+            )
+        
+        productos = Producto.objects.order_by().annotate(
+            corte_fecha=Subquery(ultimo_corte.values('fecha')[:1]),
+            corte_stock=Subquery(ultimo_corte.values('stock')[:1]),
+        ).annotate(
+            movimientos_con_corte=suma_movimientos(desde_corte=True),
+            movimientos_sin_corte=suma_movimientos(desde_corte=False),
+        ).values_list('pk', 'corte_fecha', 'corte_stock', 'movimientos_con_corte', 'movimientos_sin_corte')
+        
+        cortes = []
+        for pk, corte_fecha, corte_stock, con_corte, sin_corte in productos.iterator(chunk_size=2000):
+            if corte_fecha is None:
+                if sin_corte is None:
+                    continue  # Sin historial antes de la fecha
+                stock = sin_corte
+            else:
+                if con_corte is None or corte_fecha == fecha:
+                    continue  # Sin cambios desde el último corte
+                stock = corte_stock + con_corte
+            cortes.append(cls(producto_id=pk, fecha=fecha, stock=stock))
+        
+        cls.objects.bulk_create(cortes, batch_size=1000, ignore_conflicts=True)
+        return len(cortes)
@@ -2,7 +2,7 @@
 Serializers para la API de productos
 """
 from rest_framework import serializers
-from .models import Producto
+from .models import Producto, MovimientoStock
 
 class ProductoSerializer(serializers.ModelSerializer):
     """
@@ -94,4 +94,25 @@ class ProductoStockSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "El stock no puede ser negativo"
             )
-        return value
\ No newline at end of file
+        return value
+
+class MovimientoStockSerializer(serializers.Serializer):
+    """
+    Serializer para cada ítem de un movimiento de stock en lote
+    """
+    producto_id = serializers.IntegerField()
+    cantidad = serializers.IntegerField(min_value=1)
+
+class HistorialStockSerializer(serializers.ModelSerializer):
+    """
+    Serializer para los movimientos del kardex de un producto
+    """
+    tipo_display = serializers.CharField(source='get_tipo_display', read_only=True)
+    usuario_nombre = serializers.CharField(source='usuario.get_full_name', read_only=True, default=None)
+    
+    class Meta:
+        model = MovimientoStock
+        fields = [
+            'id', 'tipo', 'tipo_display', 'cantidad', 'stock_resultante',
+            'usuario', 'usuario_nombre', 'fecha'
+        ]
@@ -0,0 +1,10 @@
+"""
+Señales propias de productos
+"""
+from django.dispatch import Signal
+
+
+# Enviada, dentro de la transacción, después de cambios de stock hechos con
+# QuerySet.update(), que no disparan post_save. Argumento: cambios = lista de
+# (anterior, actual) con los Producto.CAMPOS_INVENTARIO de cada producto
+stock_actualizado = Signal()
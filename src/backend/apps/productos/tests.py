@@ -0,0 +1,557 @@
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APIClient
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from io import StringIO
+from apps.core.pruebas import PresupuestoConsultasMixin
+from apps.reportes.models import EstadisticaDiariaInventario
+from .models import Producto, MovimientoStock, CorteStock
+
+
+class ProductoModelTest(TestCase):
+    """
+    Pruebas unitarias para el modelo Producto
+    """
+    
+    def setUp(self):
+        """Configuración inicial para las pruebas"""
+        self.producto = Producto.objects.create(
+            nombre='Montura Metal Dorada',
+            categoria='MONTURA',
+            precio_compra=Decimal('50000.00'),
+            precio_venta=Decimal('120000.00'),
+            stock=5,
+            stock_minimo=2
+        )
+    
+    def test_margen_ganancia(self):
+        """Prueba el cálculo del margen de ganancia"""
+        self.assertEqual(self.producto.margen_ganancia, Decimal('140'))
+    
+    def test_necesita_stock(self):
+        """Prueba la detección de stock bajo"""
+        self.assertFalse(self.producto.necesita_stock)
+        self.producto.stock = 2
+        self.assertTrue(self.producto.necesita_stock)
+    
+    def test_reducir_stock(self):
+        """Prueba que reducir stock descuente y refresque la instancia"""
+        self.assertTrue(self.producto.reducir_stock(3))
+        self.assertEqual(self.producto.stock, 2)
+        
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 2)
+    
+    def test_reducir_stock_insuficiente(self):
+        """Prueba que no se descuente más de lo disponible"""
+        self.assertFalse(self.producto.reducir_stock(6))
+        
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 5)
+    
+    def test_reducir_stock_con_instancia_desactualizada(self):
+        """La validación usa el stock de la base de datos, no el de la instancia"""
+        otra_instancia = Producto.objects.get(pk=self.producto.pk)
+        self.assertTrue(otra_instancia.reducir_stock(4))
+        
+        # self.producto todavía cree que hay 5 unidades
+        self.assertFalse(self.producto.reducir_stock(2))
+
+
+class EstadisticasInventarioApiTest(APITestCase):
+    """
+    Pruebas del endpoint de estadísticas de inventario
+    """
+    
+    url = '/api/productos/estadisticas/'
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.usuario = User.objects.create_user(username='admin')
+        self.client.force_authenticate(user=self.usuario)
+        
+        Producto.objects.create(
+            nombre='Montura Metal', categoria='MONTURA',
+            precio_compra=Decimal('50000.00'), precio_venta=Decimal('120000.00'),
+            stock=4, stock_minimo=2
+        )
+        Producto.objects.create(
+            nombre='Montura Acetato', categoria='MONTURA',
+            precio_compra=Decimal('30000.00'), precio_venta=Decimal('80000.00'),
+            stock=10, stock_minimo=2
+        )
+        Producto.objects.create(
+            nombre='Estuche Rígido', categoria='ESTUCHE',
+            precio_compra=Decimal('5000.00'), precio_venta=Decimal('15000.00'),
+            stock=0, stock_minimo=1
+        )
+        Producto.objects.create(
+            nombre='Lente Descontinuado', categoria='LENTE',
+            precio_compra=Decimal('20000.00'), precio_venta=Decimal('60000.00'),
+            stock=3, stock_minimo=1, activo=False
+        )
+    
+    def test_valor_inventario_es_suma_de_precio_por_stock(self):
+        """El valor del inventario es la suma de precio de compra por stock"""
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, 200)
+        # 50000*4 + 30000*10 + 5000*0 + 20000*3
+        self.assertEqual(response.data['resumen']['valor_inventario'], Decimal('560000.00'))
+        self.assertEqual(response.data['resumen']['total_productos'], 3)
+        self.assertEqual(response.data['resumen']['productos_sin_stock'], 1)
+        self.assertEqual(response.data['resumen']['productos_bajo_stock'], 1)
+    
+    def test_por_categoria_solo_activos(self):
+        """El detalle por categoría omite categorías sin productos activos"""
+        response = self.client.get(self.url)
+        
+        por_categoria = {fila['categoria']: fila for fila in response.data['por_categoria']}
+        self.assertEqual(list(por_categoria), ['Montura', 'Estuche'])
+        self.assertEqual(por_categoria['Montura']['total'], 2)
+        self.assertEqual(por_categoria['Montura']['stock_total'], 14)
+        self.assertEqual(por_categoria['Montura']['precio_promedio'], Decimal('100000'))
+        self.assertEqual(por_categoria['Montura']['valor_inventario'], Decimal('500000.00'))
+    
+    def test_resumen_incluye_inactivos(self):
+        """Desactivar un producto lo saca del total pero no del valor ni de sin stock"""
+        estuche = Producto.objects.get(nombre='Estuche Rígido')
+        estuche.activo = False
+        estuche.save()
+        Producto.objects.filter(nombre='Lente Descontinuado').get().ajustar_stock(0)
+        
+        resumen = self.client.get(self.url).data['resumen']
+        
+        self.assertEqual(resumen['total_productos'], 2)
+        self.assertEqual(resumen['valor_inventario'], Decimal('500000.00'))
+        self.assertEqual(resumen['productos_sin_stock'], 2)
+        self.assertEqual(resumen['productos_bajo_stock'], 2)
+    
+    def test_una_sola_consulta(self):
+        """Todas las cifras salen de una única consulta a las fotos diarias"""
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+    
+    def test_lee_las_fotos_diarias(self):
+        """El resumen sale de la foto más reciente, no de los productos"""
+        EstadisticaDiariaInventario.objects.filter(categoria='ESTUCHE').update(productos_sin_stock=7)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['resumen']['productos_sin_stock'], 7)
+
+
+class ReducirStockApiTest(APITestCase):
+    """
+    Pruebas del endpoint para reducir stock
+    """
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.usuario = User.objects.create_user(username='vendedor')
+        self.client.force_authenticate(user=self.usuario)
+        self.producto = Producto.objects.create(
+            nombre='Estuche Rígido', categoria='ESTUCHE',
+            precio_compra=Decimal('5000.00'), precio_venta=Decimal('15000.00'),
+            stock=3
+        )
+        self.url = f'/api/productos/{self.producto.id}/reducir_stock/'
+    
+    def test_reducir_stock(self):
+        """Una venta válida descuenta el stock"""
+        response = self.client.post(self.url, {'cantidad': 2})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock_actual'], 1)
+    
+    def test_stock_insuficiente(self):
+        """Una venta mayor al stock se rechaza"""
+        response = self.client.post(self.url, {'cantidad': 4})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_cantidad_invalida(self):
+        """Cantidades no numéricas o no positivas se rechazan"""
+        for cantidad in ('abc', 0, -1):
+            response = self.client.post(self.url, {'cantidad': cantidad})
+            self.assertEqual(response.status_code, 400)
+        
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 3)
+
+
+class MovimientosStockApiTest(APITestCase):
+    """
+    Pruebas del endpoint de movimientos de stock en lote
+    """
+    
+    url = '/api/productos/movimientos_stock/'
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.usuario = User.objects.create_user(username='vendedor')
+        self.client.force_authenticate(user=self.usuario)
+        datos = {'precio_compra': Decimal('1000.00'), 'precio_venta': Decimal('2000.00')}
+        self.montura = Producto.objects.create(nombre='Montura', categoria='MONTURA', stock=5, **datos)
+        self.lente = Producto.objects.create(nombre='Lente', categoria='LENTE', stock=4, **datos)
+        self.estuche = Producto.objects.create(nombre='Estuche', categoria='ESTUCHE', stock=1, **datos)
+    
+    def stocks(self):
+        return list(Producto.objects.order_by('id').values_list('stock', flat=True))
+    
+    def test_venta_completa(self):
+        """Todos los descuentos se aplican y se informa el stock por ítem"""
+        response = self.client.post(self.url, [
+            {'producto_id': self.montura.id, 'cantidad': 1},
+            {'producto_id': self.lente.id, 'cantidad': 2},
+            {'producto_id': self.estuche.id, 'cantidad': 1},
+        ], format='json')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['stock_actual'] for r in response.data['resultados']], [4, 2, 0])
+        self.assertEqual(self.stocks(), [4, 2, 0])
+    
+    def test_todo_o_nada(self):
+        """Si un ítem no tiene stock no se descuenta ninguno"""
+        response = self.client.post(self.url, [
+            {'producto_id': self.montura.id, 'cantidad': 1},
+            {'producto_id': self.estuche.id, 'cantidad': 2},
+        ], format='json')
+        
+        self.assertEqual(response.status_code, 400)
+        resultados = {r['producto_id']: r for r in response.data['resultados']}
+        self.assertNotIn('error', resultados[self.montura.id])
+        self.assertEqual(resultados[self.estuche.id]['error'], 'No hay suficiente stock disponible')
+        self.assertEqual(self.stocks(), [5, 4, 1])
+    
+    def test_producto_inexistente(self):
+        """Un producto inexistente cancela el lote"""
+        response = self.client.post(self.url, [
+            {'producto_id': self.montura.id, 'cantidad': 1},
+            {'producto_id': 9999, 'cantidad': 1},
+        ], format='json')
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['resultados'][1]['error'], 'Producto no encontrado')
+        self.assertEqual(self.stocks(), [5, 4, 1])
+    
+    def test_producto_repetido_suma_cantidades(self):
+        """Un producto repetido se valida contra la suma de sus cantidades"""
+        response = self.client.post(self.url, [
+            {'producto_id': self.lente.id, 'cantidad': 3},
+            {'producto_id': self.lente.id, 'cantidad': 2},
+        ], format='json')
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stocks(), [5, 4, 1])
+    
+    def test_datos_invalidos(self):
+        """Listas vacías o cantidades no positivas se rechazan"""
+        self.assertEqual(self.client.post(self.url, [], format='json').status_code, 400)
+        response = self.client.post(self.url, [
+            {'producto_id': self.montura.id, 'cantidad': 0}
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_un_solo_update(self):
+        """El lote se aplica con un único UPDATE"""
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(self.url, [
+                {'producto_id': self.montura.id, 'cantidad': 1},
+                {'producto_id': self.lente.id, 'cantidad': 1},
+            ], format='json')
+        
+        updates = [q['sql'] for q in consultas.captured_queries
+                   if q['sql'].startswith('UPDATE "productos_producto"')]
+        self.assertEqual(len(updates), 1)
+
+
+class KardexStockTest(APITestCase):
+    """
+    Pruebas del kardex de movimientos y los cortes de stock
+    """
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.usuario = User.objects.create_user(username='bodega')
+        self.client.force_authenticate(user=self.usuario)
+        self.producto = Producto.objects.create(
+            nombre='Lente Antireflejo', categoria='LENTE',
+            precio_compra=Decimal('20000.00'), precio_venta=Decimal('60000.00'),
+            stock=10
+        )
+    
+    def movimientos(self):
+        return list(self.producto.movimientos_stock.order_by('id').values_list(
+            'tipo', 'cantidad', 'stock_resultante'
+        ))
+    
+    def fechar(self, fecha):
+        """Mueve el último movimiento a una fecha pasada"""
+        ultimo = self.producto.movimientos_stock.order_by('-id').first()
+        MovimientoStock.objects.filter(pk=ultimo.pk).update(fecha=fecha)
+    
+    def test_cada_cambio_queda_registrado(self):
+        """Creación, venta, ajuste y edición normal generan movimientos"""
+        self.producto.reducir_stock(3, usuario=self.usuario)
+        self.producto.ajustar_stock(20, usuario=self.usuario)
+        
+        producto = Producto.objects.get(pk=self.producto.pk)
+        producto.stock = 18
+        producto.save()
+        
+        self.assertEqual(self.movimientos(), [
+            ('INICIAL', 10, 10),
+            ('VENTA', -3, 7),
+            ('AJUSTE', 13, 20),
+            ('AJUSTE', -2, 18),
+        ])
+    
+    def test_guardar_sin_cambio_de_stock_no_registra(self):
+        """Editar otros campos no agrega movimientos"""
+        self.producto.nombre = 'Lente Antireflejo Premium'
+        self.producto.save()
+        
+        self.assertEqual(len(self.movimientos()), 1)
+    
+    def test_actualizar_stock_informa_stock_anterior(self):
+        """El endpoint de actualizar stock informa el valor previo real"""
+        url = f'/api/productos/{self.producto.id}/actualizar_stock/'
+        response = self.client.patch(url, {'stock': 25})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock_anterior'], 10)
+        self.assertEqual(response.data['stock_nuevo'], 25)
+        self.assertEqual(self.movimientos()[-1], ('AJUSTE', 15, 25))
+    
+    def test_lote_fallido_no_registra_movimientos(self):
+        """Un lote rechazado no deja rastro en el kardex"""
+        aplicado, _ = Producto.reducir_stock_lote({self.producto.pk: 50})
+        
+        self.assertFalse(aplicado)
+        self.assertEqual(len(self.movimientos()), 1)
+    
+    def test_stock_en_fecha(self):
+        """El stock en una fecha pasada se reconstruye desde el kardex"""
+        ahora = timezone.now()
+        self.fechar(ahora - timedelta(days=10))
+        self.producto.reducir_stock(4)
+        self.fechar(ahora - timedelta(days=5))
+        self.producto.reducir_stock(1)
+        
+        self.assertEqual(self.producto.stock_en_fecha(ahora - timedelta(days=11)), 0)
+        self.assertEqual(self.producto.stock_en_fecha(ahora - timedelta(days=7)), 10)
+        self.assertEqual(self.producto.stock_en_fecha(ahora - timedelta(days=1)), 6)
+        self.assertEqual(self.producto.stock_en_fecha(ahora + timedelta(seconds=1)), 5)
+    
+    def test_cortes_acotan_la_consulta_sin_cambiar_el_resultado(self):
+        """Con un corte el resultado es el mismo y solo se suman los movimientos posteriores"""
+        ahora = timezone.now()
+        self.fechar(ahora - timedelta(days=10))
+        self.producto.reducir_stock(4)
+        self.fechar(ahora - timedelta(days=5))
+        
+        creados = CorteStock.generar(ahora - timedelta(days=3))
+        self.assertEqual(creados, 1)
+        self.assertEqual(self.producto.cortes_stock.get().stock, 6)
+        
+        # Un segundo corte sin movimientos nuevos no se genera
+        self.assertEqual(CorteStock.generar(ahora - timedelta(days=2)), 0)
+        
+        self.producto.reducir_stock(1)
+        self.assertEqual(self.producto.stock_en_fecha(ahora - timedelta(days=7)), 10)
+        self.assertEqual(self.producto.stock_en_fecha(ahora - timedelta(days=1)), 6)
+        self.assertEqual(self.producto.stock_en_fecha(ahora + timedelta(seconds=1)), 5)
+    
+    def test_comando_generar_cortes(self):
+        """El comando crea los cortes al inicio del día indicado"""
+        salida = StringIO()
+        manana = (timezone.localdate() + timedelta(days=1)).isoformat()
+        call_command('generar_cortes_stock', fecha=manana, stdout=salida)
+        
+        self.assertIn('Cortes de stock creados: 1', salida.getvalue())
+        self.assertEqual(self.producto.cortes_stock.get().stock, 10)
+    
+    def test_endpoints_de_kardex(self):
+        """Los endpoints exponen el kardex y el stock en una fecha"""
+        self.producto.reducir_stock(2)
+        
+        response = self.client.get(f'/api/productos/{self.producto.id}/historial_stock/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['results'][0]['tipo'], 'VENTA')
+        
+        hoy = timezone.localdate().isoformat()
+        response = self.client.get(f'/api/productos/{self.producto.id}/stock_en_fecha/', {'fecha': hoy})
+        self.assertEqual(response.data['stock'], 8)
+        
+        response = self.client.get(f'/api/productos/{self.producto.id}/stock_en_fecha/', {'fecha': '2026-13-45'})
+        self.assertEqual(response.status_code, 400)
+
+class ReducirStockConcurrenciaTest(TransactionTestCase):
+    """
+    Prueba de estrés: ventas simultáneas no pueden sobrevender
+    """
+    
+    def test_sin_sobreventa_con_solicitudes_concurrentes(self):
+        """100 ventas concurrentes de 1 unidad sobre 40 en stock: solo 40 se aplican"""
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('SQLite en memoria (cache compartida) no admite escrituras concurrentes')
+        
+        usuario = User.objects.create_user(username='vendedor')
+        producto = Producto.objects.create(
+            nombre='Kit de Limpieza', categoria='LIMPIEZA',
+            precio_compra=Decimal('3000.00'), precio_venta=Decimal('8000.00'),
+            stock=40
+        )
+        url = f'/api/productos/{producto.id}/reducir_stock/'
+        
+        def vender(_):
+            client = APIClient()
+            client.force_authenticate(user=usuario)
+            try:
+                return client.post(url, {'cantidad': 1}).status_code
+            finally:
+                connection.close()
+        
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            respuestas = list(executor.map(vender, range(100)))
+        
+        producto.refresh_from_db()
+        self.assertEqual(respuestas.count(200), 40)
+        self.assertEqual(respuestas.count(400), 60)
+        self.assertEqual(producto.stock, 0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheProductosApiTest(APITestCase):
+    """
+    Pruebas de la caché de por_categoria y bajo_stock
+    """
+    
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user(username='vendedor')
+        self.client.force_authenticate(user=self.usuario)
+        self.normal = Producto.objects.create(
+            nombre='Montura Acetato', categoria='MONTURA',
+            precio_compra=Decimal('40000'), precio_venta=Decimal('90000'),
+            stock=10, stock_minimo=2
+        )
+        self.bajo = Producto.objects.create(
+            nombre='Estuche Rígido', categoria='ESTUCHE',
+            precio_compra=Decimal('5000'), precio_venta=Decimal('12000'),
+            stock=1, stock_minimo=2
+        )
+    
+    def nombres_bajo_stock(self):
+        response = self.client.get('/api/productos/bajo_stock/')
+        return [p['nombre'] for p in response.data['productos']]
+    
+    def test_segunda_llamada_sin_consultas(self):
+        primera = self.client.get('/api/productos/bajo_stock/')
+        with self.assertNumQueries(0):
+            segunda = self.client.get('/api/productos/bajo_stock/')
+        self.assertEqual(primera.data, segunda.data)
+        
+        self.client.get('/api/productos/por_categoria/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/productos/por_categoria/')
+    
+    def test_producto_que_entra_a_bajo_stock_invalida(self):
+        self.assertEqual(self.nombres_bajo_stock(), ['Estuche Rígido'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.normal.ajustar_stock(2)
+        self.assertEqual(
+            sorted(self.nombres_bajo_stock()), ['Estuche Rígido', 'Montura Acetato']
+        )
+    
+    def test_cambio_fuera_de_bajo_stock_no_invalida(self):
+        self.client.get('/api/productos/bajo_stock/')
+        self.client.get('/api/productos/por_categoria/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.normal.precio_venta = Decimal('95000')
+            self.normal.save()
+        
+        with self.assertNumQueries(0):
+            self.client.get('/api/productos/bajo_stock/')
+        response = self.client.get('/api/productos/por_categoria/')
+        self.assertEqual(response.data['Montura'][0]['precio_venta'], '95000.00')
+    
+    def test_reduccion_de_stock_invalida(self):
+        self.assertEqual(self.nombres_bajo_stock(), ['Estuche Rígido'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.normal.reducir_stock(9)
+        self.assertIn('Montura Acetato', self.nombres_bajo_stock())
+    
+    def test_sin_commit_no_invalida(self):
+        self.client.get('/api/productos/bajo_stock/')
+        # Sin confirmar la transacción, la versión del grupo no cambia
+        self.bajo.activo = False
+        self.bajo.save()
+        with self.assertNumQueries(0):
+            self.client.get('/api/productos/bajo_stock/')
+    
+    def test_clave_por_parametros_y_rol(self):
+        self.client.get('/api/productos/bajo_stock/')
+        # Fallo: conteo y listado
+        with self.assertNumQueries(2):
+            self.client.get('/api/productos/bajo_stock/', {'formato': 'corto'})
+        
+        admin = User.objects.create_user(username='admin', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        with self.assertNumQueries(2):
+            self.client.get('/api/productos/bajo_stock/')
+    
+    def test_estadisticas_de_cache(self):
+        self.client.get('/api/productos/bajo_stock/')
+        self.client.get('/api/productos/bajo_stock/')
+        self.client.get('/api/productos/bajo_stock/')
+        
+        admin = User.objects.create_user(username='admin', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/cache/estadisticas/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['productos_bajo_stock'],
+            {'aciertos': 2, 'fallos': 1, 'tasa_aciertos': 0.6667}
+        )
+    
+    def test_estadisticas_solo_staff(self):
+        response = self.client.get('/api/cache/estadisticas/')
+        self.assertEqual(response.status_code, 403)
+
+
+class PorCategoriaApiTest(PresupuestoConsultasMixin, APITestCase):
+    """
+    Pruebas de /api/productos/por_categoria/
+    """
+    
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user(username='vendedor')
+        self.client.force_authenticate(user=self.usuario)
+        for nombre, categoria, activo in [
+            ('Estuche Rígido', 'ESTUCHE', True),
+            ('Montura Acetato', 'MONTURA', True),
+            ('Lente Progresivo', 'LENTE', True),
+            ('Montura Metal', 'MONTURA', True),
+            ('Paño Viejo', 'LIMPIEZA', False),
+        ]:
+            Producto.objects.create(
+                nombre=nombre, categoria=categoria, activo=activo,
+                precio_compra=Decimal('1000'), precio_venta=Decimal('2000'), stock=5
+            )
+    
+    def test_agrupa_en_una_consulta(self):
+        with self.assertPresupuestoConsultas(1):
+            response = self.client.get('/api/productos/por_categoria/')
+        
+        self.assertEqual(list(response.data), ['Montura', 'Lente', 'Estuche'])
+        self.assertEqual(
+            [p['nombre'] for p in response.data['Montura']], ['Montura Acetato', 'Montura Metal']
+        )
@@ -24,4 +24,7 @@ urlpatterns = [
 # GET    /api/productos/bajo_stock/          - Productos con poco stock
 # GET    /api/productos/estadisticas/        - Dashboard de estadísticas
 # PATCH  /api/productos/{id}/actualizar_stock/ - Solo actualizar stock
-# POST   /api/productos/{id}/reducir_stock/  - Reducir stock (para ventas)
\ No newline at end of file
+# POST   /api/productos/{id}/reducir_stock/  - Reducir stock (para ventas)
+# POST   /api/productos/movimientos_stock/   - Reducir stock de varios productos (todo o nada)
+# GET    /api/productos/{id}/historial_stock/ - Kardex de movimientos de stock
+# GET    /api/productos/{id}/stock_en_fecha/  - Stock del producto en una fecha pasada
\ No newline at end of file
@@ -1,18 +1,26 @@
 """
 Vistas para la API de productos
 """
+from datetime import datetime, time
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Sum, Avg, Count, F
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from apps.core.cache import cachear_respuesta
+from apps.reportes.models import EstadisticaDiariaInventario
+from .cache import GRUPO_BAJO_STOCK, GRUPO_CATEGORIAS
 from .models import Producto
 from .serializers import (
     ProductoSerializer, 
     ProductoListSerializer, 
     ProductoCreateSerializer,
-    ProductoStockSerializer
+    ProductoStockSerializer,
+    MovimientoStockSerializer,
+    HistorialStockSerializer
 )
 
 class ProductoViewSet(viewsets.ModelViewSet):
@@ -42,21 +50,26 @@ class ProductoViewSet(viewsets.ModelViewSet):
         return ProductoSerializer
     
     @action(detail=False, methods=['get'])
+    @cachear_respuesta(GRUPO_CATEGORIAS)
     def por_categoria(self, request):
         """
         Endpoint personalizado: /api/productos/por_categoria/
-        Agrupa productos por categoría
+        Agrupa productos por categoría (una sola consulta)
         """
-        categorias = {}
-        for categoria, nombre in Producto.CATEGORIA_CHOICES:
-            productos = Producto.objects.filter(categoria=categoria, activo=True)
-            if productos.exists():
-                serializer = ProductoListSerializer(productos, many=True)
-                categorias[nombre] = serializer.data
+        datos = ProductoListSerializer(Producto.objects.filter(activo=True), many=True).data
+        por_categoria = {}
+        for producto in datos:
+            por_categoria.setdefault(producto['categoria'], []).append(producto)
         
+        categorias = {
+            nombre: por_categoria[categoria]
+            for categoria, nombre in Producto.CATEGORIA_CHOICES
+            if categoria in por_categoria
+        }
         return Response(categorias)
     
     @action(detail=False, methods=['get'])
+    @cachear_respuesta(GRUPO_BAJO_STOCK)
     def bajo_stock(self, request):
         """
         Endpoint: /api/productos/bajo_stock/
@@ -76,33 +89,65 @@ class ProductoViewSet(viewsets.ModelViewSet):
     def estadisticas(self, request):
         """
         Endpoint: /api/productos/estadisticas/
-        Estadísticas del inventario
+        Estadísticas del inventario, leídas de las fotos diarias de
+        apps.reportes (la más reciente de cada categoría). total_productos y
+        el detalle por categoría cuentan los productos activos; el valor del
+        inventario y los productos sin stock o bajo el mínimo, todos.
+        
+        Con fecha_desde / fecha_hasta (YYYY-MM-DD) incluye la tendencia
+        diaria tomada de las fotos de inventario de apps.reportes
         """
+        fechas = {}
+        for parametro in ('fecha_desde', 'fecha_hasta'):
+            valor = request.query_params.get(parametro)
+            if valor:
+                try:
+                    fechas[parametro] = parse_date(valor)
+                except ValueError:
+                    fechas[parametro] = None
+                if fechas[parametro] is None:
+                    return Response({
+                        'error': f'Parámetro "{parametro}" inválido, use el formato YYYY-MM-DD'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Última foto de cada categoría (ver apps.reportes): una consulta
+        # sin recorrer los productos
+        por_categoria = {foto.categoria: foto for foto in EstadisticaDiariaInventario.actuales()}
+        ultimas = por_categoria.values()
+        
         stats = {
             'resumen': {
-                'total_productos': Producto.objects.filter(activo=True).count(),
-                'valor_inventario': Producto.objects.aggregate(
-                    total=Sum('precio_compra') * Sum('stock')
-                )['total'] or 0,
-                'productos_sin_stock': Producto.objects.filter(stock=0).count(),
-                'productos_bajo_stock': Producto.objects.filter(
-                    stock__lte=F('stock_minimo')
-                ).count(),
+                'total_productos': sum(foto.total_productos for foto in ultimas),
+                'valor_inventario': sum(foto.valor_inventario + foto.valor_inventario_inactivos for foto in ultimas),
+                'productos_sin_stock': sum(foto.productos_sin_stock + foto.sin_stock_inactivos for foto in ultimas),
+                'productos_bajo_stock': sum(foto.productos_bajo_stock + foto.bajo_stock_inactivos for foto in ultimas),
             },
             'por_categoria': []
         }
         
-        # Estadísticas por categoría
         for categoria, nombre in Producto.CATEGORIA_CHOICES:
-            productos = Producto.objects.filter(categoria=categoria, activo=True)
-            if productos.exists():
+            foto = por_categoria.get(categoria)
+            if foto and foto.total_productos:
                 stats['por_categoria'].append({
                     'categoria': nombre,
-                    'total': productos.count(),
-                    'stock_total': productos.aggregate(Sum('stock'))['stock__sum'] or 0,
-                    'precio_promedio': productos.aggregate(Avg('precio_venta'))['precio_venta__avg'] or 0
+                    'total': foto.total_productos,
+                    'stock_total': foto.stock_total,
+                    'precio_promedio': foto.suma_precio_venta / foto.total_productos,
+                    'valor_inventario': foto.valor_inventario
                 })
         
+        # Tendencia diaria desde las fotos de inventario (solo días con cambios)
+        if fechas:
+            fotos = EstadisticaDiariaInventario.objects.all()
+            if 'fecha_desde' in fechas:
+                fotos = fotos.filter(fecha__gte=fechas['fecha_desde'])
+            if 'fecha_hasta' in fechas:
+                fotos = fotos.filter(fecha__lte=fechas['fecha_hasta'])
+            stats['tendencia'] = fotos.order_by('fecha', 'categoria').values(
+                'fecha', 'categoria', 'total_productos', 'stock_total',
+                'valor_inventario', 'productos_sin_stock', 'productos_bajo_stock'
+            )
+        
         return Response(stats)
     
     @action(detail=True, methods=['patch'])
@@ -115,10 +160,15 @@ class ProductoViewSet(viewsets.ModelViewSet):
         serializer = ProductoStockSerializer(producto, data=request.data, partial=True)
         
         if serializer.is_valid():
-            serializer.save()
+            if 'stock' not in serializer.validated_data:
+                return Response({'stock': ['Este campo es requerido.']}, status=status.HTTP_400_BAD_REQUEST)
+            stock_anterior = producto.ajustar_stock(
+                serializer.validated_data['stock'],
+                usuario=request.user
+            )
             return Response({
                 'mensaje': f'Stock actualizado para {producto.nombre}',
-                'stock_anterior': producto.stock,
+                'stock_anterior': stock_anterior,
                 'stock_nuevo': serializer.validated_data['stock']
             })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -130,9 +180,16 @@ class ProductoViewSet(viewsets.ModelViewSet):
         Reducir stock cuando se vende un producto
         """
         producto = self.get_object()
-        cantidad = request.data.get('cantidad', 1)
+        try:
+            cantidad = int(request.data.get('cantidad', 1))
+        except (TypeError, ValueError):
+            cantidad = 0
+        if cantidad < 1:
+            return Response({
+                'error': 'La cantidad debe ser un número entero mayor que cero'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        if producto.reducir_stock(cantidad):
+        if producto.reducir_stock(cantidad, usuario=request.user):
             return Response({
                 'mensaje': f'Stock reducido en {cantidad} unidades',
                 'stock_actual': producto.stock
@@ -140,4 +197,98 @@ class ProductoViewSet(viewsets.ModelViewSet):
         else:
             return Response({
                 'error': 'No hay suficiente stock disponible'
-            }, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'])
+    def movimientos_stock(self, request):
+        """
+        Endpoint: /api/productos/movimientos_stock/
+        Reducir el stock de varios productos en una sola operación (venta completa)
+        
+        Recibe una lista [{"producto_id": 1, "cantidad": 2}, ...]. Se aplican
+        todos los descuentos o ninguno, y se retorna el resultado por ítem.
+        """
+        serializer = MovimientoStockSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        if not serializer.validated_data:
+            return Response({
+                'error': 'Debe enviar al menos un movimiento'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Un producto repetido en la lista se descuenta una sola vez por el total
+        cantidades = {}
+        for item in serializer.validated_data:
+            cantidades[item['producto_id']] = cantidades.get(item['producto_id'], 0) + item['cantidad']
+        
+        aplicado, productos = Producto.reducir_stock_lote(cantidades, usuario=request.user)
+        
+        resultados = []
+        for producto_id, cantidad in cantidades.items():
+            producto = productos.get(producto_id)
+            resultado = {
+                'producto_id': producto_id,
+                'cantidad': cantidad,
+                'aplicado': aplicado
+            }
+            if producto is None:
+                resultado['error'] = 'Producto no encontrado'
+            else:
+                resultado['nombre'] = producto['nombre']
+                resultado['stock_actual'] = producto['stock']
+                if not aplicado and producto['stock'] < cantidad:
+                    resultado['error'] = 'No hay suficiente stock disponible'
+            resultados.append(resultado)
+        
+        if aplicado:
+            return Response({
+                'mensaje': f'Stock reducido para {len(cantidades)} productos',
+                'resultados': resultados
+            })
+        return Response({
+            'error': 'No se aplicó ningún movimiento',
+            'resultados': resultados
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['get'])
+    def historial_stock(self, request, pk=None):
+        """
+        Endpoint: /api/productos/{id}/historial_stock/
+        Movimientos de stock (kardex) del producto, del más reciente al más antiguo
+        """
+        producto = self.get_object()
+        movimientos = producto.movimientos_stock.select_related('usuario').order_by('-fecha', '-id')
+        
+        page = self.paginate_queryset(movimientos)
+        if page is not None:
+            serializer = HistorialStockSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = HistorialStockSerializer(movimientos, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def stock_en_fecha(self, request, pk=None):
+        """
+        Endpoint: /api/productos/{id}/stock_en_fecha/?fecha=YYYY-MM-DD
+        Stock que tenía el producto al final del día (o en la fecha y hora ISO) indicada
+        """
+        producto = self.get_object()
+        valor = request.query_params.get('fecha', '')
+        
+        try:
+            dia = parse_date(valor)
+            momento = datetime.combine(dia, time.max) if dia else parse_datetime(valor)
+        except ValueError:
+            momento = None
+        if momento is None:
+            return Response({
+                'error': 'Parámetro "fecha" requerido (YYYY-MM-DD o fecha y hora ISO)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(momento):
+            momento = timezone.make_aware(momento)
+        
+        return Response({
+            'producto': producto.nombre,
+            'fecha': momento,
+            'stock': producto.stock_en_fecha(momento)
+        })
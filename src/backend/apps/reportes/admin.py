@@ -0,0 +1,38 @@
+from django.contrib import admin
+from .models import EstadisticaDiariaPrescripcion, EstadisticaDiariaInventario
+
+
+@admin.register(EstadisticaDiariaPrescripcion)
+class EstadisticaDiariaPrescripcionAdmin(admin.ModelAdmin):
+    list_display = (
+        'fecha', 'profesional', 'total', 'vigentes',
+        'con_astigmatismo', 'con_presbicia'
+    )
+    list_filter = ('profesional',)
+    date_hierarchy = 'fecha'
+    ordering = ('-fecha',)
+    
+    def has_add_permission(self, request):
+        # Las estadísticas se calculan automáticamente
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(EstadisticaDiariaInventario)
+class EstadisticaDiariaInventarioAdmin(admin.ModelAdmin):
+    list_display = (
+        'fecha', 'categoria', 'total_productos', 'stock_total',
+        'valor_inventario', 'productos_sin_stock', 'productos_bajo_stock'
+    )
+    list_filter = ('categoria',)
+    date_hierarchy = 'fecha'
+    ordering = ('-fecha', 'categoria')
+    
+    def has_add_permission(self, request):
+        # Las estadísticas se calculan automáticamente
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class ReportesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.reportes'
+    verbose_name = 'Reportes y Estadísticas'
+    
+    def ready(self):
+        # Conecta las señales que mantienen las tablas de estadísticas
+        from . import signals  # noqa: F401
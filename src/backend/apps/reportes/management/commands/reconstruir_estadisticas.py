@@ -0,0 +1,39 @@
+"""
+Reconstruye las tablas de estadísticas diarias desde los datos originales
+
+Uso:
+    python manage.py reconstruir_estadisticas
+    python manage.py reconstruir_estadisticas --desde 2025-01-01 --hasta 2025-12-31
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from apps.reportes.models import EstadisticaDiariaPrescripcion, EstadisticaDiariaInventario
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye las estadísticas diarias de prescripciones e inventario'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial de examen (YYYY-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final de examen (YYYY-MM-DD)')
+    
+    def handle(self, *args, **options):
+        desde = self._fecha(options['desde'], '--desde')
+        hasta = self._fecha(options['hasta'], '--hasta')
+        
+        filas = EstadisticaDiariaPrescripcion.reconstruir(desde=desde, hasta=hasta)
+        self.stdout.write(f'Estadísticas de prescripciones: {filas} filas')
+        
+        # El inventario solo se puede reconstruir para el estado actual
+        categorias = EstadisticaDiariaInventario.reconstruir()
+        self.stdout.write(f'Estadísticas de inventario: {categorias} categorías')
+        
+        self.stdout.write(self.style.SUCCESS('Estadísticas reconstruidas'))
+    
+    def _fecha(self, valor, nombre):
+        if not valor:
+            return None
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise CommandError(f'{nombre} inválido, use el formato YYYY-MM-DD')
+        return fecha
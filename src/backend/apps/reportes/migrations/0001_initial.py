@@ -0,0 +1,117 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:54
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def poblar_estadisticas(apps, schema_editor):
+    """Carga inicial de las estadísticas a partir de los datos existentes"""
+    from datetime import date
+    from django.db.models import Count, Q, Sum, F
+
+    Prescripcion = apps.get_model('prescripciones', 'Prescripcion')
+    Producto = apps.get_model('productos', 'Producto')
+    EstadisticaDiariaPrescripcion = apps.get_model('reportes', 'EstadisticaDiariaPrescripcion')
+    EstadisticaDiariaInventario = apps.get_model('reportes', 'EstadisticaDiariaInventario')
+
+    filas = Prescripcion.objects.order_by().values('fecha_examen', 'profesional_id').annotate(
+        total=Count('id'),
+        vigentes=Count('id', filter=Q(vigente=True)),
+        con_astigmatismo=Count('id', filter=(
+            Q(od_cilindro__gt=0) | Q(od_cilindro__lt=0) |
+            Q(os_cilindro__gt=0) | Q(os_cilindro__lt=0)
+        )),
+        con_presbicia=Count('id', filter=Q(adicion__gt=0)),
+    )
+    EstadisticaDiariaPrescripcion.objects.bulk_create([
+        EstadisticaDiariaPrescripcion(
+            fecha=fila['fecha_examen'],
+            profesional_id=fila['profesional_id'],
+            total=fila['total'],
+            vigentes=fila['vigentes'],
+            con_astigmatismo=fila['con_astigmatismo'],
+            con_presbicia=fila['con_presbicia'],
+        )
+        for fila in filas.iterator()
+    ], batch_size=1000)
+
+    categorias = Producto.objects.filter(activo=True).order_by().values('categoria').annotate(
+        total_productos=Count('id'),
+        stock_total=Sum('stock'),
+        valor_inventario=Sum(
+            F('precio_compra') * F('stock'),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2)
+        ),
+        productos_sin_stock=Count('id', filter=Q(stock=0)),
+        productos_bajo_stock=Count('id', filter=Q(stock__lte=F('stock_minimo'))),
+    )
+    EstadisticaDiariaInventario.objects.bulk_create([
+        EstadisticaDiariaInventario(fecha=date.today(), **fila)
+        for fila in categorias
+    ])
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('prescripciones', '0002_secuenciaprescripcion'),
+        ('productos', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaDiariaInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('categoria', models.CharField(choices=[('MONTURA', 'Montura'), ('LENTE', 'Lente'), ('ACCESORIO', 'Accesorio'), ('LIMPIEZA', 'Producto de Limpieza'), ('ESTUCHE', 'Estuche'), ('OTROS', 'Otros')], max_length=20, verbose_name='Categoría')),
+                ('total_productos', models.PositiveIntegerField(default=0)),
+                ('stock_total', models.PositiveIntegerField(default=0)),
+                ('valor_inventario', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Suma de precio de compra por stock', max_digits=14)),
+                ('productos_sin_stock', models.PositiveIntegerField(default=0)),
+                ('productos_bajo_stock', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Estadística Diaria de Inventario',
+                'verbose_name_plural': 'Estadísticas Diarias de Inventario',
+                'db_table': 'estadisticas_diarias_inventario',
+                'ordering': ['-fecha', 'categoria'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EstadisticaDiariaPrescripcion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha del Examen')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('vigentes', models.PositiveIntegerField(default=0)),
+                ('con_astigmatismo', models.PositiveIntegerField(default=0)),
+                ('con_presbicia', models.PositiveIntegerField(default=0)),
+                ('profesional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas_prescripciones', to=settings.AUTH_USER_MODEL, verbose_name='Profesional')),
+            ],
+            options={
+                'verbose_name': 'Estadística Diaria de Prescripciones',
+                'verbose_name_plural': 'Estadísticas Diarias de Prescripciones',
+                'db_table': 'estadisticas_diarias_prescripciones',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='estadisticadiariainventario',
+            constraint=models.UniqueConstraint(fields=('fecha', 'categoria'), name='estadistica_inventario_fecha_categoria_unica'),
+        ),
+        migrations.AddIndex(
+            model_name='estadisticadiariaprescripcion',
+            index=models.Index(fields=['profesional', 'fecha'], name='estadistica_profesi_26b891_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='estadisticadiariaprescripcion',
+            constraint=models.UniqueConstraint(fields=('fecha', 'profesional'), name='estadistica_prescripcion_fecha_profesional_unica'),
+        ),
+        migrations.RunPython(poblar_estadisticas, migrations.RunPython.noop),
+    ]
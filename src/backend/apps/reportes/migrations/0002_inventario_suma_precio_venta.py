@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:53
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_suma_precio_venta(apps, schema_editor):
+    """
+    suma_precio_venta de la última foto de cada categoría, desde los
+    productos activos (las fotos anteriores quedan en cero)
+    """
+    EstadisticaDiariaInventario = apps.get_model('reportes', 'EstadisticaDiariaInventario')
+    Producto = apps.get_model('productos', 'Producto')
+    ultima = EstadisticaDiariaInventario.objects.filter(
+        categoria=OuterRef('categoria')
+    ).order_by('-fecha').values('fecha')[:1]
+    suma = Producto.objects.filter(
+        activo=True, categoria=OuterRef('categoria')
+    ).order_by().values('categoria').annotate(suma=Sum('precio_venta')).values('suma')
+    EstadisticaDiariaInventario.objects.filter(fecha=Subquery(ultima)).update(
+        suma_precio_venta=Coalesce(
+            Subquery(suma), Value(Decimal('0.00')), output_field=models.DecimalField(max_digits=14, decimal_places=2)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0001_initial'),
+        ('productos', '0003_indice_orden_listado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadisticadiariainventario',
+            name='suma_precio_venta',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Para el precio de venta promedio', max_digits=14),
+        ),
+        migrations.RunPython(calcular_suma_precio_venta, migrations.RunPython.noop),
+    ]
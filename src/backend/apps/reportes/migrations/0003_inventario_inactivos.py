@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:10
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+def calcular_inactivos(apps, schema_editor):
+    """
+    Campos *_inactivos de la última foto de cada categoría. Una categoría
+    sin fotos se completa con el comando reconstruir_estadisticas.
+    """
+    EstadisticaDiariaInventario = apps.get_model('reportes', 'EstadisticaDiariaInventario')
+    Producto = apps.get_model('productos', 'Producto')
+    filas = Producto.objects.filter(activo=False).order_by().values('categoria').annotate(
+        valor=Sum(F('precio_compra') * F('stock'), output_field=models.DecimalField(max_digits=14, decimal_places=2)),
+        sin_stock=Count('id', filter=Q(stock=0)),
+        bajo_stock=Count('id', filter=Q(stock__lte=F('stock_minimo'))),
+    )
+    for fila in filas:
+        ultima = EstadisticaDiariaInventario.objects.filter(categoria=fila['categoria']).order_by('-fecha').first()
+        if ultima is not None:
+            ultima.valor_inventario_inactivos = fila['valor'] or 0
+            ultima.sin_stock_inactivos = fila['sin_stock']
+            ultima.bajo_stock_inactivos = fila['bajo_stock']
+            ultima.save(update_fields=['valor_inventario_inactivos', 'sin_stock_inactivos', 'bajo_stock_inactivos'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0002_inventario_suma_precio_venta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadisticadiariainventario',
+            name='bajo_stock_inactivos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='estadisticadiariainventario',
+            name='sin_stock_inactivos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='estadisticadiariainventario',
+            name='valor_inventario_inactivos',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Suma de precio de compra por stock de los productos inactivos', max_digits=14),
+        ),
+        migrations.RunPython(calcular_inactivos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,403 @@
+"""
+Tablas de estadísticas precalculadas (rollups diarios)
+
+Los endpoints de estadísticas leen de estas tablas en lugar de recorrer
+todas las filas de prescripciones y productos. Se mantienen al día con
+señales (ver signals.py): cada guardado suma la diferencia de sus aportes
+con un UPDATE ... SET campo = campo + n, en la misma transacción que el
+cambio, y los cambios masivos recalculan sus grupos con una consulta
+agrupada. Se pueden reconstruir con:
+
+    python manage.py reconstruir_estadisticas
+"""
+from datetime import date
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, OuterRef, Q, Subquery, Sum, F
+from django.contrib.auth.models import User
+from apps.prescripciones.models import Prescripcion
+from apps.productos.models import Producto
+
+
+def _sumar(modelo, cambio, **clave):
+    """
+    Suma `cambio` ({campo: diferencia}) a la fila `clave` con F(). Las
+    restas solo se aplican si no dejan contadores negativos. Retorna False
+    si no se aplicó (la fila no existe o no coincide con los datos).
+    """
+    restas = {f'{campo}__gte': -valor for campo, valor in cambio.items() if valor < 0}
+    return bool(modelo.objects.filter(**clave, **restas).update(
+        **{campo: F(campo) + valor for campo, valor in cambio.items()}
+    ))
+
+
+def _crear_o_sumar(modelo, valores, cambio, **clave):
+    """
+    INSERT de la fila con `valores` y, si otra transacción la creó primero,
+    UPDATE sumando `cambio`. Sin leer antes de escribir, así que en SQLite no
+    falla con "database is locked" cuando hay escrituras simultáneas.
+    """
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**clave, **valores)
+    except IntegrityError:
+        modelo.objects.filter(**clave).update(
+            **{campo: F(campo) + valor for campo, valor in cambio.items()}
+        )
+
+
+class EstadisticaDiariaPrescripcion(models.Model):
+    """
+    Contadores de prescripciones por fecha de examen y profesional
+    """
+    
+    fecha = models.DateField(
+        verbose_name='Fecha del Examen'
+    )
+    profesional = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='estadisticas_prescripciones',
+        verbose_name='Profesional'
+    )
+    total = models.PositiveIntegerField(default=0)
+    vigentes = models.PositiveIntegerField(default=0)
+    con_astigmatismo = models.PositiveIntegerField(default=0)
+    con_presbicia = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'estadisticas_diarias_prescripciones'
+        verbose_name = 'Estadística Diaria de Prescripciones'
+        verbose_name_plural = 'Estadísticas Diarias de Prescripciones'
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'profesional'],
+                name='estadistica_prescripcion_fecha_profesional_unica'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['profesional', 'fecha']),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} - {self.profesional}: {self.total}"
+    
+    @staticmethod
+    def _contadores():
+        """Expresiones de agregación sobre Prescripcion"""
+        return {
+            'total': Count('id'),
+            'vigentes': Count('id', filter=Q(vigente=True)),
+            'con_astigmatismo': Count('id', filter=(
+                Q(od_cilindro__gt=0) | Q(od_cilindro__lt=0) |
+                Q(os_cilindro__gt=0) | Q(os_cilindro__lt=0)
+            )),
+            'con_presbicia': Count('id', filter=Q(adicion__gt=0)),
+        }
+    
+    @staticmethod
+    def aporte(prescripcion):
+        """
+        Lo que suma una prescripción a los contadores de su grupo; None si
+        algún campo no está cargado (campo diferido)
+        """
+        valores = prescripcion.__dict__
+        if any(campo not in valores for campo in ('vigente', 'od_cilindro', 'os_cilindro', 'adicion')):
+            return None
+        return {
+            'total': 1,
+            'vigentes': int(bool(valores['vigente'])),
+            'con_astigmatismo': int(bool(valores['od_cilindro'] or valores['os_cilindro'])),
+            'con_presbicia': int(valores['adicion'] is not None and valores['adicion'] > 0),
+        }
+    
+    @classmethod
+    def sumar(cls, fecha, profesional_id, cambio):
+        """
+        Suma a la fila del grupo la diferencia de contadores `cambio`. Si la
+        fila no existe (y el cambio resta) o se quedaría en negativo, el
+        grupo se recalcula desde las prescripciones.
+        """
+        cambio = {campo: valor for campo, valor in cambio.items() if valor}
+        if not cambio:
+            return
+        clave = {'fecha': fecha, 'profesional_id': profesional_id}
+        if _sumar(cls, cambio, **clave):
+            if cambio.get('total', 0) < 0:
+                cls.objects.filter(total=0, **clave).delete()
+        elif all(valor > 0 for valor in cambio.values()):
+            _crear_o_sumar(cls, cambio, cambio, **clave)
+        else:
+            cls.recalcular(fecha, profesional_id)
+    
+    @classmethod
+    def recalcular(cls, fecha, profesional_id):
+        """Recalcula la fila de un día y profesional a partir de las prescripciones"""
+        cls.recalcular_grupos({(fecha, profesional_id)})
+    
+    @classmethod
+    def recalcular_grupos(cls, grupos):
+        """
+        Recalcula las filas de los grupos {(fecha, profesional_id)} con una
+        consulta agrupada y un solo INSERT ... ON CONFLICT DO UPDATE
+        """
+        grupos = {grupo for grupo in grupos if None not in grupo}
+        if not grupos:
+            return
+        filas = Prescripcion.objects.filter(
+            fecha_examen__in={fecha for fecha, _ in grupos},
+            profesional_id__in={profesional_id for _, profesional_id in grupos}
+        ).order_by().values('fecha_examen', 'profesional_id').annotate(**cls._contadores())
+        
+        nuevas = [
+            cls(fecha=fila.pop('fecha_examen'), profesional_id=fila.pop('profesional_id'), **fila)
+            for fila in filas if (fila['fecha_examen'], fila['profesional_id']) in grupos
+        ]
+        cls.objects.bulk_create(
+            nuevas, update_conflicts=True,
+            unique_fields=['fecha', 'profesional'], update_fields=list(cls._contadores())
+        )
+        
+        vacios = grupos - {(fila.fecha, fila.profesional_id) for fila in nuevas}
+        if vacios:
+            cls.objects.filter(reduce(or_, (
+                Q(fecha=fecha, profesional_id=profesional_id) for fecha, profesional_id in vacios
+            ))).delete()
+    
+    @classmethod
+    def reconstruir(cls, desde=None, hasta=None):
+        """Reconstruye las filas del rango indicado (todas si no se indica) y retorna cuántas creó"""
+        prescripciones = Prescripcion.objects.all()
+        existentes = cls.objects.all()
+        if desde:
+            prescripciones = prescripciones.filter(fecha_examen__gte=desde)
+            existentes = existentes.filter(fecha__gte=desde)
+        if hasta:
+            prescripciones = prescripciones.filter(fecha_examen__lte=hasta)
+            existentes = existentes.filter(fecha__lte=hasta)
+        
+        filas = prescripciones.order_by().values(
+            'fecha_examen', 'profesional_id'
+        ).annotate(**cls._contadores())
+        
+        with transaction.atomic():
+            existentes.delete()
+            creadas = cls.objects.bulk_create([
+                cls(
+                    fecha=fila.pop('fecha_examen'),
+                    profesional_id=fila.pop('profesional_id'),
+                    **fila
+                )
+                for fila in filas.iterator()
+            ], batch_size=1000)
+        
+        return len(creadas)
+
+
+class EstadisticaDiariaInventario(models.Model):
+    """
+    Foto diaria del inventario activo por categoría
+    
+    Se guarda una fila por día en que hubo cambios; el estado de un día sin
+    fila es el de la fila anterior más reciente de esa categoría. Los
+    campos *_inactivos llevan lo mismo para los productos inactivos, que el
+    resumen de /api/productos/estadisticas/ incluye en el valor del
+    inventario y en los productos sin stock o bajo el mínimo.
+    """
+    
+    fecha = models.DateField(
+        verbose_name='Fecha'
+    )
+    categoria = models.CharField(
+        max_length=20,
+        choices=Producto.CATEGORIA_CHOICES,
+        verbose_name='Categoría'
+    )
+    total_productos = models.PositiveIntegerField(default=0)
+    stock_total = models.PositiveIntegerField(default=0)
+    valor_inventario = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text='Suma de precio de compra por stock'
+    )
+    suma_precio_venta = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text='Para el precio de venta promedio'
+    )
+    productos_sin_stock = models.PositiveIntegerField(default=0)
+    productos_bajo_stock = models.PositiveIntegerField(default=0)
+    valor_inventario_inactivos = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text='Suma de precio de compra por stock de los productos inactivos'
+    )
+    sin_stock_inactivos = models.PositiveIntegerField(default=0)
+    bajo_stock_inactivos = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'estadisticas_diarias_inventario'
+        verbose_name = 'Estadística Diaria de Inventario'
+        verbose_name_plural = 'Estadísticas Diarias de Inventario'
+        ordering = ['-fecha', 'categoria']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'categoria'],
+                name='estadistica_inventario_fecha_categoria_unica'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} - {self.categoria}: {self.stock_total}"
+    
+    @staticmethod
+    def _contadores():
+        """
+        Expresiones de agregación por categoría, filtradas a los productos
+        activos (o inactivos en los campos *_inactivos). El valor del
+        inventario es la suma de precio de compra por stock de cada producto
+        (no la suma de precios por la suma de stocks).
+        """
+        activo = Q(activo=True)
+        inactivo = Q(activo=False)
+        valor = F('precio_compra') * F('stock')
+        return {
+            'total_productos': Count('id', filter=activo),
+            'stock_total': Sum('stock', filter=activo),
+            'valor_inventario': Sum(
+                valor, filter=activo,
+                output_field=models.DecimalField(max_digits=14, decimal_places=2)
+            ),
+            'suma_precio_venta': Sum('precio_venta', filter=activo),
+            'productos_sin_stock': Count('id', filter=activo & Q(stock=0)),
+            'productos_bajo_stock': Count('id', filter=activo & Q(stock__lte=F('stock_minimo'))),
+            'valor_inventario_inactivos': Sum(
+                valor, filter=inactivo,
+                output_field=models.DecimalField(max_digits=14, decimal_places=2)
+            ),
+            'sin_stock_inactivos': Count('id', filter=inactivo & Q(stock=0)),
+            'bajo_stock_inactivos': Count('id', filter=inactivo & Q(stock__lte=F('stock_minimo'))),
+        }
+    
+    CONTADORES = (
+        'total_productos', 'stock_total', 'valor_inventario', 'suma_precio_venta',
+        'productos_sin_stock', 'productos_bajo_stock',
+        'valor_inventario_inactivos', 'sin_stock_inactivos', 'bajo_stock_inactivos',
+    )
+    
+    @classmethod
+    def aporte(cls, estado):
+        """
+        Lo que suma un producto (dict con activo, stock, precio_compra,
+        precio_venta y stock_minimo) a la foto de su categoría
+        """
+        aporte = dict.fromkeys(cls.CONTADORES, 0)
+        if not estado:
+            return aporte
+        valor = estado['precio_compra'] * estado['stock']
+        sin_stock = int(estado['stock'] == 0)
+        bajo_stock = int(estado['stock'] <= estado['stock_minimo'])
+        if estado['activo']:
+            aporte.update({
+                'total_productos': 1,
+                'stock_total': estado['stock'],
+                'valor_inventario': valor,
+                'suma_precio_venta': estado['precio_venta'],
+                'productos_sin_stock': sin_stock,
+                'productos_bajo_stock': bajo_stock,
+            })
+        else:
+            aporte.update({
+                'valor_inventario_inactivos': valor,
+                'sin_stock_inactivos': sin_stock,
+                'bajo_stock_inactivos': bajo_stock,
+            })
+        return aporte
+    
+    @classmethod
+    def registrar_cambios(cls, cambios, fecha=None):
+        """
+        Aplica a la foto del día los cambios [(anterior, actual)] de
+        productos (estados como en aporte(), con categoría; None si el
+        producto no existía o ya no existe): un UPDATE por categoría
+        """
+        por_categoria = {}
+        for anterior, actual in cambios:
+            for estado, signo in ((anterior, -1), (actual, 1)):
+                if estado is None:
+                    continue
+                suma = por_categoria.setdefault(estado['categoria'], dict.fromkeys(cls.CONTADORES, 0))
+                for campo, valor in cls.aporte(estado).items():
+                    suma[campo] += signo * valor
+        for categoria, cambio in por_categoria.items():
+            cls.sumar(categoria, cambio, fecha)
+    
+    @classmethod
+    def sumar(cls, categoria, cambio, fecha=None):
+        """
+        Suma `cambio` a la foto del día de la categoría. El primer cambio
+        del día parte de la foto anterior; sin foto anterior (o si los
+        contadores quedarían negativos) se recalcula la categoría.
+        """
+        cambio = {campo: valor for campo, valor in cambio.items() if valor}
+        if not cambio:
+            return
+        fecha = fecha or date.today()
+        if _sumar(cls, cambio, fecha=fecha, categoria=categoria):
+            return
+        if cls.objects.filter(fecha=fecha, categoria=categoria).exists():
+            cls.recalcular(categoria, fecha)
+            return
+        
+        anterior = cls.objects.filter(
+            categoria=categoria, fecha__lt=fecha
+        ).order_by('-fecha').values(*cls.CONTADORES).first()
+        valores = anterior and {campo: anterior[campo] + cambio.get(campo, 0) for campo in cls.CONTADORES}
+        if valores is None or any(valor < 0 for valor in valores.values()):
+            cls.recalcular(categoria, fecha)
+        else:
+            _crear_o_sumar(cls, valores, cambio, fecha=fecha, categoria=categoria)
+    
+    @classmethod
+    def recalcular(cls, categoria, fecha=None):
+        """Actualiza la foto del día (hoy por defecto) para una categoría"""
+        cls.reconstruir(fecha, categorias=[categoria])
+    
+    @classmethod
+    def reconstruir(cls, fecha=None, categorias=None):
+        """
+        Regenera la foto de las categorías (todas por defecto) para la fecha
+        (hoy por defecto) con una consulta agrupada y un solo INSERT ... ON
+        CONFLICT DO UPDATE. Retorna cuántas categorías actualizó.
+        """
+        fecha = fecha or date.today()
+        categorias = categorias or [categoria for categoria, _ in Producto.CATEGORIA_CHOICES]
+        filas = {
+            fila.pop('categoria'): fila
+            for fila in Producto.objects.filter(
+                categoria__in=categorias
+            ).order_by().values('categoria').annotate(**cls._contadores())
+        }
+        vacia = dict.fromkeys(cls.CONTADORES, 0)
+        cls.objects.bulk_create(
+            [
+                cls(fecha=fecha, categoria=categoria, **{
+                    campo: valor or 0 for campo, valor in filas.get(categoria, vacia).items()
+                })
+                for categoria in categorias
+            ],
+            update_conflicts=True, unique_fields=['fecha', 'categoria'], update_fields=list(cls.CONTADORES)
+        )
+        return len(categorias)
+    
+    @classmethod
+    def actuales(cls):
+        """Última foto de cada categoría (el estado actual del inventario)"""
+        ultima = cls.objects.filter(categoria=OuterRef('categoria')).order_by('-fecha').values('fecha')[:1]
+        return cls.objects.filter(fecha=Subquery(ultima))
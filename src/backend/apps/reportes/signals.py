@@ -0,0 +1,101 @@
+"""
+Señales que mantienen las estadísticas diarias al día
+
+Cada guardado o eliminación suma a su grupo (día + profesional para
+prescripciones, categoría para productos) la diferencia entre lo que la
+fila aportaba antes y lo que aporta ahora, con F() y dentro de la
+transacción del cambio. Si un cambio mueve la fila a otro grupo, resta del
+grupo de origen y suma al nuevo.
+
+El estado anterior de una prescripción es la copia guardada en post_init
+(sin consultas adicionales); el de un producto lo lee Producto.save() con
+la fila bloqueada. Los cambios masivos de prescripciones recalculan sus
+grupos con una consulta agrupada.
+"""
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from apps.prescripciones.models import Prescripcion
+from apps.prescripciones.signals import prescripciones_actualizadas
+from apps.productos.models import Producto
+from apps.productos.signals import stock_actualizado
+from .models import EstadisticaDiariaPrescripcion, EstadisticaDiariaInventario
+
+
+def _estado_prescripcion(instance):
+    grupo = (instance.__dict__.get('fecha_examen'), instance.__dict__.get('profesional_id'))
+    return grupo, EstadisticaDiariaPrescripcion.aporte(instance)
+
+
+def _negativo(aporte):
+    return {campo: -valor for campo, valor in aporte.items()}
+
+
+@receiver(post_init, sender=Prescripcion)
+def guardar_estado_prescripcion(sender, instance, **kwargs):
+    instance._estado_estadistica = _estado_prescripcion(instance)
+
+
+@receiver(post_save, sender=Prescripcion)
+def actualizar_estadistica_prescripcion(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    grupo, aporte = _estado_prescripcion(instance)
+    grupo_anterior, aporte_anterior = getattr(instance, '_estado_estadistica', ((None, None), None))
+
+    if aporte is None or (not created and (aporte_anterior is None or None in grupo_anterior)):
+        # Campos sin cargar: no se conoce la diferencia
+        EstadisticaDiariaPrescripcion.recalcular_grupos({grupo, grupo_anterior})
+    elif created:
+        EstadisticaDiariaPrescripcion.sumar(*grupo, aporte)
+    elif grupo == grupo_anterior:
+        EstadisticaDiariaPrescripcion.sumar(*grupo, {
+            campo: aporte[campo] - aporte_anterior[campo] for campo in aporte
+        })
+    else:
+        EstadisticaDiariaPrescripcion.sumar(*grupo_anterior, _negativo(aporte_anterior))
+        EstadisticaDiariaPrescripcion.sumar(*grupo, aporte)
+    instance._estado_estadistica = (grupo, aporte)
+
+
+@receiver(post_delete, sender=Prescripcion)
+def eliminar_estadistica_prescripcion(sender, instance, **kwargs):
+    grupo, aporte = _estado_prescripcion(instance)
+    if aporte is None:
+        EstadisticaDiariaPrescripcion.recalcular_grupos({grupo})
+    else:
+        EstadisticaDiariaPrescripcion.sumar(*grupo, _negativo(aporte))
+
+
+@receiver(prescripciones_actualizadas, sender=Prescripcion)
+def actualizar_estadisticas_masivas(sender, afectadas, **kwargs):
+    EstadisticaDiariaPrescripcion.recalcular_grupos(afectadas)
+
+
+@receiver(post_save, sender=Producto)
+def actualizar_estadistica_inventario(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    campos = Producto.CAMPOS_INVENTARIO
+    if update_fields is not None:
+        campos = [campo for campo in campos if campo in update_fields]
+        if not campos:
+            return
+
+    anterior = None if created else getattr(instance, '_inventario_anterior', None)
+    if anterior is None and not created:
+        # Guardado sin pasar por Producto.save() (no debería ocurrir)
+        EstadisticaDiariaInventario.recalcular(instance.categoria)
+        return
+    actual = {**(anterior or {}), **{campo: getattr(instance, campo) for campo in campos}}
+    EstadisticaDiariaInventario.registrar_cambios([(anterior, actual)])
+
+
+@receiver(post_delete, sender=Producto)
+def eliminar_estadistica_inventario(sender, instance, **kwargs):
+    anterior = {campo: getattr(instance, campo) for campo in Producto.CAMPOS_INVENTARIO}
+    EstadisticaDiariaInventario.registrar_cambios([(anterior, None)])
+
+
+@receiver(stock_actualizado, sender=Producto)
+def actualizar_estadisticas_stock(sender, cambios, **kwargs):
+    EstadisticaDiariaInventario.registrar_cambios(cambios)
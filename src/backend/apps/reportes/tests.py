@@ -0,0 +1,243 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from apps.pacientes.models import Paciente
+from apps.prescripciones.models import Prescripcion
+from apps.prescripciones.tasks import marcar_vencidas
+from apps.productos.models import Producto
+from .models import EstadisticaDiariaPrescripcion, EstadisticaDiariaInventario
+
+
+class EstadisticaDiariaPrescripcionTest(TestCase):
+    """
+    Pruebas de mantenimiento de las estadísticas diarias de prescripciones
+    """
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.profesional = User.objects.create_user(username='optometra1')
+        self.paciente = Paciente.objects.create(
+            numero_documento='12345678',
+            nombres='Test',
+            apellidos='Paciente',
+            fecha_nacimiento=date(1960, 1, 1)
+        )
+        self.hoy = date.today()
+    
+    def crear_prescripcion(self, **kwargs):
+        datos = {
+            'paciente': self.paciente,
+            'profesional': self.profesional,
+            'fecha_examen': self.hoy,
+            'od_esfera': Decimal('-2.00'),
+            'os_esfera': Decimal('-2.00'),
+        }
+        datos.update(kwargs)
+        return Prescripcion.objects.create(**datos)
+    
+    def estadistica(self, fecha=None):
+        return EstadisticaDiariaPrescripcion.objects.get(
+            fecha=fecha or self.hoy, profesional=self.profesional
+        )
+    
+    def test_crear_actualiza_estadistica(self):
+        """Cada prescripción creada suma en su día y profesional"""
+        self.crear_prescripcion(od_cilindro=Decimal('-1.00'), od_eje=90)
+        self.crear_prescripcion(adicion=Decimal('1.50'))
+        
+        estadistica = self.estadistica()
+        self.assertEqual(estadistica.total, 2)
+        # La segunda invalida la primera (una vigente por paciente)
+        self.assertEqual(estadistica.vigentes, 1)
+        self.assertEqual(estadistica.con_astigmatismo, 1)
+        self.assertEqual(estadistica.con_presbicia, 1)
+    
+    def test_cambio_de_fecha_mueve_la_estadistica(self):
+        """Cambiar la fecha de examen recalcula el día anterior y el nuevo"""
+        prescripcion = self.crear_prescripcion()
+        ayer = self.hoy - timedelta(days=1)
+        
+        prescripcion = Prescripcion.objects.get(id=prescripcion.id)
+        prescripcion.fecha_examen = ayer
+        prescripcion.save()
+        
+        self.assertFalse(EstadisticaDiariaPrescripcion.objects.filter(fecha=self.hoy).exists())
+        self.assertEqual(self.estadistica(ayer).total, 1)
+    
+    def test_eliminar_resta_de_la_estadistica(self):
+        """Eliminar la última prescripción del día elimina la fila"""
+        prescripcion = self.crear_prescripcion()
+        prescripcion.delete()
+        
+        self.assertFalse(EstadisticaDiariaPrescripcion.objects.exists())
+    
+    def test_invalidar_anteriores_actualiza_vigentes(self):
+        """La invalidación masiva (QuerySet.update) también se refleja"""
+        anterior = self.crear_prescripcion(fecha_examen=self.hoy - timedelta(days=365))
+        nueva = self.crear_prescripcion()
+        nueva.invalidar_prescripciones_anteriores()
+        
+        self.assertEqual(self.estadistica(anterior.fecha_examen).vigentes, 0)
+        self.assertEqual(self.estadistica().vigentes, 1)
+    
+    def test_vencidas_en_lote_con_consultas_constantes(self):
+        """La vigencia masiva recalcula todos los grupos en una consulta agrupada"""
+        for dias in range(800, 810):
+            Prescripcion.objects.create(
+                paciente=Paciente.objects.create(
+                    numero_documento=f'7{dias}', nombres='Otro', apellidos='Paciente',
+                    fecha_nacimiento=date(1960, 1, 1)
+                ),
+                profesional=self.profesional,
+                fecha_examen=self.hoy - timedelta(days=dias),
+                od_esfera=Decimal('-1.00'), os_esfera=Decimal('-1.00')
+            )
+        
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(marcar_vencidas(self.hoy), 10)
+        # SELECT de ids, UPDATE, SELECT agrupado, INSERT ... ON CONFLICT y el
+        # SELECT final vacío, no dos consultas por grupo
+        sentencias = [c['sql'] for c in consultas.captured_queries if 'SAVEPOINT' not in c['sql']]
+        self.assertEqual(len(sentencias), 5)
+        self.assertFalse(EstadisticaDiariaPrescripcion.objects.filter(vigentes__gt=0).exists())
+        self.assertEqual(EstadisticaDiariaPrescripcion.objects.filter(total=1).count(), 10)
+    
+    def test_guardar_suma_sin_recalcular(self):
+        """Un guardado aplica la diferencia con F(), sin agregar el grupo"""
+        prescripcion = self.crear_prescripcion()
+        prescripcion = Prescripcion.objects.get(id=prescripcion.id)
+        prescripcion.adicion = Decimal('2.00')
+        with CaptureQueriesContext(connection) as consultas:
+            prescripcion.save()
+        
+        self.assertFalse(any('COUNT(' in consulta['sql'] for consulta in consultas.captured_queries))
+        self.assertEqual(self.estadistica().con_presbicia, 1)
+    
+    def test_reconstruir_coincide_con_incremental(self):
+        """El comando de reconstrucción produce las mismas cifras"""
+        for dias in (0, 0, 10, 400):
+            self.crear_prescripcion(fecha_examen=self.hoy - timedelta(days=dias))
+        incremental = list(EstadisticaDiariaPrescripcion.objects.order_by('fecha').values(
+            'fecha', 'total', 'vigentes', 'con_astigmatismo', 'con_presbicia'
+        ))
+        
+        EstadisticaDiariaPrescripcion.objects.all().delete()
+        call_command('reconstruir_estadisticas', stdout=StringIO())
+        
+        reconstruido = list(EstadisticaDiariaPrescripcion.objects.order_by('fecha').values(
+            'fecha', 'total', 'vigentes', 'con_astigmatismo', 'con_presbicia'
+        ))
+        self.assertEqual(incremental, reconstruido)
+        self.assertEqual(len(reconstruido), 3)
+
+
+class EstadisticaDiariaInventarioTest(APITestCase):
+    """
+    Pruebas de las fotos diarias de inventario
+    """
+    
+    def setUp(self):
+        """Configuración inicial"""
+        self.usuario = User.objects.create_user(username='admin')
+        self.client.force_authenticate(user=self.usuario)
+        self.montura = Producto.objects.create(
+            nombre='Montura Metal',
+            categoria='MONTURA',
+            precio_compra=Decimal('50000.00'),
+            precio_venta=Decimal('120000.00'),
+            stock=4,
+            stock_minimo=2
+        )
+        Producto.objects.create(
+            nombre='Montura Acetato',
+            categoria='MONTURA',
+            precio_compra=Decimal('30000.00'),
+            precio_venta=Decimal('90000.00'),
+            stock=0
+        )
+    
+    def test_foto_del_dia_por_categoria(self):
+        """La foto del día refleja el inventario activo de la categoría"""
+        foto = EstadisticaDiariaInventario.objects.get(fecha=date.today(), categoria='MONTURA')
+        
+        self.assertEqual(foto.total_productos, 2)
+        self.assertEqual(foto.stock_total, 4)
+        self.assertEqual(foto.valor_inventario, Decimal('200000.00'))
+        self.assertEqual(foto.productos_sin_stock, 1)
+        self.assertEqual(foto.productos_bajo_stock, 1)
+    
+    def test_reconstruir_valor_por_producto(self):
+        """reconstruir suma precio de compra por stock de cada producto activo"""
+        Producto.objects.create(
+            nombre='Montura Descontinuada', categoria='MONTURA',
+            precio_compra=Decimal('10000.00'), precio_venta=Decimal('20000.00'),
+            stock=5, activo=False
+        )
+        EstadisticaDiariaInventario.objects.all().delete()
+        
+        EstadisticaDiariaInventario.reconstruir()
+        
+        foto = EstadisticaDiariaInventario.objects.get(fecha=date.today(), categoria='MONTURA')
+        # 50000*4 + 30000*0, no (50000 + 30000) * 4
+        self.assertEqual(foto.valor_inventario, Decimal('200000.00'))
+        self.assertEqual((foto.total_productos, foto.stock_total), (2, 4))
+        self.assertEqual(foto.valor_inventario_inactivos, Decimal('50000.00'))
+    
+    def test_cambio_de_categoria_recalcula_ambas(self):
+        """Mover un producto de categoría actualiza origen y destino"""
+        self.montura.categoria = 'ACCESORIO'
+        self.montura.save()
+        
+        montura = EstadisticaDiariaInventario.objects.get(fecha=date.today(), categoria='MONTURA')
+        accesorio = EstadisticaDiariaInventario.objects.get(fecha=date.today(), categoria='ACCESORIO')
+        self.assertEqual(montura.stock_total, 0)
+        self.assertEqual(accesorio.stock_total, 4)
+    
+    def test_venta_suma_sin_recalcular(self):
+        """Una venta resta de la foto con F(), sin agregar la categoría"""
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertTrue(self.montura.reducir_stock(3))
+        
+        self.assertFalse(any('SUM(' in consulta['sql'] for consulta in consultas.captured_queries))
+        foto = EstadisticaDiariaInventario.objects.get(fecha=date.today(), categoria='MONTURA')
+        self.assertEqual(foto.stock_total, 1)
+        self.assertEqual(foto.valor_inventario, Decimal('50000.00'))
+        self.assertEqual(foto.productos_bajo_stock, 2)
+    
+    def test_primer_cambio_del_dia_parte_de_la_foto_anterior(self):
+        """Sin foto de hoy, el cambio se suma a la última foto de la categoría"""
+        ayer = date.today() - timedelta(days=1)
+        EstadisticaDiariaInventario.objects.filter(fecha=date.today()).update(fecha=ayer)
+        
+        self.montura.ajustar_stock(10)
+        
+        foto = EstadisticaDiariaInventario.objects.get(fecha=date.today(), categoria='MONTURA')
+        self.assertEqual((foto.total_productos, foto.stock_total, foto.productos_bajo_stock), (2, 10, 1))
+        self.assertEqual(EstadisticaDiariaInventario.objects.get(fecha=ayer, categoria='MONTURA').stock_total, 4)
+    
+    def test_desactivar_y_eliminar(self):
+        """Un producto inactivo o eliminado deja de contar"""
+        self.montura.activo = False
+        self.montura.save(update_fields=['activo'])
+        foto = EstadisticaDiariaInventario.objects.get(fecha=date.today(), categoria='MONTURA')
+        self.assertEqual((foto.total_productos, foto.stock_total), (1, 0))
+        self.assertEqual(foto.valor_inventario_inactivos, Decimal('200000.00'))
+        
+        Producto.objects.get(nombre='Montura Acetato').delete()
+        foto.refresh_from_db()
+        self.assertEqual((foto.total_productos, foto.productos_sin_stock), (0, 0))
+    
+    def test_tendencia_en_estadisticas(self):
+        """Con rango de fechas el endpoint incluye la tendencia"""
+        hoy = date.today().isoformat()
+        response = self.client.get('/api/productos/estadisticas/', {'fecha_desde': hoy})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['tendencia']), 1)
+        self.assertEqual(response.data['tendencia'][0]['categoria'], 'MONTURA')
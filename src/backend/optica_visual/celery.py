@@ -0,0 +1,18 @@
+"""
+Aplicación Celery de Óptica Visual Km 30
+
+La configuración se toma de settings con el prefijo CELERY_ y las tareas
+se descubren en el módulo tasks.py de cada app.
+
+Uso:
+    celery -A optica_visual worker -l info
+    celery -A optica_visual beat -l info
+"""
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'optica_visual.settings.development')
+
+app = Celery('optica_visual')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -4,6 +4,7 @@ Configuración base de Django para Óptica Visual Km 30
 
 from pathlib import Path
 from datetime import timedelta
+from celery.schedules import crontab
 import dj_database_url
 from decouple import config, Csv
 
@@ -36,18 +37,21 @@ THIRD_PARTY_APPS = [
 ]
 
 LOCAL_APPS = [
+    'apps.core',
     'apps.pacientes',
     'apps.prescripciones',
     'apps.productos',
     # 'apps.facturacion',
     # 'apps.creditos',
     # 'apps.marketing',
-    # 'apps.reportes',
+    'apps.reportes',
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    # Primero, para medir también a los demás middleware
+    'apps.core.middleware.MetricasMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -55,6 +59,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.core.middleware.AuditoriaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -146,7 +151,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Páginas numeradas; ?paginacion=cursor usa paginación por keyset
+    'DEFAULT_PAGINATION_CLASS': 'apps.core.paginacion.PaginacionSeleccionable',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -155,6 +161,63 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Caché: Redis si REDIS_URL está configurado, memoria local (un solo nodo) si no
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'optica',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'optica-visual',
+        }
+    }
+
+# Segundos que se guardan las respuestas cacheadas (apps/core/cache.py)
+CACHE_RESPUESTAS_TIMEOUT = config('CACHE_RESPUESTAS_TIMEOUT', default=300, cast=int)
+
+# Celery (tareas en segundo plano); con CELERY_TASK_ALWAYS_EAGER=True las
+# tareas se ejecutan en el mismo proceso, sin broker
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL or 'redis://localhost:6379/0')
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'vencer-prescripciones': {
+        'task': 'apps.prescripciones.tasks.vencer_prescripciones',
+        'schedule': crontab(hour=1, minute=0),
+    },
+    'limpiar-lotes-pdf': {
+        'task': 'apps.prescripciones.tasks.limpiar_lotes_pdf',
+        'schedule': crontab(hour=1, minute=30),
+    },
+}
+
+# Importaciones masivas (apps/core/importacion.py): hasta este tamaño el
+# archivo se importa dentro de la petición; los mayores, con Celery
+IMPORTACION_SINCRONA_MAX_BYTES = config('IMPORTACION_SINCRONA_MAX_BYTES', default=256 * 1024, cast=int)
+
+# Métricas Prometheus en /metrics (apps/core/metricas.py); con token se
+# exige "Authorization: Bearer <token>". Sin token /metrics solo responde
+# con DEBUG activo
+METRICAS_TOKEN = config('METRICAS_TOKEN', default='')
+
+# Detector de consultas N+1 y lentas (apps/core/consultas.py); se activa
+# en development.py y test.py con DetectorConsultasMiddleware
+CONSULTAS_REPETIDAS_MAXIMO = None
+CONSULTAS_REPETIDAS_FALLAR = False
+CONSULTA_LENTA_MS = None
+
+# Registro de cambios (apps/core/auditoria.py): con True cada lote se
+# escribe desde Celery, fuera de la petición
+AUDITORIA_ASINCRONA = config('AUDITORIA_ASINCRONA', default=False, cast=bool)
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
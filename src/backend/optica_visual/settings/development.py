@@ -22,6 +22,11 @@ if config('DATABASE_URL', default=None):
         )
     }
 
+# Advertir en el log de consultas repetidas (N+1) y lentas
+MIDDLEWARE += ['apps.core.middleware.DetectorConsultasMiddleware']
+CONSULTAS_REPETIDAS_MAXIMO = config('CONSULTAS_REPETIDAS_MAXIMO', default=5, cast=int)
+CONSULTA_LENTA_MS = config('CONSULTA_LENTA_MS', default=100, cast=int)
+
 # Configuración de email para desarrollo (consola)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
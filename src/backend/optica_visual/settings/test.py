@@ -1,16 +1,25 @@
 """
 Configuración específica para pruebas
 """
+import tempfile
+from pathlib import Path
+
 from .base import *
 
-# Usar SQLite en memoria para pruebas
+# SQLite en archivo temporal (no en memoria): las pruebas de concurrencia
+# (ventas simultáneas, números de prescripción) abren una conexión por hilo
+# y necesitan el bloqueo de escritura real de SQLite. Django crea y borra
+# el archivo en cada ejecución.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
         'OPTIONS': {
             'timeout': 20,
-        }
+        },
+        'TEST': {
+            'NAME': str(Path(tempfile.gettempdir()) / 'test_optica_visual.sqlite3'),
+        },
     }
 }
 
@@ -43,6 +52,12 @@ LOGGING = {
     },
 }
 
+# Una misma forma de consulta repetida más de 5 veces en una petición
+# (N+1) hace fallar la prueba
+MIDDLEWARE += ['apps.core.middleware.DetectorConsultasMiddleware']
+CONSULTAS_REPETIDAS_MAXIMO = 5
+CONSULTAS_REPETIDAS_FALLAR = True
+
 # Email backend para pruebas
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
@@ -51,4 +66,7 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
     }
-}
\ No newline at end of file
+}
+
+# Tareas de Celery en el mismo proceso, sin broker
+CELERY_TASK_ALWAYS_EAGER = True
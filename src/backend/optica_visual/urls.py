@@ -14,6 +14,7 @@ urlpatterns = [
     path('', include('apps.pacientes.urls')),
     path('', include('apps.prescripciones.urls')),
     path('', include('apps.productos.urls')),
+    path('', include('apps.core.urls')),
     
     # API de autenticación (JWT)
     path('api/auth/', include('rest_framework.urls')),